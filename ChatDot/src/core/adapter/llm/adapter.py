@@ -1,26 +1,204 @@
+import asyncio
+import time
 import warnings
+import httpx
 import openai
-from collections import deque
+from collections import OrderedDict, deque
 from threading import Lock
 from global_managers.logger_manager import LoggerManager
+from adapter.llm.scheduler import APIKeyScheduler
+from adapter.llm.event_loop import LLMEventLoop
+
+# 这些状态码说明请求本身有问题，换Key重试也不会成功
+NON_RETRYABLE_STATUS_CODES = {400, 404, 422}
+DEFAULT_MAX_KEY_RETRIES = 2
+
+DEFAULT_POOL_SIZE = 10  # 每个客户端默认的HTTP连接池大小
+USAGE_HISTORY_SIZE = 64  # 保留最近多少个请求的 usage 信息
+
+DEFAULT_HEDGING_CONFIG = {
+    "enabled": False,
+    "models": [],  # 启用对冲的模型，为空表示所有模型
+    "threshold_ms": 0,  # 首token等待阈值，0表示使用滚动P95 TTFT
+    "min_threshold_ms": 500,  # 阈值下限，避免P95过低时频繁对冲
+    "api_bases": []  # 备用Base URL，没有其他Key可用时在这些地址上用同一个Key发起对冲
+}
+
+
+class _PeekedStream:
+    """已读取首个片段的流式响应，迭代时先返回该片段"""
+
+    def __init__(self, response, iterator, first_chunk):
+        self.response = response
+        self._iterator = iterator
+        self._first_chunk = first_chunk
+
+    async def __aiter__(self):
+        if self._first_chunk is not None:
+            first_chunk, self._first_chunk = self._first_chunk, None
+            yield first_chunk
+        async for chunk in self._iterator:
+            yield chunk
+
+    async def close(self):
+        await self.response.close()
+
+
+class LLMClientPool:
+    """
+    OpenAI 客户端池
+    
+    为每个 (API Key, Base URL) 组合维护一个长期存活的客户端，
+    复用底层 HTTP keep-alive 连接，避免每次请求重新进行 TCP/TLS 握手。
+    异步客户端(AsyncOpenAI)只在 LLMEventLoop 共享事件循环上使用和关闭。
+    
+    通过 httpcore 的 trace 扩展统计新建连接数，
+    请求总数减去新建连接数即为复用连接数。
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE):
+        self.pool_size = pool_size or DEFAULT_POOL_SIZE
+        self._clients = {}  # (api_key, api_base, is_async) -> openai.OpenAI / openai.AsyncOpenAI
+        self._lock = Lock()
+        self._stats = {
+            "clients_created": 0,
+            "requests": 0,
+            "connections_opened": 0,
+        }
+
+    def _on_request(self, request):
+        """httpx 请求钩子，为每个请求挂载 trace 回调"""
+        request.extensions["trace"] = self._trace
+        with self._lock:
+            self._stats["requests"] += 1
+
+    def _trace(self, event_name, info):
+        """httpcore trace 回调，只在建立新 TCP 连接时触发 connect_tcp"""
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self._stats["connections_opened"] += 1
+
+    async def _on_request_async(self, request):
+        """异步客户端的请求钩子(httpx 要求异步钩子为协程)"""
+        request.extensions["trace"] = self._trace_async
+        with self._lock:
+            self._stats["requests"] += 1
+
+    async def _trace_async(self, event_name, info):
+        self._trace(event_name, info)
+
+    def _create_http_client(self, is_async: bool = False):
+        limits = httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size
+        )
+        if is_async:
+            return httpx.AsyncClient(
+                limits=limits,
+                follow_redirects=True,
+                event_hooks={"request": [self._on_request_async]}
+            )
+        return httpx.Client(
+            limits=limits,
+            follow_redirects=True,
+            event_hooks={"request": [self._on_request]}
+        )
+
+    def _get_or_create(self, api_key: str, api_base: str, is_async: bool):
+        pool_key = (api_key, api_base, is_async)
+        with self._lock:
+            client = self._clients.get(pool_key)
+            if client is None:
+                client_class = openai.AsyncOpenAI if is_async else openai.OpenAI
+                client = client_class(
+                    api_key=api_key,
+                    base_url=api_base,
+                    http_client=self._create_http_client(is_async)
+                )
+                self._clients[pool_key] = client
+                self._stats["clients_created"] += 1
+                LoggerManager().get_logger().debug(
+                    f"LLMClientPool: 新建{'异步' if is_async else ''}客户端 {api_key[:8]}... @ {api_base}"
+                )
+            return client
+
+    def get_client(self, api_key: str, api_base: str) -> openai.OpenAI:
+        """获取(必要时创建)指定 Key 和 Base URL 对应的客户端"""
+        return self._get_or_create(api_key, api_base, is_async=False)
+
+    def get_async_client(self, api_key: str, api_base: str) -> openai.AsyncOpenAI:
+        """获取(必要时创建)指定 Key 和 Base URL 对应的异步客户端，只能在 LLMEventLoop 上使用"""
+        return self._get_or_create(api_key, api_base, is_async=True)
+
+    def retain(self, api_keys, api_base: str) -> None:
+        """只保留给定配置对应的客户端，关闭其余客户端"""
+        wanted = {(key, api_base) for key in api_keys}
+        with self._lock:
+            stale = [pool_key for pool_key in self._clients if pool_key[:2] not in wanted]
+            stale_clients = [self._clients.pop(pool_key) for pool_key in stale]
+        for client in stale_clients:
+            self._close_client(client)
+
+    def set_pool_size(self, pool_size: int) -> None:
+        """修改连接池大小，已有客户端会被关闭并在下次使用时重建"""
+        pool_size = pool_size or DEFAULT_POOL_SIZE
+        if pool_size == self.pool_size:
+            return
+        self.pool_size = pool_size
+        self.close()
+
+    def close(self) -> None:
+        """关闭所有客户端"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            self._close_client(client)
+
+    def _close_client(self, client) -> None:
+        try:
+            if isinstance(client, openai.AsyncOpenAI):
+                # 异步客户端绑定在共享事件循环上，必须在该循环中关闭
+                LLMEventLoop().submit(client.close())
+            else:
+                client.close()
+        except Exception as e:
+            LoggerManager().get_logger().warning(f"LLMClientPool: 关闭客户端失败: {e}")
+
+    def get_stats(self) -> dict:
+        """
+        获取连接复用统计
+        
+        Returns:
+            dict: 包含客户端数量、请求数、新建连接数与复用连接数
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["clients"] = len(self._clients)
+        stats["connections_reused"] = max(0, stats["requests"] - stats["connections_opened"])
+        return stats
+
 
 class LLMAdapter:
     """
     LLMAdapter 是一个管理与大型语言模型(LLM) API连接和通信的类。
     该类提供以下功能：
-    - 通过轮询方式处理多个API密钥
+    - 通过健康感知的调度器在多个API密钥间分配请求，失败时换Key重试
     - 配置和测试API连接
     - 设置和管理模型参数
-    - 处理与LLM的流式和非流式通信
+    - 处理与LLM的流式和非流式通信(同步与异步两种方式)
     - 从API获取可用模型列表
     
     属性：
-        adapter: OpenAI客户端实例
-        api_keys (deque): 用于轮询的API密钥集合
+        adapter: 当前(第一个Key对应的)OpenAI客户端实例
+        client_pool (LLMClientPool): 按API密钥复用的客户端池
+        api_keys (deque): 已配置的API密钥集合
+        scheduler (APIKeyScheduler): 按Key健康状态选择Key的调度器
         api_base (str): API的基础URL
         model_name (str): 要使用的LLM模型名称
         model_params (dict): 模型配置参数
-        lock (Lock): 用于API密钥轮询的线程安全锁
+        max_key_retries (int): 请求失败时最多换Key重试的次数
+        hedging (dict): 对冲请求配置(异步流式请求首token过慢时在其他Key/Base URL上重发)
     
     示例：
         ```
@@ -28,6 +206,10 @@ class LLMAdapter:
         adapter.set_api_config(['key1', 'key2'], 'https://api.base.url')
         adapter.set_model_name('gpt-3.5-turbo')
         response = adapter.communicate([{"role": "user", "content": "Hello"}])
+        
+        # 异步流式调用(需在 LLMEventLoop 上迭代)
+        async for chunk in adapter.communicate_async([{"role": "user", "content": "Hello"}]):
+            ...
         ```
     
     异常：
@@ -35,13 +217,32 @@ class LLMAdapter:
         RuntimeError: 当API连接失败或使用未初始化的客户端时
     """
     
-    def __init__(self):
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE):
         self.adapter = None
+        self.client_pool = LLMClientPool(pool_size)
         self.api_keys = deque()  # 使用双端队列存储多个API Keys
+        self.scheduler = APIKeyScheduler()
+        self.max_key_retries = DEFAULT_MAX_KEY_RETRIES
         self.api_base = None
         self.model_name = None
         self.model_params = {}
-        self.lock = Lock()  # 用于线程安全的API Key轮询
+        # 进行中的请求: request_id -> {"response": 流式响应句柄, "task": 驱动该请求的asyncio任务}
+        self._active_requests = {}
+        self._cancelled_requests = set()
+        self._requests_lock = Lock()
+        # 对冲请求配置与统计
+        self.hedging = dict(DEFAULT_HEDGING_CONFIG)
+        self._hedge_stats = {
+            "hedged_requests": 0,  # 满足对冲条件的请求数
+            "hedges_fired": 0,  # 实际发出的对冲请求数
+            "hedge_wins": 0,  # 对冲请求先返回首token的次数
+            "primary_wins": 0,  # 发出对冲后原请求仍先返回的次数
+            "extra_prompt_tokens": 0,  # 被取消的一方估算的额外prompt token
+            "extra_completion_chunks": 0,  # 被取消的一方已生成的片段数
+        }
+        self._hedge_lock = Lock()
+        # 最近请求的 usage: request_id -> {"prompt_tokens", "completion_tokens", "cached_tokens"}
+        self._request_usage = OrderedDict()
 
     def set_api_config(self, api_keys, api_base, test_connection=False):
         """
@@ -62,17 +263,17 @@ class LLMAdapter:
             api_keys = [api_keys]
             
         self.api_keys = deque(api_keys)
+        self.scheduler.set_keys(api_keys)
         self.api_base = api_base
+        # 仅保留仍在配置中的客户端，其余的关闭释放连接
+        self.client_pool.retain(api_keys, api_base)
             
         if test_connection:
             # 测试所有API Keys
             valid_keys = []
             for key in api_keys:
                 try:
-                    test_adapter = openai.OpenAI(
-                        api_key=key,
-                        base_url=api_base
-                    )
+                    test_adapter = self.client_pool.get_client(key, api_base)
                     test_adapter.models.list()
                     valid_keys.append(key)
                 except Exception as e:
@@ -85,16 +286,70 @@ class LLMAdapter:
             # self.api_keys = deque(valid_keys)
         
         # 不管是否测试，都设置第一个key为当前adapter
-        self.adapter = openai.OpenAI(
-            api_key=self.api_keys[0],
-            base_url=api_base
-        )
+        self.adapter = self.client_pool.get_client(self.api_keys[0], api_base)
+
+    def set_pool_size(self, pool_size: int):
+        """
+        设置每个客户端的HTTP连接池大小
+        @param pool_size: 最大连接数
+        """
+        self.client_pool.set_pool_size(pool_size)
+        if self.api_keys:
+            self.adapter = self.client_pool.get_client(self.api_keys[0], self.api_base)
+
+    def get_connection_stats(self) -> dict:
+        """获取连接复用统计"""
+        return self.client_pool.get_stats()
+
+    def close(self):
+        """关闭所有客户端及其连接"""
+        self.client_pool.close()
+        self.adapter = None
         
-    def get_next_api_key(self):
-        with self.lock:
-            current_key = self.api_keys[0]
-            self.api_keys.rotate(-1)  # 轮询调度
-            return current_key
+    def set_retry_policy(self, max_key_retries=None, cooldown_seconds=None):
+        """
+        设置失败重试策略
+        @param max_key_retries: 失败后最多换Key重试的次数
+        @param cooldown_seconds: 429 未返回 Retry-After 时的冷却时间
+        """
+        if max_key_retries is not None:
+            self.max_key_retries = max(0, int(max_key_retries))
+        if cooldown_seconds is not None:
+            self.scheduler.set_cooldown_seconds(cooldown_seconds)
+
+    def get_key_stats(self):
+        """获取每个API Key的调度统计(并发数、TTFT、错误率、冷却剩余时间等)"""
+        return self.scheduler.get_stats()
+
+    def set_hedging_config(self, config):
+        """
+        设置对冲请求配置
+        @param config: 见 DEFAULT_HEDGING_CONFIG，缺省项使用默认值
+        """
+        self.hedging = {**DEFAULT_HEDGING_CONFIG, **(config or {})}
+
+    def get_hedge_stats(self):
+        """获取对冲请求统计(发出次数、对冲胜出次数、额外token开销等)"""
+        with self._hedge_lock:
+            return dict(self._hedge_stats)
+
+    def _count_hedge(self, **increments):
+        with self._hedge_lock:
+            for key, value in increments.items():
+                self._hedge_stats[key] += value
+
+    @staticmethod
+    def _describe_error(error):
+        """从 openai 异常中提取状态码和 Retry-After"""
+        status_code = getattr(error, "status_code", None)
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+        return status_code, retry_after
 
     def test_connection(self):
         try:
@@ -123,27 +378,102 @@ class LLMAdapter:
         if 'stream' not in self.model_params:
             self.model_params['stream'] = True  # 默认启用
     
-    def stop_generating(self):
+    #region 请求跟踪与打断
+    def _track_request(self, request_id, response=None, task=None):
+        """记录进行中请求的流式响应句柄或驱动任务"""
+        if request_id is None:
+            return
+        with self._requests_lock:
+            entry = self._active_requests.setdefault(request_id, {})
+            if response is not None:
+                entry["response"] = response
+            if task is not None:
+                entry["task"] = task
+
+    def _untrack_request(self, request_id):
+        if request_id is None:
+            return
+        with self._requests_lock:
+            self._active_requests.pop(request_id, None)
+            self._cancelled_requests.discard(request_id)
+
+    def is_cancelled(self, request_id) -> bool:
+        """指定请求是否已被打断"""
+        with self._requests_lock:
+            return request_id is not None and request_id in self._cancelled_requests
+
+    def _record_usage(self, request_id, usage):
+        """记录请求的 usage(含提供方 prompt 缓存命中的 cached_tokens)"""
+        if request_id is None or usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        with self._requests_lock:
+            self._request_usage[request_id] = {
+                "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                "completion_tokens": getattr(usage, "completion_tokens", None),
+                "cached_tokens": getattr(details, "cached_tokens", None) if details is not None else None,
+            }
+            while len(self._request_usage) > USAGE_HISTORY_SIZE:
+                self._request_usage.popitem(last=False)
+
+    def get_request_usage(self, request_id):
+        """获取请求的 usage，流式请求需设置 stream_options.include_usage 才会返回"""
+        with self._requests_lock:
+            usage = self._request_usage.get(request_id)
+            return dict(usage) if usage else None
+
+    def get_active_requests(self):
+        """获取进行中的请求ID列表"""
+        with self._requests_lock:
+            return list(self._active_requests)
+
+    @staticmethod
+    def _cancel_async_request(task, response):
+        """在共享事件循环上执行：取消驱动任务并关闭HTTP响应"""
+        if task is not None and not task.done():
+            task.cancel()
+        if response is not None:
+            asyncio.ensure_future(response.close())
+
+    def stop_generating(self, request_id=None):
         """
-        尝试停止当前生成过程
+        停止生成：关闭进行中请求的HTTP响应，使上游连接和生成立即中止
+        
+        Args:
+            request_id: 要打断的请求ID，None表示打断所有进行中的请求
         
         Returns:
             bool: 如果成功执行API级打断则返回True，否则返回False
         """
-        try:
-            if hasattr(self, '_current_response') and self._current_response:
-                if hasattr(self._current_response, 'abort'):
-                    self._current_response.abort()
-                    LoggerManager().get_logger().debug("LLM API 级打断成功")
-                    return True
-                else:
-                    LoggerManager().get_logger().debug("当前 LLM API 不支持打断操作")
-        except Exception as e:
-            LoggerManager().get_logger().warning(f"LLM API 级打断失败: {e}")
-        return False
+        with self._requests_lock:
+            if request_id is None:
+                request_ids = list(self._active_requests)
+            else:
+                # 只标记进行中的请求，已结束或未开始的ID不记录，避免集合无限增长
+                request_ids = [request_id] if request_id in self._active_requests else []
+            self._cancelled_requests.update(request_ids)
+            entries = [self._active_requests.get(rid) for rid in request_ids]
+
+        stopped = False
+        for rid, entry in zip(request_ids, entries):
+            if not entry:
+                continue
+            response = entry.get("response")
+            task = entry.get("task")
+            try:
+                if isinstance(response, openai.AsyncStream) or task is not None:
+                    LLMEventLoop().call_soon(self._cancel_async_request, task, response)
+                elif response is not None:
+                    response.close()
+                stopped = True
+                LoggerManager().get_logger().debug(f"LLM API 级打断成功 (request_id={rid})")
+            except Exception as e:
+                LoggerManager().get_logger().warning(f"LLM API 级打断失败 (request_id={rid}): {e}")
+        return stopped
+    #endregion
     
-    #def communicate(self, messages, model_name=None, stream=False, model_params_override=None): #stream参数现已整合进params
-    def communicate(self, messages, model_name=None, model_params_override=None):
+    def _prepare_request(self, messages, model_name=None, model_params_override=None):
+        """合并模型名称与参数，并输出请求日志"""
         if not self.adapter:
             raise RuntimeError("LLMAdapter 未连接到 API，请先配置 API 连接。")
 
@@ -152,39 +482,388 @@ class LLMAdapter:
         if model_params_override:
             params.update(model_params_override)
 
-        # 获取下一个API Key
-        api_key = self.get_next_api_key()
-        self.adapter = openai.OpenAI(
-            api_key=api_key,
-            base_url=self.api_base
-        )
-        stream = params.get('stream', False)
         LoggerManager().get_logger().debug(f"--- LLM Request Parameters ---")
         LoggerManager().get_logger().debug(f"Bae URL: {self.api_base}")
-        LoggerManager().get_logger().debug(f"API Key: {api_key}")
         LoggerManager().get_logger().debug(f"Model Name: {final_model_name}")
         LoggerManager().get_logger().debug(f"Model Params: {params}")
         #LoggerManager().get_logger().debug(f"Stream: {stream}") #stream参数现已整合进params
         LoggerManager().get_logger().debug(f"Messages: {messages}")
         LoggerManager().get_logger().debug("-------------------------------")
+        return final_model_name, params
+
+    #def communicate(self, messages, model_name=None, stream=False, model_params_override=None): #stream参数现已整合进params
+    def communicate(self, messages, model_name=None, model_params_override=None, request_id=None):
+        final_model_name, params = self._prepare_request(messages, model_name, model_params_override)
+        stream = params.get('stream', False)
+        if self.is_cancelled(request_id):
+            self._untrack_request(request_id)
+            return iter(()) if stream else ""
 
+        # 按健康状态选择Key，失败时换一个Key重试(仅在收到首个响应之前)
+        tried_keys = set()
+        last_error = None
+        max_attempts = min(self.max_key_retries + 1, len(self.scheduler.get_keys())) or 1
+        for attempt in range(max_attempts):
+            api_key = self.scheduler.acquire(exclude=tried_keys)
+            tried_keys.add(api_key)
+            client = self.client_pool.get_client(api_key, self.api_base)
+            LoggerManager().get_logger().debug(f"API Key: {api_key[:8]}... (attempt {attempt + 1}/{max_attempts})")
+            start_time = time.monotonic()
+            try:
+                response = client.chat.completions.create(
+                    model=final_model_name,
+                    messages=messages,
+                    #stream=stream, #stream参数现已整合进params
+                    **params
+                )
+            except Exception as e:
+                status_code, retry_after = self._describe_error(e)
+                self.scheduler.release(api_key, error=True, status_code=status_code, retry_after=retry_after)
+                LoggerManager().get_logger().warning(f"API Key {api_key[:8]}... 请求失败(status={status_code}): {e}")
+                last_error = e
+                if status_code in NON_RETRYABLE_STATUS_CODES:
+                    break
+                continue
+
+            if stream:
+                self._track_request(request_id, response=response)
+                return self._stream_chunks(api_key, response, start_time, request_id)
+            try:
+                content = response.choices[0].message.content
+            except Exception as e:
+                self.scheduler.release(api_key, error=True)
+                raise RuntimeError(f"LLM 通信失败: {e}")
+            self._record_usage(request_id, getattr(response, "usage", None))
+            elapsed = time.monotonic() - start_time
+            self.scheduler.record_first_token(api_key, elapsed)
+            self.scheduler.release(api_key, latency=elapsed)
+            return content
+
+        raise RuntimeError(f"LLM 通信失败: {last_error}")
+
+    def _stream_chunks(self, api_key, response, start_time, request_id=None):
+        """包装流式响应，记录首token耗时，结束时释放Key；提前结束时关闭HTTP响应"""
+        first_token = True
+        failed = False
+        finished = False
         try:
-            response = self.adapter.chat.completions.create(
-                model=final_model_name,
-                messages=messages,
-                #stream=stream, #stream参数现已整合进params
-                **params
-            )
+            for chunk in response:
+                if first_token:
+                    self.scheduler.record_first_token(api_key, time.monotonic() - start_time)
+                    first_token = False
+                if getattr(chunk, "usage", None):
+                    self._record_usage(request_id, chunk.usage)
+                if not chunk.choices:
+                    continue
+                yield chunk.choices[0].delta.content or ""
+            finished = True
+        except Exception as e:
+            if self.is_cancelled(request_id):
+                # 被 stop_generating 关闭连接导致的异常，视为正常打断
+                return
+            failed = True
+            status_code, retry_after = self._describe_error(e)
+            self.scheduler.release(api_key, error=True, status_code=status_code, retry_after=retry_after)
+            raise RuntimeError(f"LLM 通信失败: {e}")
+        finally:
+            if not finished:
+                response.close()
+            if not failed:
+                # 中途被打断时不记录耗时样本
+                latency = time.monotonic() - start_time if finished else None
+                self.scheduler.release(api_key, latency=latency)
+            self._untrack_request(request_id)
+
+    async def communicate_async(self, messages, model_name=None, model_params_override=None, request_id=None,
+                                with_choice_index=False, rate_limit_per_key=None):
+        """
+        异步与LLM通信，必须在 LLMEventLoop 共享事件循环上迭代
+
+        Args:
+            messages: 消息列表
+            model_name: 可选的模型名称
+            model_params_override: 覆盖默认模型参数
+            request_id: 请求ID，可通过 stop_generating(request_id) 打断
+            with_choice_index: 是否返回候选序号，用于 n>1 的多候选请求
+            rate_limit_per_key: 本次请求(含换Key重试与对冲)每个Key每秒最多发起的请求数，None表示不限速
+
+        Yields:
+            str: 流式模式下逐个返回内容片段；非流式模式下只返回一次完整内容
+            Tuple[int, str]: with_choice_index 为True时返回 (候选序号, 内容)
+
+        Raises:
+            RuntimeError: 通信失败时
+        """
+        final_model_name, params = self._prepare_request(messages, model_name, model_params_override)
+        stream = params.get('stream', False)
+        if self.is_cancelled(request_id):
+            self._untrack_request(request_id)
+            return
+
+        tried_keys = set()
+        last_error = None
+        min_interval = 1 / rate_limit_per_key if rate_limit_per_key else 0.0
+        max_attempts = min(self.max_key_retries + 1, len(self.scheduler.get_keys())) or 1
+        # 等待限速期间也视为进行中，可被 stop_generating 打断
+        self._track_request(request_id, task=asyncio.current_task())
+        for attempt in range(max_attempts):
+            try:
+                api_key = await self.scheduler.acquire_async(exclude=tried_keys, min_interval=min_interval)
+            except asyncio.CancelledError:
+                self._untrack_request(request_id)
+                raise
+            tried_keys.add(api_key)
+            client = self.client_pool.get_async_client(api_key, self.api_base)
+            LoggerManager().get_logger().debug(f"API Key: {api_key[:8]}... (async attempt {attempt + 1}/{max_attempts})")
+            start_time = time.monotonic()
+            hedge_threshold = self._get_hedge_threshold(final_model_name) if stream else None
+            try:
+                if hedge_threshold is not None:
+                    api_key, response, start_time = await self._create_hedged(
+                        api_key, tried_keys, hedge_threshold, final_model_name, messages, params, min_interval
+                    )
+                else:
+                    response = await client.chat.completions.create(
+                        model=final_model_name,
+                        messages=messages,
+                        **params
+                    )
+            except asyncio.CancelledError:
+                # 等待响应头时被打断
+                self.scheduler.release(api_key)
+                self._untrack_request(request_id)
+                raise
+            except Exception as e:
+                status_code, retry_after = self._describe_error(e)
+                self.scheduler.release(api_key, error=True, status_code=status_code, retry_after=retry_after)
+                LoggerManager().get_logger().warning(f"API Key {api_key[:8]}... 请求失败(status={status_code}): {e}")
+                last_error = e
+                if status_code in NON_RETRYABLE_STATUS_CODES:
+                    break
+                continue
+
             if stream:
-                def chunk_generator():
-                    for chunk in response:
-                        chunk_content = chunk.choices[0].delta.content or ""
-                        yield chunk_content
-                return chunk_generator()
-            else:
-                return response.choices[0].message.content
+                self._track_request(request_id, response=response)
+                async for content in self._stream_chunks_async(api_key, response, start_time, request_id,
+                                                               with_choice_index):
+                    yield content
+                return
+            try:
+                if with_choice_index:
+                    contents = [(choice.index, choice.message.content) for choice in response.choices]
+                else:
+                    contents = [response.choices[0].message.content]
+            except Exception as e:
+                self.scheduler.release(api_key, error=True)
+                raise RuntimeError(f"LLM 通信失败: {e}")
+            self._record_usage(request_id, getattr(response, "usage", None))
+            elapsed = time.monotonic() - start_time
+            self.scheduler.record_first_token(api_key, elapsed)
+            self.scheduler.release(api_key, latency=elapsed)
+            self._untrack_request(request_id)
+            for content in contents:
+                yield content
+            return
+
+        self._untrack_request(request_id)
+        raise RuntimeError(f"LLM 通信失败: {last_error}")
+
+    #region 对冲请求
+    def _get_hedge_threshold(self, model_name):
+        """
+        获取本次请求的对冲阈值(秒)，不启用对冲时返回None
+
+        阈值优先使用配置的 threshold_ms，否则使用所有Key合并的滚动P95 TTFT；
+        尚无TTFT样本时不对冲。
+        """
+        config = self.hedging
+        if not config.get("enabled"):
+            return None
+        models = config.get("models") or []
+        if models and model_name not in models:
+            return None
+        if config.get("threshold_ms"):
+            threshold = config["threshold_ms"] / 1000
+        else:
+            threshold = self.scheduler.percentile_ttft(0.95)
+            if threshold is None:
+                return None
+        return max(threshold, (config.get("min_threshold_ms") or 0) / 1000)
+
+    def _acquire_hedge_target(self, api_key, tried_keys, min_interval=0.0):
+        """
+        为对冲请求选择 (Key, Base URL)：优先使用其他Key，其次在备用Base URL上复用当前Key
+        限速时只使用未超出速率上限的其他Key，不等待，也不复用刚发起请求的当前Key
+
+        Returns:
+            tuple | None: (api_key, api_base)，没有可用目标时返回None
+        """
+        try:
+            hedge_key = self.scheduler.try_acquire(exclude=set(tried_keys) | {api_key}, min_interval=min_interval)
+            if hedge_key:
+                return hedge_key, self.api_base
+        except RuntimeError:
+            pass
+        if min_interval > 0:
+            return None
+        for api_base in self.hedging.get("api_bases") or []:
+            if api_base and api_base != self.api_base and self.scheduler.reserve(api_key):
+                return api_key, api_base
+        return None
+
+    async def _open_stream(self, api_key, api_base, model_name, messages, params):
+        """发起流式请求并等待首个片段，返回 _PeekedStream"""
+        client = self.client_pool.get_async_client(api_key, api_base)
+        response = await client.chat.completions.create(model=model_name, messages=messages, **params)
+        iterator = response.__aiter__()
+        try:
+            first_chunk = await iterator.__anext__()
+        except StopAsyncIteration:
+            first_chunk = None
+        except BaseException:
+            # 等待首个片段时失败或被取消，关闭响应释放连接
+            await response.close()
+            raise
+        return _PeekedStream(response, iterator, first_chunk)
+
+    @staticmethod
+    def _estimate_prompt_tokens(messages):
+        """粗略估算prompt token数：ASCII字符约4个一个token，其余字符各算一个"""
+        total = 0
+        for message in messages:
+            content = message.get("content") or ""
+            if not isinstance(content, str):
+                content = str(content)
+            ascii_chars = sum(1 for char in content if ord(char) < 128)
+            total += ascii_chars // 4 + (len(content) - ascii_chars) + 4
+        return total
+
+    async def _create_hedged(self, api_key, tried_keys, threshold, model_name, messages, params, min_interval=0.0):
+        """
+        带对冲的流式请求
+
+        先用 api_key 发起请求；threshold 秒内没有收到首个片段时，在另一个Key或备用Base URL上
+        发起相同请求，使用先返回首个片段的一方，取消另一方。
+
+        Key的释放约定：除 api_key 外的Key都在此处释放；若胜出的不是 api_key，
+        api_key 也在此处释放。抛出异常时 api_key 由调用方释放。
+
+        Returns:
+            tuple: (胜出的api_key, 响应, 请求开始时间)
+
+        Raises:
+            Exception: 所有请求都失败时抛出原请求的异常
+        """
+        self._count_hedge(hedged_requests=1)
+        start_time = time.monotonic()
+        primary = asyncio.ensure_future(self._open_stream(api_key, self.api_base, model_name, messages, params))
+        attempts = {primary: (api_key, start_time)}
+        winner = None
+        released = set()
+        primary_error = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=threshold)
+            if not done:
+                target = self._acquire_hedge_target(api_key, tried_keys, min_interval)
+                if target:
+                    hedge_key, hedge_base = target
+                    tried_keys.add(hedge_key)
+                    LoggerManager().get_logger().debug(
+                        f"首token超过 {threshold * 1000:.0f}ms，发起对冲请求 (Key {hedge_key[:8]}..., {hedge_base})"
+                    )
+                    hedge = asyncio.ensure_future(self._open_stream(hedge_key, hedge_base, model_name, messages, params))
+                    attempts[hedge] = (hedge_key, time.monotonic())
+                    self._count_hedge(hedges_fired=1)
+
+            pending = set(attempts)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if winner is None:
+                            winner = task
+                        continue
+                    if task is primary:
+                        primary_error = error
+                    else:
+                        status_code, retry_after = self._describe_error(error)
+                        self.scheduler.release(attempts[task][0], error=True, status_code=status_code, retry_after=retry_after)
+                        released.add(task)
+                    LoggerManager().get_logger().warning(f"API Key {attempts[task][0][:8]}... 对冲请求失败: {error}")
+
+            if winner is None:
+                raise primary_error or RuntimeError("对冲请求全部失败")
+            if len(attempts) > 1:
+                self._count_hedge(**{"primary_wins" if winner is primary else "hedge_wins": 1})
+            if winner is not primary:
+                if primary_error is not None:
+                    status_code, retry_after = self._describe_error(primary_error)
+                    self.scheduler.release(api_key, error=True, status_code=status_code, retry_after=retry_after)
+                else:
+                    self.scheduler.release(api_key)
+                released.add(primary)
+            winner_key, winner_start = attempts[winner]
+            return winner_key, winner.result(), winner_start
+        finally:
+            # 取消并关闭落败的一方
+            for task, (task_key, _) in attempts.items():
+                if task is winner:
+                    continue
+                succeeded = False
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    await task.result().close()
+                    succeeded = True
+                if task is primary and winner is None:
+                    continue  # 原请求的Key由调用方释放
+                if task not in released:
+                    self.scheduler.release(task_key)
+                if not task.done() or succeeded or task.cancelled():
+                    self._count_hedge(
+                        extra_prompt_tokens=self._estimate_prompt_tokens(messages),
+                        extra_completion_chunks=1 if succeeded else 0
+                    )
+    #endregion
+
+    async def _stream_chunks_async(self, api_key, response, start_time, request_id=None, with_choice_index=False):
+        """_stream_chunks 的异步版本"""
+        first_token = True
+        failed = False
+        finished = False
+        try:
+            async for chunk in response:
+                # 拉取模式下每个片段由不同任务驱动，记录当前任务以便打断
+                self._track_request(request_id, task=asyncio.current_task())
+                if first_token:
+                    self.scheduler.record_first_token(api_key, time.monotonic() - start_time)
+                    first_token = False
+                if getattr(chunk, "usage", None):
+                    self._record_usage(request_id, chunk.usage)
+                if not chunk.choices:
+                    continue
+                if with_choice_index:
+                    for choice in chunk.choices:
+                        yield choice.index, choice.delta.content or ""
+                else:
+                    yield chunk.choices[0].delta.content or ""
+            finished = True
         except Exception as e:
+            if self.is_cancelled(request_id):
+                return
+            failed = True
+            status_code, retry_after = self._describe_error(e)
+            self.scheduler.release(api_key, error=True, status_code=status_code, retry_after=retry_after)
             raise RuntimeError(f"LLM 通信失败: {e}")
+        finally:
+            if not finished:
+                # 提前结束(打断/消费方关闭)时立即关闭HTTP响应，停止下载和上游生成
+                await response.close()
+            if not failed:
+                latency = time.monotonic() - start_time if finished else None
+                self.scheduler.release(api_key, latency=latency)
+            self._untrack_request(request_id)
 
     def fetch_available_models(self):
         if not self.adapter:
@@ -194,4 +873,19 @@ class LLMAdapter:
             model_names = [model.id for model in model_list.data]
             return model_names
         except Exception as e:
-            raise RuntimeError(f"获取模型列表失败: {e} (url: {self.api_base})")
\ No newline at end of file
+            raise RuntimeError(f"获取模型列表失败: {e} (url: {self.api_base})")
+
+    async def fetch_available_models_async(self, api_base=None):
+        """
+        异步获取模型列表，必须在 LLMEventLoop 共享事件循环上执行
+        @param api_base: 要查询的Base URL，默认为当前配置的Base URL
+        """
+        if not self.adapter or not self.api_keys:
+            raise RuntimeError("LLMAdapter 未连接到 API，请先配置 API 连接。")
+        api_base = api_base or self.api_base
+        try:
+            client = self.client_pool.get_async_client(self.api_keys[0], api_base)
+            model_list = await client.models.list()
+            return [model.id for model in model_list.data]
+        except Exception as e:
+            raise RuntimeError(f"获取模型列表失败: {e} (url: {api_base})")
\ No newline at end of file
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional
+from utils.path_utils import get_core_path
+from global_managers.logger_manager import LoggerManager
+
+DEFAULT_MAX_MEMORY_ENTRIES = 128  # 内存LRU缓存的条目上限
+DEFAULT_MAX_DISK_MB = 64  # 磁盘缓存的容量上限(MB)
+
+
+class LLMResponseCache:
+    """
+    LLM响应缓存
+
+    两级缓存: 内存LRU在前，磁盘存储在后(SECRETS/persistence/llm/response_cache)。
+    每条缓存保存完整的响应片段列表，命中时按原始片段回放，调用方看到的仍是流式接口。
+
+    缓存键是 (api_base, model, messages, params) 的规范化哈希，
+    不包含 stream 参数，流式与非流式请求共享同一条缓存。
+
+    磁盘缓存按最近访问时间(文件mtime)淘汰，总大小不超过 max_disk_mb。
+
+    示例：
+        ```
+        cache = LLMResponseCache()
+        key = cache.make_key(model, messages, params)
+        chunks = cache.get(key)
+        if chunks is None:
+            chunks = [...]
+            cache.put(key, chunks)
+        ```
+    """
+
+    def __init__(self, max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+                 max_disk_mb: float = DEFAULT_MAX_DISK_MB, directory: Optional[str] = None):
+        self.directory = directory or os.path.join(
+            get_core_path(), "SECRETS", "persistence", "llm", "response_cache"
+        )
+        self.max_memory_entries = max(0, max_memory_entries)
+        self.max_disk_bytes = int(max(0, max_disk_mb) * 1024 * 1024)
+        self._memory: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._disk_index: Optional[Dict[str, List]] = None  # key -> [size, last_access]，首次使用时扫描目录
+        self._disk_bytes = 0
+        self._lock = Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], params: Dict, api_base: str = "") -> str:
+        """计算请求的规范化哈希"""
+        canonical_params = {key: value for key, value in (params or {}).items() if key != "stream"}
+        payload = json.dumps(
+            {"api_base": api_base or "", "model": model, "messages": messages, "params": canonical_params},
+            sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def configure(self, max_memory_entries: Optional[int] = None, max_disk_mb: Optional[float] = None) -> None:
+        """运行时修改容量上限，超出部分立即淘汰"""
+        with self._lock:
+            if max_memory_entries is not None:
+                self.max_memory_entries = max(0, max_memory_entries)
+            if max_disk_mb is not None:
+                self.max_disk_bytes = int(max(0, max_disk_mb) * 1024 * 1024)
+            self._trim_memory()
+            if self._disk_index is not None:
+                self._trim_disk()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_disk_index(self) -> None:
+        """扫描磁盘缓存目录，建立大小与访问时间索引(需持有锁)"""
+        if self._disk_index is not None:
+            return
+        self._disk_index = {}
+        self._disk_bytes = 0
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except OSError:
+                continue
+            self._disk_index[filename[:-5]] = [stat.st_size, stat.st_mtime]
+            self._disk_bytes += stat.st_size
+
+    def _trim_memory(self) -> None:
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _trim_disk(self) -> None:
+        """按最近访问时间淘汰磁盘缓存直到总大小不超过上限(需持有锁)"""
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        for key, (size, _) in sorted(self._disk_index.items(), key=lambda item: item[1][1]):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del self._disk_index[key]
+            self._disk_bytes -= size
+            self._evictions += 1
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """
+        查询缓存
+
+        Returns:
+            Optional[List[str]]: 缓存的响应片段，未命中时返回None
+        """
+        with self._lock:
+            chunks = self._memory.get(key)
+            if chunks is not None:
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return list(chunks)
+            self._load_disk_index()
+            if key not in self._disk_index:
+                self._misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    chunks = json.load(f)["chunks"]
+                # 更新访问时间，磁盘淘汰按最近访问排序
+                now = time.time()
+                os.utime(path, (now, now))
+                self._disk_index[key][1] = now
+            except (OSError, ValueError, KeyError) as e:
+                LoggerManager().get_logger().warning(f"LLMResponseCache: 读取缓存失败，已丢弃: {e}")
+                self._disk_bytes -= self._disk_index.pop(key)[0]
+                self._misses += 1
+                return None
+            self._memory[key] = chunks
+            self._trim_memory()
+            self._hits += 1
+            self._disk_hits += 1
+            return list(chunks)
+
+    def put(self, key: str, chunks: List[str], model: Optional[str] = None) -> None:
+        """写入缓存(内存与磁盘)"""
+        chunks = list(chunks)
+        with self._lock:
+            self._memory[key] = chunks
+            self._memory.move_to_end(key)
+            self._trim_memory()
+            self._load_disk_index()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(key)
+                temp_path = f"{path}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump({"model": model, "created": time.time(), "chunks": chunks}, f, ensure_ascii=False)
+                os.replace(temp_path, path)
+                size = os.path.getsize(path)
+            except OSError as e:
+                LoggerManager().get_logger().warning(f"LLMResponseCache: 写入缓存失败: {e}")
+                return
+            if key in self._disk_index:
+                self._disk_bytes -= self._disk_index[key][0]
+            self._disk_index[key] = [size, time.time()]
+            self._disk_bytes += size
+            self._trim_disk()
+
+    def clear(self) -> None:
+        """清空内存与磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._load_disk_index()
+            for key in list(self._disk_index):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._disk_index = {}
+            self._disk_bytes = 0
+
+    def get_stats(self) -> Dict:
+        """获取命中/未命中次数、条目数与磁盘占用"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else None,
+                "evictions": self._evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk_index) if self._disk_index is not None else None,
+                "disk_bytes": self._disk_bytes if self._disk_index is not None else None,
+            }
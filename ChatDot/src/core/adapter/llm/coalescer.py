@@ -0,0 +1,127 @@
+import asyncio
+import time
+from contextlib import suppress
+from typing import AsyncIterator, Dict, Optional
+
+DEFAULT_MAX_LATENCY_MS = 30  # 片段在窗口中最多停留的时间
+DEFAULT_MAX_CHARS = 64  # 窗口累积到多少字符时立即输出
+
+
+class ChunkCoalescer:
+    """
+    流式片段合并器(推模式)
+
+    上游LLM常常每个delta只有一两个字符，逐个分发给UI/TTS/Live2D的开销很大。
+    合并器把连续片段累积到窗口中，满足以下任一条件时整体输出:
+    - 窗口中第一个片段已等待超过 max_latency_ms
+    - 窗口累积字符数达到 max_chars
+
+    推模式只在新片段到达时检查时间，流结束时需调用 flush() 取出剩余内容。
+
+    示例：
+        ```
+        coalescer = ChunkCoalescer(max_latency_ms=30, max_chars=64)
+        for chunk in response_iterator:
+            text = coalescer.push(chunk)
+            if text:
+                consume(text)
+        rest = coalescer.flush()
+        ```
+    """
+
+    def __init__(self, max_latency_ms: float = DEFAULT_MAX_LATENCY_MS, max_chars: int = DEFAULT_MAX_CHARS):
+        self.max_latency = max(0.0, (max_latency_ms or 0) / 1000)
+        self.max_chars = max(1, max_chars or DEFAULT_MAX_CHARS)
+        self._parts = []
+        self._size = 0
+        self._window_start = None
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict]) -> Optional["ChunkCoalescer"]:
+        """根据配置创建合并器，配置为空时返回None(不合并)"""
+        if not config:
+            return None
+        return cls(
+            max_latency_ms=config.get("max_latency_ms", DEFAULT_MAX_LATENCY_MS),
+            max_chars=config.get("max_chars", DEFAULT_MAX_CHARS)
+        )
+
+    def push(self, chunk: str) -> Optional[str]:
+        """
+        加入一个片段
+
+        Returns:
+            Optional[str]: 窗口满足输出条件时返回合并后的文本，否则返回None
+        """
+        if chunk:
+            if self._window_start is None:
+                self._window_start = time.monotonic()
+            self._parts.append(chunk)
+            self._size += len(chunk)
+        if not self._parts:
+            return None
+        if self._size >= self.max_chars or time.monotonic() - self._window_start >= self.max_latency:
+            return self.flush()
+        return None
+
+    def flush(self) -> str:
+        """取出窗口中的全部内容"""
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._window_start = None
+        return text
+
+
+async def coalesce_async(source: AsyncIterator[str], max_latency_ms: float = DEFAULT_MAX_LATENCY_MS,
+                         max_chars: int = DEFAULT_MAX_CHARS) -> AsyncIterator[str]:
+    """
+    合并异步片段流(拉模式)
+
+    与 ChunkCoalescer 的区别在于会按时间主动输出: 即使上游暂时没有新片段，
+    窗口中的内容也会在 max_latency_ms 后输出，因此增加的延迟有严格上界。
+    等待超时时不会取消上游的取值任务，不会破坏上游异步生成器。
+    """
+    max_latency = max(0.0, (max_latency_ms or 0) / 1000)
+    max_chars = max(1, max_chars or DEFAULT_MAX_CHARS)
+    parts = []
+    size = 0
+    deadline = None
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(source.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # 窗口超时，输出已累积内容，继续等待同一个取值任务
+                yield "".join(parts)
+                parts, size, deadline = [], 0, None
+                continue
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                break
+            pending = None
+            if not chunk:
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + max_latency
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= max_chars or time.monotonic() >= deadline:
+                yield "".join(parts)
+                parts, size, deadline = [], 0, None
+        if parts:
+            yield "".join(parts)
+    finally:
+        if pending is not None and not pending.done():
+            # 等取值任务真正结束后再关闭上游，否则 aclose() 会因生成器仍在运行而报错
+            pending.cancel()
+            with suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import AsyncIterator, Awaitable, Iterator, Optional
+from global_managers.logger_manager import LoggerManager
+
+
+class LLMEventLoop:
+    """
+    LLM模块共享的事件循环 (单例模式)
+
+    在一个后台守护线程中运行唯一的 asyncio 事件循环，所有异步LLM请求都在此循环上执行。
+    同步调用方通过 run()/iterate() 把协程或异步迭代器桥接为同步接口，
+    因此并发的多个对话不再需要每个请求一个线程。
+
+    示例：
+        ```
+        loop = LLMEventLoop()
+        for chunk in loop.iterate(llm_service.send_message_async(messages)):
+            print(chunk, end='')
+        ```
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                instance = super(LLMEventLoop, cls).__new__(cls)
+                instance._loop = asyncio.new_event_loop()
+                instance._thread = threading.Thread(
+                    target=instance._run_loop,
+                    name="LLMEventLoop",
+                    daemon=True
+                )
+                instance._thread.start()
+                cls._instance = instance
+        return cls._instance
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        LoggerManager().get_logger().debug("LLMEventLoop: 共享事件循环已启动")
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def in_loop_thread(self) -> bool:
+        """当前是否在事件循环线程中"""
+        return threading.get_ident() == self._thread.ident
+
+    def submit(self, coro: Awaitable) -> Future:
+        """把协程提交到共享事件循环，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """
+        在共享事件循环上执行协程并同步等待结果
+
+        Raises:
+            RuntimeError: 在事件循环线程中调用(会造成死锁)
+        """
+        if self.in_loop_thread():
+            raise RuntimeError("不能在 LLMEventLoop 线程中同步等待协程")
+        return self.submit(coro).result(timeout)
+
+    def call_soon(self, callback, *args) -> None:
+        """线程安全地在事件循环上调度回调"""
+        self._loop.call_soon_threadsafe(callback, *args)
+
+    def iterate(self, async_iterator: AsyncIterator) -> Iterator:
+        """
+        把异步迭代器转换为同步迭代器
+
+        每次取值都直接在共享事件循环上等待下一个元素，不经过额外的线程或队列。
+        取值任务被取消时视为迭代结束。
+        同步迭代器提前关闭时，会在事件循环上关闭对应的异步生成器。
+        """
+        try:
+            while True:
+                try:
+                    item = self.run(async_iterator.__anext__())
+                except (StopAsyncIteration, CancelledError):
+                    # 正常结束，或驱动任务被打断(如 stop_generating)
+                    break
+                yield item
+        finally:
+            aclose = getattr(async_iterator, "aclose", None)
+            if aclose is not None:
+                try:
+                    self.run(aclose())
+                except Exception as e:
+                    LoggerManager().get_logger().warning(f"LLMEventLoop: 关闭异步迭代器失败: {e}")
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from concurrent.futures import Future
+from threading import Lock
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+from global_managers.persistence_manager import PersistenceManager
+from global_managers.logger_manager import LoggerManager
+from adapter.llm.event_loop import LLMEventLoop
+
+DEFAULT_CATALOG_TTL = 3600  # 模型列表缓存的有效期(秒)
+CATALOG_FILENAME = "model_catalog.json"
+
+
+class ModelCatalog:
+    """
+    模型列表缓存 (按 Base URL 区分)
+
+    - 缓存在有效期(TTL)内直接返回，不访问 /models
+    - 过期后先返回旧数据，同时在 LLMEventLoop 上后台刷新(stale-while-revalidate)
+    - 没有缓存时同步获取
+    - 缓存持久化到 SECRETS/persistence/llm/model_catalog.json，启动后下拉框可立即填充
+    - 多个 Base URL 可在共享事件循环上并行刷新
+
+    示例：
+        ```
+        catalog = ModelCatalog(fetcher=adapter.fetch_available_models_async)
+        models = catalog.get("https://api.openai.com/v1")
+        catalog.refresh_all(["https://a/v1", "https://b/v1"])
+        ```
+    """
+
+    def __init__(self, fetcher: Callable[[str], Awaitable[List[str]]], ttl_seconds: float = DEFAULT_CATALOG_TTL):
+        """
+        Args:
+            fetcher: 异步获取指定 Base URL 模型列表的函数，在 LLMEventLoop 上执行
+            ttl_seconds: 缓存有效期(秒)
+        """
+        self.fetcher = fetcher
+        self.ttl_seconds = ttl_seconds
+        self.persistence_manager = PersistenceManager()
+        self._lock = Lock()
+        self._entries: Dict[str, Dict] = {}  # api_base -> {"models": [...], "fetched_at": 时间戳}
+        self._refreshing: Dict[str, Future] = {}  # 进行中的刷新，避免重复请求
+        self._load()
+
+    def _load(self) -> None:
+        data = self.persistence_manager.load("llm", CATALOG_FILENAME) or {}
+        with self._lock:
+            self._entries = {
+                api_base: entry for api_base, entry in data.items()
+                if isinstance(entry, dict) and isinstance(entry.get("models"), list)
+            }
+
+    def _save(self) -> None:
+        with self._lock:
+            data = {api_base: dict(entry) for api_base, entry in self._entries.items()}
+        try:
+            self.persistence_manager.save("llm", data, CATALOG_FILENAME)
+        except Exception as e:
+            LoggerManager().get_logger().warning(f"ModelCatalog: 保存模型列表缓存失败: {e}")
+
+    def set_ttl(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else DEFAULT_CATALOG_TTL
+
+    def peek(self, api_base: str) -> Optional[List[str]]:
+        """返回缓存中的模型列表(不论是否过期)，没有缓存时返回None"""
+        with self._lock:
+            entry = self._entries.get(api_base)
+            return list(entry["models"]) if entry else None
+
+    def is_fresh(self, api_base: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(api_base)
+            return bool(entry) and time.time() - entry.get("fetched_at", 0) < self.ttl_seconds
+
+    async def _refresh_async(self, api_base: str) -> List[str]:
+        models = await self.fetcher(api_base)
+        with self._lock:
+            self._entries[api_base] = {"models": list(models), "fetched_at": time.time()}
+        await asyncio.get_running_loop().run_in_executor(None, self._save)
+        LoggerManager().get_logger().debug(f"ModelCatalog: 已刷新 {api_base} 的模型列表 ({len(models)} 个)")
+        return list(models)
+
+    def refresh(self, api_base: str) -> Future:
+        """
+        在共享事件循环上刷新指定 Base URL 的模型列表
+
+        Returns:
+            Future: 结果为模型列表；同一 Base URL 正在刷新时返回同一个 Future
+        """
+        with self._lock:
+            future = self._refreshing.get(api_base)
+            if future is not None and not future.done():
+                return future
+            future = LLMEventLoop().submit(self._refresh_async(api_base))
+            self._refreshing[api_base] = future
+
+        def on_done(done_future: Future):
+            with self._lock:
+                if self._refreshing.get(api_base) is done_future:
+                    del self._refreshing[api_base]
+            if not done_future.cancelled() and done_future.exception() is not None:
+                LoggerManager().get_logger().warning(
+                    f"ModelCatalog: 刷新 {api_base} 的模型列表失败: {done_future.exception()}"
+                )
+
+        future.add_done_callback(on_done)
+        return future
+
+    def refresh_all(self, api_bases: Iterable[str], wait: bool = False,
+                    timeout: Optional[float] = None) -> Dict[str, Optional[List[str]]]:
+        """
+        并行刷新多个 Base URL
+
+        Args:
+            api_bases: Base URL 列表
+            wait: 是否等待全部刷新完成
+            timeout: 等待的超时时间(秒)
+
+        Returns:
+            Dict[str, Optional[List[str]]]: wait 为True时返回各 Base URL 的最新模型列表(失败为None)，否则返回空字典
+        """
+        futures = {api_base: self.refresh(api_base) for api_base in dict.fromkeys(api_bases) if api_base}
+        if not wait:
+            return {}
+        results = {}
+        for api_base, future in futures.items():
+            try:
+                results[api_base] = future.result(timeout)
+            except Exception:
+                results[api_base] = None
+        return results
+
+    def refresh_stale(self, api_bases: Iterable[str]) -> None:
+        """后台刷新已过期或没有缓存的 Base URL"""
+        self.refresh_all([api_base for api_base in api_bases if api_base and not self.is_fresh(api_base)])
+
+    def get(self, api_base: str, force_refresh: bool = False, timeout: Optional[float] = None) -> List[str]:
+        """
+        获取模型列表
+
+        Args:
+            api_base: Base URL
+            force_refresh: 忽略缓存，同步获取最新列表
+            timeout: 同步获取的超时时间(秒)
+
+        Raises:
+            Exception: 需要同步获取且获取失败时
+        """
+        cached = self.peek(api_base)
+        if cached is not None and not force_refresh:
+            if not self.is_fresh(api_base):
+                # 过期: 先返回旧数据，后台刷新
+                self.refresh(api_base)
+            return cached
+        return self.refresh(api_base).result(timeout)
+
+    def invalidate(self, api_base: Optional[str] = None) -> None:
+        """使缓存失效，api_base 为None时清空全部"""
+        with self._lock:
+            if api_base is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(api_base, None)
+        self._save()
@@ -0,0 +1,304 @@
+import asyncio
+import time
+from collections import deque
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+from global_managers.logger_manager import LoggerManager
+
+DEFAULT_STATS_WINDOW = 20  # 滚动统计窗口(最近N次请求)
+DEFAULT_COOLDOWN_SECONDS = 30  # 429 未给出 Retry-After 时的默认冷却时间
+ERROR_COOLDOWN_SECONDS = 10  # 连续失败后的基础冷却时间
+ERROR_COOLDOWN_THRESHOLD = 3  # 连续失败多少次后进入冷却
+
+
+class KeyStats:
+    """单个API Key的运行统计"""
+
+    def __init__(self, api_key: str, window: int = DEFAULT_STATS_WINDOW):
+        self.api_key = api_key
+        self.in_flight = 0
+        self.total_requests = 0
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+        self.last_acquired = 0.0  # 最近一次被选中的时间，用于按Key限速
+        self.ttft = deque(maxlen=window)  # 首token耗时(秒)
+        self.latency = deque(maxlen=window)  # 完整请求耗时(秒)
+        self.outcomes = deque(maxlen=window)  # 最近请求结果: "ok" / "error" / "429"
+
+    def _rate(self, kind: str) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for outcome in self.outcomes if outcome == kind) / len(self.outcomes)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for outcome in self.outcomes if outcome != "ok") / len(self.outcomes)
+
+    @property
+    def rate_limit_rate(self) -> float:
+        return self._rate("429")
+
+    @staticmethod
+    def _avg(values) -> Optional[float]:
+        return sum(values) / len(values) if values else None
+
+    @property
+    def avg_ttft(self) -> Optional[float]:
+        return self._avg(self.ttft)
+
+    @property
+    def avg_latency(self) -> Optional[float]:
+        return self._avg(self.latency)
+
+    def is_cooling_down(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+    def is_rate_limited(self, now: float, min_interval: float) -> bool:
+        return min_interval > 0 and now - self.last_acquired < min_interval
+
+    def to_dict(self, now: float) -> Dict:
+        return {
+            "key": f"{self.api_key[:8]}...",
+            "in_flight": self.in_flight,
+            "total_requests": self.total_requests,
+            "avg_ttft": self.avg_ttft,
+            "avg_latency": self.avg_latency,
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+            "cooldown_remaining": max(0.0, self.cooldown_until - now),
+        }
+
+
+class APIKeyScheduler:
+    """
+    基于健康状态的API Key调度器
+
+    取代简单的轮询，为每个Key记录:
+    - 当前并发数(in-flight)
+    - 滚动的首token耗时(TTFT)与总耗时
+    - 错误率与429比例
+    - Retry-After 冷却时间
+
+    选择Key时优先挑选不在冷却中、并发最少、错误率最低、TTFT最低的Key。
+
+    示例：
+        ```
+        scheduler = APIKeyScheduler(['key1', 'key2'])
+        key = scheduler.acquire()
+        try:
+            ...
+            scheduler.record_first_token(key, 0.4)
+            scheduler.release(key, latency=2.1)
+        except Exception:
+            scheduler.release(key, error=True, status_code=429, retry_after=10)
+        ```
+    """
+
+    def __init__(self, api_keys: Iterable[str] = (), window: int = DEFAULT_STATS_WINDOW,
+                 cooldown_seconds: float = DEFAULT_COOLDOWN_SECONDS):
+        self.window = window
+        self.cooldown_seconds = cooldown_seconds
+        self._stats: Dict[str, KeyStats] = {}
+        self._order: List[str] = []
+        self._lock = Lock()
+        self.set_keys(api_keys)
+
+    def set_keys(self, api_keys: Iterable[str]) -> None:
+        """设置可用Key列表，已存在的Key保留统计数据"""
+        with self._lock:
+            self._order = list(dict.fromkeys(api_keys))
+            self._stats = {
+                key: self._stats.get(key) or KeyStats(key, self.window)
+                for key in self._order
+            }
+
+    def get_keys(self) -> List[str]:
+        return list(self._order)
+
+    def set_cooldown_seconds(self, seconds: float) -> None:
+        self.cooldown_seconds = seconds or DEFAULT_COOLDOWN_SECONDS
+
+    def _score(self, stats: KeyStats):
+        # 顺序比较: 并发数 -> 错误率 -> 平均TTFT(无数据视为0，优先试用新Key) -> 配置顺序
+        return (
+            stats.in_flight,
+            round(stats.error_rate, 2),
+            stats.avg_ttft or 0.0,
+            self._order.index(stats.api_key),
+        )
+
+    def _select(self, exclude: Iterable[str], min_interval: float):
+        """
+        选择一个Key并增加其并发计数 (持锁调用)
+
+        Returns:
+            tuple: (选中的API Key, 0)；限速时所有未冷却的Key都超出速率上限则返回 (None, 需等待的秒数)
+
+        Raises:
+            RuntimeError: 没有可用的Key
+        """
+        exclude = set(exclude)
+        now = time.monotonic()
+        candidates = [self._stats[key] for key in self._order if key not in exclude]
+        if not candidates:
+            raise RuntimeError("没有可用的API Key")
+        healthy = [stats for stats in candidates if not stats.is_cooling_down(now)]
+        if healthy and min_interval > 0:
+            # 限速时只选择未超出速率上限的Key，选中即记录时间，并发的请求不会拿到同一个空闲名额
+            ready = [stats for stats in healthy if not stats.is_rate_limited(now, min_interval)]
+            if not ready:
+                return None, min(stats.last_acquired + min_interval - now for stats in healthy)
+            healthy = ready
+        if healthy:
+            chosen = min(healthy, key=self._score)
+        else:
+            # 全部在冷却中，选择最早结束冷却的Key
+            chosen = min(candidates, key=lambda stats: stats.cooldown_until)
+            LoggerManager().get_logger().warning(
+                f"所有API Key均在冷却中，使用最早恢复的Key {chosen.api_key[:8]}..."
+            )
+        chosen.in_flight += 1
+        chosen.total_requests += 1
+        chosen.last_acquired = now
+        return chosen.api_key, 0.0
+
+    def acquire(self, exclude: Iterable[str] = ()) -> str:
+        """
+        选择一个Key并增加其并发计数
+
+        Args:
+            exclude: 本次不应选择的Key(如已经失败过的Key)
+
+        Returns:
+            str: 选中的API Key
+
+        Raises:
+            RuntimeError: 没有可用的Key
+        """
+        with self._lock:
+            return self._select(exclude, 0.0)[0]
+
+    def try_acquire(self, exclude: Iterable[str] = (), min_interval: float = 0.0) -> Optional[str]:
+        """
+        不等待地选择一个在速率上限内的Key
+
+        Args:
+            exclude: 本次不应选择的Key
+            min_interval: 同一个Key两次请求之间的最小间隔(秒)，0表示不限速
+
+        Returns:
+            Optional[str]: 选中的API Key，所有Key都超出速率上限时返回None
+
+        Raises:
+            RuntimeError: 没有可用的Key
+        """
+        with self._lock:
+            return self._select(exclude, min_interval)[0]
+
+    async def acquire_async(self, exclude: Iterable[str] = (), min_interval: float = 0.0) -> str:
+        """
+        选择一个Key，限速时等待直到有Key在速率上限内，必须在事件循环上调用
+
+        速率上限只作用于本次请求：不限速的请求(如交互式对话)不会等待，
+        但它们占用Key的时间同样计入限速请求的间隔。
+
+        Args:
+            exclude: 本次不应选择的Key
+            min_interval: 同一个Key两次请求之间的最小间隔(秒)，0表示不限速
+
+        Returns:
+            str: 选中的API Key
+
+        Raises:
+            RuntimeError: 没有可用的Key
+        """
+        while True:
+            with self._lock:
+                api_key, wait = self._select(exclude, min_interval)
+            if api_key is not None:
+                return api_key
+            await asyncio.sleep(wait)
+
+    def reserve(self, api_key: str) -> bool:
+        """
+        直接占用指定Key(如在备用Base URL上复用同一个Key)
+
+        Returns:
+            bool: Key是否存在
+        """
+        with self._lock:
+            stats = self._stats.get(api_key)
+            if not stats:
+                return False
+            stats.in_flight += 1
+            stats.total_requests += 1
+            stats.last_acquired = time.monotonic()
+            return True
+
+    def record_first_token(self, api_key: str, ttft: float) -> None:
+        """记录首token耗时"""
+        with self._lock:
+            stats = self._stats.get(api_key)
+            if stats:
+                stats.ttft.append(ttft)
+
+    def release(self, api_key: str, latency: Optional[float] = None, error: bool = False,
+                status_code: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+        """
+        请求结束时释放Key并记录结果
+
+        Args:
+            api_key: acquire 返回的Key
+            latency: 完整请求耗时(秒)，None表示不记录(如被中途打断)
+            error: 请求是否失败
+            status_code: 失败时的HTTP状态码
+            retry_after: 服务端返回的 Retry-After 秒数
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats.get(api_key)
+            if not stats:
+                return
+            stats.in_flight = max(0, stats.in_flight - 1)
+            if not error:
+                stats.consecutive_errors = 0
+                stats.outcomes.append("ok")
+                if latency is not None:
+                    stats.latency.append(latency)
+                return
+
+            stats.consecutive_errors += 1
+            if status_code == 429:
+                stats.outcomes.append("429")
+                cooldown = retry_after if retry_after is not None else self.cooldown_seconds
+            else:
+                stats.outcomes.append("error")
+                cooldown = 0.0
+                if stats.consecutive_errors >= ERROR_COOLDOWN_THRESHOLD:
+                    # 连续失败时指数退避，最长不超过默认冷却时间的数倍
+                    exponent = stats.consecutive_errors - ERROR_COOLDOWN_THRESHOLD
+                    cooldown = min(ERROR_COOLDOWN_SECONDS * (2 ** exponent), self.cooldown_seconds * 4)
+                if retry_after is not None:
+                    cooldown = max(cooldown, retry_after)
+            if cooldown > 0:
+                stats.cooldown_until = max(stats.cooldown_until, now + cooldown)
+                LoggerManager().get_logger().debug(
+                    f"API Key {api_key[:8]}... 进入冷却 {cooldown:.1f}s (status={status_code})"
+                )
+
+    def get_stats(self) -> List[Dict]:
+        """获取所有Key的统计信息(Key已脱敏)"""
+        now = time.monotonic()
+        with self._lock:
+            return [self._stats[key].to_dict(now) for key in self._order]
+
+    def percentile_ttft(self, percentile: float) -> Optional[float]:
+        """所有Key合并后的TTFT分位数(秒)，无数据时返回None"""
+        with self._lock:
+            samples = sorted(value for stats in self._stats.values() for value in stats.ttft)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile * (len(samples) - 1))))
+        return samples[index]
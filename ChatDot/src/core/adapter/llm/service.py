@@ -1,10 +1,17 @@
-from typing import Dict, Iterator, List
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from global_managers.service_manager import ServiceManager
 from adapter.llm.adapter import LLMAdapter
 from adapter.llm.settings import LLMSettings
 from adapter.llm.persistence import LLMPersistence
 from adapter.llm.worker import LLMWorker
+from adapter.llm.worker_pool import LLMWorkerPool
+from adapter.llm.coalescer import coalesce_async
+from adapter.llm.cache import LLMResponseCache
+from adapter.llm.model_catalog import ModelCatalog
+from adapter.llm.event_loop import LLMEventLoop
+import asyncio
 import traceback
+import uuid
 from global_managers.logger_manager import LoggerManager
 
 class LLMService:
@@ -15,6 +22,13 @@ class LLMService:
         self.settings = LLMSettings()
         self.persistence = LLMPersistence()
         self.adapter = LLMAdapter()
+        self.worker_pool = LLMWorkerPool()
+        self.response_cache = LLMResponseCache()
+        self.model_catalog = ModelCatalog(self.adapter.fetch_available_models_async)
+        self._pending_requests = set()  # 进行中(含排队)的请求ID，只有这些请求会被记录为打断
+        self._stopped_requests = set()  # 被 stop_generating 打断的请求ID，打断的响应不写入缓存
+        self._candidate_groups: Dict[str, List[str]] = {}  # 多候选请求ID -> 并发子请求ID
+        self._n_unsupported = set()  # 不支持 n 参数的 (api_base, model)
 
     def initialize(self):
         """初始化服务"""
@@ -29,6 +43,8 @@ class LLMService:
         # 初始化客户端配置
         self._initialize_adapter_config()
         self._initialized = True
+        # 后台刷新已过期的模型列表缓存，不阻塞启动
+        self.model_catalog.refresh_stale(self._get_api_bases())
         
     def _initialize_adapter_config(self):
         """初始化客户端配置"""
@@ -38,6 +54,19 @@ class LLMService:
         #LoggerManager().get_logger().debug(''.join(traceback.format_stack()[:-1]))  # 打印调用栈
         api_keys = self.settings.get_setting("api_keys")
         api_base = self.settings.get_setting("api_base")
+        self.adapter.set_pool_size(self.settings.get_setting("connection_pool_size"))
+        self.adapter.set_retry_policy(
+            max_key_retries=self.settings.get_setting("max_key_retries"),
+            cooldown_seconds=self.settings.get_setting("key_cooldown_seconds")
+        )
+        self.worker_pool.configure(
+            max_concurrency=self.settings.get_setting("max_concurrency"),
+            max_queue_size=self.settings.get_setting("max_queue_size"),
+            chunk_buffer_size=self.settings.get_setting("chunk_buffer_size")
+        )
+        self._configure_response_cache()
+        self.adapter.set_hedging_config(self.settings.get_setting("hedging"))
+        self.model_catalog.set_ttl(self.settings.get_setting("model_catalog_ttl"))
         self.adapter.set_api_config(api_keys, api_base, test_connection=False)
 
         model_name = self.settings.get_setting("model_name")
@@ -52,41 +81,368 @@ class LLMService:
             "api_keys": self.settings.get_setting("api_keys"),
             "api_base": self.settings.get_setting("api_base"),
             "model_name": self.settings.get_setting("model_name"),
-            "model_params": self.settings.get_setting("model_params")
+            "model_params": self.settings.get_setting("model_params"),
+            "connection_pool_size": self.settings.get_setting("connection_pool_size"),
+            "max_key_retries": self.settings.get_setting("max_key_retries"),
+            "key_cooldown_seconds": self.settings.get_setting("key_cooldown_seconds"),
+            "max_concurrency": self.settings.get_setting("max_concurrency"),
+            "max_queue_size": self.settings.get_setting("max_queue_size"),
+            "chunk_buffer_size": self.settings.get_setting("chunk_buffer_size"),
+            "stream_coalescing": self.settings.get_setting("stream_coalescing"),
+            "response_cache": self.settings.get_setting("response_cache"),
+            "hedging": self.settings.get_setting("hedging"),
+            "model_catalog_ttl": self.settings.get_setting("model_catalog_ttl"),
+            "candidate_mode": self.settings.get_setting("candidate_mode")
         }
         self.persistence.save_config(config)
 
-    def stop_generating(self):
-        """停止生成"""
-        self.adapter.stop_generating()
+    def stop_generating(self, request_id: str = None) -> bool:
+        """
+        停止生成，关闭上游HTTP响应
+        
+        Args:
+            request_id: 要停止的请求ID，None表示停止所有进行中的请求
+
+        Returns:
+            bool: 是否成功打断了进行中的请求
+        """
+        if request_id is None:
+            self._stopped_requests.update(self._pending_requests)
+            return self.adapter.stop_generating(None)
+        # 已结束或未开始的请求不记录，避免集合无限增长
+        if request_id in self._pending_requests:
+            self._stopped_requests.add(request_id)
+        stopped = self.adapter.stop_generating(request_id)
+        # 多候选请求的并发子请求一并停止
+        for sub_request_id in self._candidate_groups.get(request_id, []):
+            if sub_request_id in self._pending_requests:
+                self._stopped_requests.add(sub_request_id)
+            stopped = self.adapter.stop_generating(sub_request_id) or stopped
+        return stopped
+
+    @staticmethod
+    def new_request_id() -> str:
+        """生成新的请求ID"""
+        return uuid.uuid4().hex
     
+    async def send_message_async(self, messages: List[Dict], model_name: str = None,
+                                 model_params: Dict = None, request_id: str = None,
+                                 priority: int = 0, force_cache: bool = False,
+                                 rate_limit_per_key: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        异步发送消息到LLM，返回响应片段的异步迭代器
+        
+        必须在 LLMEventLoop 共享事件循环上迭代，多个对话可在同一循环上并发进行。
+        超出 max_concurrency 的请求会在工作池中排队。
+        启用响应缓存时，命中的请求按原始片段回放，不占用工作池名额。
+        
+        Args:
+            messages: 消息列表
+            model_name: 可选的模型名称
+            model_params: 可选的模型参数
+            request_id: 可选的请求ID，用于 stop_generating(request_id)
+            priority: 排队优先级，数值越小越优先
+            force_cache: 是否忽略 temperature 强制使用响应缓存(仍需启用缓存)
+            rate_limit_per_key: 本次请求每个Key每秒最多发起的请求数，None表示不限速(只作用于本次请求)
+
+        Yields:
+            str: 响应片段
+
+        Raises:
+            RuntimeError: 排队请求数已达上限或通信失败
+        """
+        request_id = request_id or self.new_request_id()
+        loop = asyncio.get_running_loop()
+        cache_key = self._get_cache_key(messages, model_name, model_params, force_cache)
+        self._pending_requests.add(request_id)
+        try:
+            if cache_key:
+                cached = await loop.run_in_executor(None, self.response_cache.get, cache_key)
+                if cached is not None:
+                    LoggerManager().get_logger().debug(f"LLMService: 响应缓存命中 {cache_key[:12]}")
+                    for chunk in cached:
+                        if request_id in self._stopped_requests:
+                            return
+                        yield chunk
+                    return
+
+            collected = []
+            async with self.worker_pool.admit(priority):
+                if request_id in self._stopped_requests:
+                    return  # 排队期间被打断
+                async for chunk in self.adapter.communicate_async(
+                    messages=messages,
+                    model_name=model_name,
+                    model_params_override=model_params,
+                    request_id=request_id,
+                    rate_limit_per_key=rate_limit_per_key
+                ):
+                    if request_id in self._stopped_requests:
+                        return  # 打断时请求尚未在适配器中登记，由这里结束
+                    if chunk:
+                        if cache_key:
+                            collected.append(chunk)
+                        yield chunk
+            # 只缓存完整结束的响应(出错、被打断或提前关闭的响应不会走到这里)
+            if cache_key and collected and request_id not in self._stopped_requests:
+                model = model_name or self.adapter.get_model_name()
+                await loop.run_in_executor(None, self.response_cache.put, cache_key, collected, model)
+        finally:
+            self._pending_requests.discard(request_id)
+            self._stopped_requests.discard(request_id)
+
     def send_message(self, messages: List[Dict], model_name: str = None, 
-                    model_params: Dict = None) -> Iterator[str]:
+                    model_params: Dict = None, request_id: str = None,
+                    priority: int = 0, force_cache: bool = False) -> Iterator[str]:
         """
         发送消息到LLM并返回响应迭代器
         
+        send_message_async 的同步包装，在共享事件循环上执行，不再为每个请求创建线程
+        
         Args:
             messages: 消息列表
             model_name: 可选的模型名称
             model_params: 可选的模型参数
+            request_id: 可选的请求ID，用于 stop_generating(request_id)，未提供时自动生成
+            priority: 排队优先级，数值越小越优先
+            force_cache: 是否忽略 temperature 强制使用响应缓存(仍需启用缓存)
 
         Returns:
             Iterator[str]: 响应迭代器
         """
-        worker = LLMWorker(
-            llm_adapter=self.adapter,
-            messages=messages,
-            model_name=model_name,
-            model_params=model_params
-        )
-        worker.start()
-        #worker.join()  # 等待响应完成（此操作会导致阻塞）
+        request_id = request_id or self.new_request_id()
+        source = self.send_message_async(messages, model_name, model_params, request_id, priority, force_cache)
+        ui_coalescing = self.get_coalescing_config("ui")
+        if ui_coalescing:
+            # 在共享事件循环上按时间窗口合并片段，减少UI刷新次数
+            source = coalesce_async(source, **ui_coalescing)
+        worker = LLMWorker(source, buffer_size=self.worker_pool.chunk_buffer_size)
         # 返回一个实时的响应迭代器
         return worker.get_response()
     
-    def fetch_models(self):
-        """获取可用模型列表"""
-        return self.adapter.fetch_available_models()
+    def _configure_response_cache(self):
+        config = self.settings.get_setting("response_cache") or {}
+        self.response_cache.configure(
+            max_memory_entries=config.get("max_memory_entries"),
+            max_disk_mb=config.get("max_disk_mb")
+        )
+
+    def _get_cache_key(self, messages: List[Dict], model_name: str = None,
+                       model_params: Dict = None, force_cache: bool = False) -> Optional[str]:
+        """
+        计算请求的缓存键，不可缓存时返回None
+
+        只有确定性请求(temperature 为0)才会缓存，除非配置或调用方强制缓存
+        """
+        config = self.settings.get_setting("response_cache") or {}
+        if not config.get("enabled"):
+            return None
+        params = dict(self.adapter.model_params or {})
+        if model_params:
+            params.update(model_params)
+        if not (force_cache or config.get("force") or params.get("temperature") == 0):
+            return None
+        model = model_name or self.adapter.get_model_name()
+        return LLMResponseCache.make_key(model, messages, params, self.adapter.api_base)
+
+    def get_request_usage(self, request_id: str) -> Optional[Dict]:
+        """获取请求的 usage（prompt_tokens、completion_tokens、提供方缓存命中的 cached_tokens）"""
+        return self.adapter.get_request_usage(request_id)
+
+    def get_hedge_stats(self) -> Dict:
+        """获取对冲请求统计（发出次数、胜出次数、额外token开销等）"""
+        return self.adapter.get_hedge_stats()
+
+    def get_cache_stats(self) -> Dict:
+        """获取响应缓存统计（命中/未命中次数、条目数、磁盘占用等）"""
+        return self.response_cache.get_stats()
+
+    def clear_response_cache(self):
+        """清空响应缓存"""
+        self.response_cache.clear()
+
+    def get_coalescing_config(self, consumer: str) -> Optional[Dict]:
+        """
+        获取某个消费者的片段合并配置
+
+        Args:
+            consumer: "ui" / "tts" / "live2d"
+
+        Returns:
+            Optional[Dict]: {"max_latency_ms", "max_chars"}，未启用合并时返回None
+        """
+        config = self.settings.get_setting("stream_coalescing") or {}
+        if not config.get("enabled"):
+            return None
+        window = config.get(consumer)
+        if not window:
+            return None
+        return {
+            "max_latency_ms": window.get("max_latency_ms", 0),
+            "max_chars": window.get("max_chars", 1)
+        }
+
+    def _get_api_bases(self) -> List[str]:
+        """当前配置的所有 Base URL(主地址与对冲备用地址)"""
+        hedging = self.settings.get_setting("hedging") or {}
+        api_bases = [self.adapter.api_base or self.settings.get_setting("api_base")]
+        api_bases.extend(hedging.get("api_bases") or [])
+        return [api_base for api_base in dict.fromkeys(api_bases) if api_base]
+
+    async def generate_candidates_async(self, messages: List[Dict], n: int, model_name: str = None,
+                                        model_params: Dict = None, request_id: str = None,
+                                        priority: int = 0) -> AsyncIterator[Tuple[int, str]]:
+        """
+        为同一轮对话并发生成 n 个候选回复
+
+        candidate_mode 为 "n" 时使用提供方的 n 参数(一次请求返回多个候选)；
+        为 "fanout" 时并发发起 n 个请求，由Key调度器分散到不同Key；
+        为 "auto" 时先尝试 n 参数，提供方报错或只返回一个候选时改为并发请求，并记住该 (Base URL, 模型) 不支持 n。
+        各候选的片段交错到达；单个候选失败时返回该候选的 "Error: ..." 片段。
+
+        Args:
+            messages: 消息列表
+            n: 候选数量
+            model_name: 可选的模型名称
+            model_params: 可选的模型参数
+            request_id: 可选的请求ID，stop_generating(request_id) 会停止所有候选
+            priority: 排队优先级，数值越小越优先
+
+        Yields:
+            Tuple[int, str]: (候选序号, 响应片段)
+        """
+        request_id = request_id or self.new_request_id()
+        n = max(1, int(n or 1))
+        mode = self.settings.get_setting("candidate_mode") or "auto"
+        support_key = (self.adapter.api_base, model_name or self.adapter.get_model_name())
+        remaining = list(range(n))
+        self._pending_requests.add(request_id)
+        try:
+            if n > 1 and (mode == "n" or (mode == "auto" and support_key not in self._n_unsupported)):
+                seen = set()
+                params = dict(model_params or {})
+                params["n"] = n
+                try:
+                    async with self.worker_pool.admit(priority):
+                        if request_id in self._stopped_requests:
+                            return  # 排队期间被打断
+                        async for index, chunk in self.adapter.communicate_async(
+                            messages=messages,
+                            model_name=model_name,
+                            model_params_override=params,
+                            request_id=request_id,
+                            with_choice_index=True
+                        ):
+                            if request_id in self._stopped_requests:
+                                return
+                            seen.add(index)
+                            if chunk:
+                                yield index, chunk
+                except RuntimeError as e:
+                    if mode != "auto" or seen:
+                        raise
+                    LoggerManager().get_logger().warning(f"LLMService: n 参数请求失败，改为并发请求: {e}")
+                    self._n_unsupported.add(support_key)
+                else:
+                    if request_id in self._stopped_requests:
+                        return
+                    remaining = [index for index in range(n) if index not in seen]
+                    if remaining:
+                        LoggerManager().get_logger().info(
+                            f"LLMService: 提供方只返回了 {len(seen)}/{n} 个候选，其余候选改为并发请求"
+                        )
+                        self._n_unsupported.add(support_key)
+                if not remaining:
+                    return
+
+            async for index, chunk in self._fan_out_candidates(
+                messages, remaining, model_name, model_params, request_id, priority
+            ):
+                yield index, chunk
+        finally:
+            self._pending_requests.discard(request_id)
+            self._stopped_requests.discard(request_id)
+
+    async def _fan_out_candidates(self, messages: List[Dict], indexes: List[int], model_name: str,
+                                  model_params: Dict, request_id: str, priority: int) -> AsyncIterator[Tuple[int, str]]:
+        """并发发起多个请求，按到达顺序交错返回 (候选序号, 片段)"""
+        queue = asyncio.Queue()
+        sub_request_ids = {index: f"{request_id}:{index}" for index in indexes}
+        self._candidate_groups[request_id] = list(sub_request_ids.values())
+
+        async def run_candidate(index: int, sub_request_id: str):
+            try:
+                async for chunk in self.send_message_async(messages, model_name, model_params, sub_request_id, priority):
+                    await queue.put((index, chunk))
+            except Exception as e:
+                LoggerManager().get_logger().warning(f"LLMService: 候选 {index} 生成失败: {e}")
+                await queue.put((index, f"Error: {str(e)}"))
+            finally:
+                await queue.put((index, None))
+
+        loop = asyncio.get_running_loop()
+        tasks = [loop.create_task(run_candidate(index, sub_id)) for index, sub_id in sub_request_ids.items()]
+        finished = 0
+        try:
+            while finished < len(tasks):
+                index, chunk = await queue.get()
+                if chunk is None:
+                    finished += 1
+                    continue
+                yield index, chunk
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            self._candidate_groups.pop(request_id, None)
+
+    def generate_candidates(self, messages: List[Dict], n: int, model_name: str = None,
+                            model_params: Dict = None, request_id: str = None,
+                            priority: int = 0) -> Iterator[Tuple[int, str]]:
+        """
+        generate_candidates_async 的同步包装
+
+        Returns:
+            Iterator[Tuple[int, str]]: (候选序号, 响应片段) 迭代器
+        """
+        return LLMEventLoop().iterate(
+            self.generate_candidates_async(messages, n, model_name, model_params, request_id, priority)
+        )
+
+    def fetch_models(self, force_refresh: bool = False) -> List[str]:
+        """
+        获取可用模型列表
+        
+        优先返回模型列表缓存，缓存过期时在后台刷新；没有缓存或 force_refresh 时同步获取
+
+        Args:
+            force_refresh: 是否忽略缓存
+        """
+        return self.model_catalog.get(self.adapter.api_base, force_refresh=force_refresh)
+
+    def get_cached_models(self) -> Optional[List[str]]:
+        """立即返回缓存的模型列表(可能已过期，过期时后台刷新)，没有缓存时返回None"""
+        api_base = self.adapter.api_base or self.settings.get_setting("api_base")
+        if not api_base:
+            return None
+        self.model_catalog.refresh_stale([api_base])
+        return self.model_catalog.peek(api_base)
+
+    def refresh_models(self, wait: bool = False) -> Dict[str, Optional[List[str]]]:
+        """并行刷新所有已配置 Base URL 的模型列表"""
+        return self.model_catalog.refresh_all(self._get_api_bases(), wait=wait)
+
+    def get_connection_stats(self) -> Dict:
+        """获取连接复用统计（复用/新建连接数等）"""
+        return self.adapter.get_connection_stats()
+
+    def get_pool_stats(self) -> Dict:
+        """获取工作池统计（并发数、排队数、排队耗时等）"""
+        return self.worker_pool.get_stats()
+
+    def get_key_stats(self) -> List[Dict]:
+        """获取每个API Key的调度统计（并发数、TTFT、错误率、冷却状态等）"""
+        return self.adapter.get_key_stats()
 
     def update_setting(self, key, value):
         """更新设置并保存"""
@@ -105,4 +461,24 @@ class LLMService:
         elif key == "model_params":
             # 更新模型参数
             self.adapter.set_model_params(value)
-        self.save_config()
\ No newline at end of file
+        elif key == "connection_pool_size":
+            # 更新连接池大小（会重建客户端）
+            self.adapter.set_pool_size(value)
+        elif key == "max_key_retries":
+            self.adapter.set_retry_policy(max_key_retries=value)
+        elif key == "key_cooldown_seconds":
+            self.adapter.set_retry_policy(cooldown_seconds=value)
+        elif key in ["max_concurrency", "max_queue_size", "chunk_buffer_size"]:
+            self.worker_pool.configure(**{key: value})
+        elif key == "response_cache":
+            self._configure_response_cache()
+        elif key == "hedging":
+            self.adapter.set_hedging_config(value)
+        elif key == "model_catalog_ttl":
+            self.model_catalog.set_ttl(value)
+        self.save_config()
+
+    def shutdown(self):
+        """关闭服务，释放所有HTTP连接"""
+        self.adapter.close()
+        LoggerManager().get_logger().debug("LLMService 已关闭")
\ No newline at end of file
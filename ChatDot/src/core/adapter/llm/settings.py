@@ -9,7 +9,34 @@ DEFAULT_LLM_SETTINGS = {
         "temperature": 0.7,
         "max_tokens": 2000,
         "stream": True
-    }
+    },
+    "connection_pool_size": 10,  # 每个API Key客户端的HTTP连接池大小
+    "max_key_retries": 2,  # 请求失败时最多换Key重试的次数
+    "key_cooldown_seconds": 30,  # 429 未返回 Retry-After 时Key的冷却时间(秒)
+    "max_concurrency": 4,  # 同时进行的LLM请求上限
+    "max_queue_size": 32,  # 排队等待的LLM请求上限，超出后拒绝
+    "chunk_buffer_size": 64,  # 每个请求预读缓冲的响应片段数上限
+    "stream_coalescing": {  # 流式片段合并: 按时间窗口(ms)或字符数合并上游delta，各消费者独立配置
+        "enabled": False,
+        "ui": {"max_latency_ms": 30, "max_chars": 32},
+        "tts": {"max_latency_ms": 150, "max_chars": 64},
+        "live2d": {"max_latency_ms": 100, "max_chars": 64}
+    },
+    "response_cache": {  # 响应缓存: 默认只缓存 temperature 为0 的请求，force 为True时缓存所有请求
+        "enabled": False,
+        "force": False,
+        "max_memory_entries": 128,
+        "max_disk_mb": 64
+    },
+    "hedging": {  # 对冲请求: 首token超过阈值时在其他Key/备用Base URL上发起相同请求，取先返回的一方
+        "enabled": False,
+        "models": [],  # 为空表示所有模型
+        "threshold_ms": 0,  # 0表示使用滚动P95 TTFT
+        "min_threshold_ms": 500,
+        "api_bases": []
+    },
+    "model_catalog_ttl": 3600,  # 模型列表缓存有效期(秒)，过期后先返回旧列表并在后台刷新
+    "candidate_mode": "auto"  # 多候选生成方式: "n"(使用n参数) / "fanout"(并发多个请求) / "auto"(先尝试n参数)
 }
 
 class LLMSettings:
@@ -1,69 +1,84 @@
-import threading
-import queue
-from typing import List, Dict, Optional, Iterator
+import asyncio
+from typing import AsyncIterator, Iterator, Optional
+from adapter.llm.event_loop import LLMEventLoop
+from adapter.llm.worker_pool import DEFAULT_CHUNK_BUFFER_SIZE
 from global_managers.logger_manager import LoggerManager
 
-class LLMWorker(threading.Thread):
-    """LLM工作线程，使用队列实现实时数据流"""
-    
-    def __init__(self, llm_adapter, messages: List[Dict], model_name: str = None, 
-                 model_params: Optional[Dict] = None):
-        super().__init__()
-        self.llm_adapter = llm_adapter
-        self.messages = messages
-        self.model_name = model_name
-        self.model_params = model_params or {}
+class LLMWorker:
+    """
+    LLM流式任务
+
+    在 LLMEventLoop 共享事件循环上驱动异步响应，对外提供同步的实时迭代接口，
+    不为每个请求创建线程。
+
+    上游响应由一个泵任务预读到有界缓冲区中；缓冲区满时泵任务暂停读取，
+    从而对上游HTTP流施加背压，慢消费者(如被TTS阻塞的生成器)不会导致内存无限增长。
+    """
+
+    def __init__(self, source: AsyncIterator[str], loop: Optional[LLMEventLoop] = None,
+                 buffer_size: int = DEFAULT_CHUNK_BUFFER_SIZE):
+        """
+        Args:
+            source: 产生响应片段的异步迭代器(如 LLMService.send_message_async)
+            loop: 共享事件循环，默认使用 LLMEventLoop 单例
+            buffer_size: 预读缓冲区可容纳的片段数
+        """
+        self.source = source
+        self.loop = loop or LLMEventLoop()
+        self.buffer_size = max(1, buffer_size)
         self._is_running = True
-        # 使用队列进行线程间通信
-        self.response_queue = queue.Queue()
+        self._buffer: Optional[asyncio.Queue] = None
+        self._pump_task: Optional[asyncio.Task] = None
         self.done = False  # 标记响应是否完成
 
-    def run(self) -> None:
-        """执行LLM通信，将响应放入队列"""
+    async def _pump(self):
+        """从上游读取片段放入有界缓冲区，并将异常转换为错误消息片段"""
         try:
-            response = self.llm_adapter.communicate(
-                messages=self.messages,
-                model_name=self.model_name,
-                model_params_override=self.model_params
-            )
-            
-            # 处理响应
-            if isinstance(response, Iterator):
-                for chunk in response:
-                    if not self._is_running:
-                        break
-                    if chunk:
-                        # 将每个片段放入队列
-                        self.response_queue.put(chunk)
-            else:
-                # 非流式响应，直接放入队列
-                self.response_queue.put(response)
-                
+            async for chunk in self.source:
+                if not self._is_running:
+                    break
+                if chunk:
+                    # 缓冲区满时在此等待，形成背压
+                    await self._buffer.put(chunk)
         except Exception as e:
             # 异常情况，发送错误消息
-            self.response_queue.put(f"Error: {str(e)}")
+            LoggerManager().get_logger().warning(f"LLMWorker: 响应出错: {e}")
+            await self._buffer.put(f"Error: {str(e)}")
         finally:
-            # 标记响应完成
+            # 标记响应完成，并确保上游异步生成器被关闭(释放连接与Key)
             self.done = True
-            # 添加结束标记
-            self.response_queue.put(None)
+            aclose = getattr(self.source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def _consume(self):
+        """从缓冲区依次取出片段，泵任务结束且缓冲区取空时结束"""
+        self._buffer = asyncio.Queue(maxsize=self.buffer_size)
+        self._pump_task = asyncio.get_running_loop().create_task(self._pump())
+        try:
+            while True:
+                if self._buffer.empty() and self._pump_task.done():
+                    break
+                getter = asyncio.ensure_future(self._buffer.get())
+                await asyncio.wait({getter, self._pump_task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+        finally:
+            if not self._pump_task.done():
+                self._pump_task.cancel()
 
     def stop(self) -> None:
-        """停止工作线程"""
+        """停止接收响应"""
         self._is_running = False
+        if self._pump_task is not None:
+            self.loop.call_soon(self._pump_task.cancel)
 
     def get_response(self) -> Iterator[str]:
         """
         返回实时响应迭代器
-        
-        使用生成器实时获取队列中的响应片段
+
+        每次迭代都在共享事件循环上从缓冲区获取下一个响应片段
         """
-        while True:
-            # 从队列中获取一个响应片段
-            chunk = self.response_queue.get()
-            
-            # None 是结束标记
-            if chunk is None:
-                break
-                
-            yield chunk
\ No newline at end of file
+        return self.loop.iterate(self._consume())
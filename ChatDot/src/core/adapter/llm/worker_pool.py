@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from threading import Lock
+from typing import Dict, Optional
+from adapter.llm.event_loop import LLMEventLoop
+from global_managers.logger_manager import LoggerManager
+
+DEFAULT_MAX_CONCURRENCY = 4  # 同时进行的LLM请求上限
+DEFAULT_MAX_QUEUE_SIZE = 32  # 排队等待的请求上限，超出后直接拒绝
+DEFAULT_CHUNK_BUFFER_SIZE = 64  # 每个请求预读的响应片段上限
+WAIT_SAMPLES = 100  # 排队耗时统计窗口
+
+
+class LLMWorkerPool:
+    """
+    LLM请求的共享工作池
+
+    所有请求都运行在 LLMEventLoop 共享事件循环上，工作池负责:
+    - 限制同时进行的请求数(max_concurrency)
+    - 超出并发的请求进入优先级准入队列，数值越小越优先，同优先级按FIFO
+    - 队列已满时拒绝新请求(admission control)
+    - 为每个请求提供有界的片段缓冲大小(chunk_buffer_size)，消费慢时对上游施加背压
+    - 统计排队耗时
+
+    准入状态只在事件循环线程中修改；统计数据可在任意线程读取。
+
+    示例：
+        ```
+        pool = LLMWorkerPool(max_concurrency=2)
+        async with pool.admit(priority=0):
+            async for chunk in adapter.communicate_async(messages):
+                ...
+        ```
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+                 chunk_buffer_size: int = DEFAULT_CHUNK_BUFFER_SIZE):
+        self.max_concurrency = max(1, max_concurrency or DEFAULT_MAX_CONCURRENCY)
+        self.max_queue_size = max(0, max_queue_size if max_queue_size is not None else DEFAULT_MAX_QUEUE_SIZE)
+        self.chunk_buffer_size = max(1, chunk_buffer_size or DEFAULT_CHUNK_BUFFER_SIZE)
+        self._active = 0
+        self._waiters = []  # 堆: (priority, seq, future)
+        self._seq = itertools.count()
+        self._stats_lock = Lock()
+        self._wait_times = deque(maxlen=WAIT_SAMPLES)
+        self._admitted = 0
+        self._rejected = 0
+
+    def configure(self, max_concurrency: Optional[int] = None, max_queue_size: Optional[int] = None,
+                  chunk_buffer_size: Optional[int] = None) -> None:
+        """运行时修改工作池参数，新的并发上限会立即放行排队中的请求"""
+        if max_queue_size is not None:
+            self.max_queue_size = max(0, max_queue_size)
+        if chunk_buffer_size is not None:
+            self.chunk_buffer_size = max(1, chunk_buffer_size)
+        if max_concurrency is not None:
+            self.max_concurrency = max(1, max_concurrency)
+            LLMEventLoop().call_soon(self._grant_waiters)
+
+    def _pending_waiters(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def _grant_waiters(self) -> None:
+        """在并发上限内按优先级放行排队请求(仅在事件循环线程中调用)"""
+        while self._active < self.max_concurrency and self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue  # 已取消的排队请求
+            self._active += 1
+            future.set_result(None)
+
+    async def _acquire(self, priority: int) -> float:
+        start_time = time.monotonic()
+        if self._active < self.max_concurrency and not self._pending_waiters():
+            self._active += 1
+        else:
+            if self._pending_waiters() >= self.max_queue_size:
+                with self._stats_lock:
+                    self._rejected += 1
+                raise RuntimeError("LLM 请求队列已满，请稍后重试")
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 已被放行但随即被取消，把名额交还
+                    self._release()
+                raise
+        wait_time = time.monotonic() - start_time
+        with self._stats_lock:
+            self._admitted += 1
+            self._wait_times.append(wait_time)
+        if wait_time > 0.05:
+            LoggerManager().get_logger().debug(f"LLMWorkerPool: 请求排队 {wait_time * 1000:.0f}ms 后开始执行")
+        return wait_time
+
+    def _release(self) -> None:
+        self._active = max(0, self._active - 1)
+        self._grant_waiters()
+
+    @asynccontextmanager
+    async def admit(self, priority: int = 0):
+        """
+        获取一个执行名额，退出时归还
+
+        Args:
+            priority: 优先级，数值越小越优先
+
+        Raises:
+            RuntimeError: 排队请求数已达上限
+        """
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def get_stats(self) -> Dict:
+        """获取工作池统计: 并发数、排队数、准入/拒绝数与排队耗时"""
+        with self._stats_lock:
+            wait_times = sorted(self._wait_times)
+            admitted = self._admitted
+            rejected = self._rejected
+        p95 = wait_times[min(len(wait_times) - 1, int(0.95 * (len(wait_times) - 1)))] if wait_times else None
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queued": self._pending_waiters(),
+            "admitted": admitted,
+            "rejected": rejected,
+            "avg_queue_wait": sum(wait_times) / len(wait_times) if wait_times else None,
+            "p95_queue_wait": p95,
+            "max_queue_wait": wait_times[-1] if wait_times else None,
+        }
@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from threading import Lock
+from typing import Dict, List, Optional, Set
+from global_managers.service_manager import ServiceManager
+from global_managers.logger_manager import LoggerManager
+from adapter.llm.service import LLMService
+from adapter.llm.event_loop import LLMEventLoop
+from chat.context_handle.service import ContextHandleService
+from chat.context_budget import TokenCounter
+
+BATCH_PRIORITY = 10  # 批量请求的排队优先级，低于交互式对话(0)
+
+
+class BatchRunner:
+    """
+    离线批量运行器
+
+    从JSONL读取消息列表，经当前上下文处理器处理后通过 LLMService 发送，结果逐行追加写入JSONL。
+
+    输入每行为消息列表，或 {"id": ..., "messages": [...]} 对象；未提供id时使用行号。
+    输出每行包含 id/status/response/raw_response/error/latency/prompt_tokens/completion_tokens。
+
+    - 并发数受 concurrency 限制(不超过工作池的接纳上限)，请求由Key调度器分散到所有API Key
+    - rate_limit_per_key 限制每个Key每秒发起的请求数，由调度器在选Key时等待，只作用于批量请求
+    - 重新运行时跳过输出文件中已成功的id(断点续跑)
+    - 结束后报告 requests/s 与 tokens/s
+
+    示例：
+        ```
+        runner = BatchRunner(llm_service, context_handle_service, concurrency=8, rate_limit_per_key=1)
+        report = runner.run("SECRETS/batch/input.jsonl", "SECRETS/batch/output.jsonl")
+        ```
+    """
+
+    def __init__(self, llm_service: LLMService, context_handle_service: Optional[ContextHandleService] = None,
+                 concurrency: Optional[int] = None, rate_limit_per_key: Optional[float] = None,
+                 model_name: Optional[str] = None, model_params: Optional[Dict] = None):
+        """
+        Args:
+            llm_service: 已初始化的LLM服务
+            context_handle_service: 上下文处理服务，None表示不经过处理器
+            concurrency: 同时进行的请求数，默认与工作池并发上限相同
+            rate_limit_per_key: 每个Key每秒最多发起的请求数，None表示不限速
+            model_name: 可选的模型名称
+            model_params: 覆盖默认模型参数(批量请求默认非流式)
+        """
+        self.llm_service = llm_service
+        self.context_handle_service = context_handle_service
+        self.concurrency = max(1, concurrency or llm_service.worker_pool.max_concurrency)
+        self.rate_limit_per_key = rate_limit_per_key
+        self.model_name = model_name
+        self.model_params = {"stream": False, **(model_params or {})}
+        self.token_counter = TokenCounter()
+        self._write_lock = Lock()
+        self._stats = {}
+
+    def get_effective_concurrency(self) -> int:
+        """
+        实际并发数：不超过工作池的接纳上限(并发上限 + 排队上限)，
+        超出的请求会被工作池以"队列已满"拒绝，而不是等待
+        """
+        pool = self.llm_service.worker_pool
+        capacity = pool.max_concurrency + pool.max_queue_size
+        if self.concurrency > capacity:
+            LoggerManager().get_logger().warning(
+                f"BatchRunner: 并发数 {self.concurrency} 超出工作池接纳上限 {capacity}，已限制为 {capacity}"
+            )
+            return capacity
+        return self.concurrency
+
+    @staticmethod
+    def load_completed_ids(output_path: str) -> Set[str]:
+        """读取输出文件中已成功完成的id"""
+        completed = set()
+        if not os.path.exists(output_path):
+            return completed
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 中断时写了一半的行
+                if record.get("status") == "ok":
+                    completed.add(str(record.get("id")))
+        return completed
+
+    @staticmethod
+    def load_items(input_path: str) -> List[Dict]:
+        """读取输入JSONL，返回 [{"id", "messages"}]"""
+        items = []
+        with open(input_path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"输入文件第 {line_number} 行不是有效的JSON: {e}")
+                if isinstance(data, list):
+                    items.append({"id": f"line-{line_number}", "messages": data})
+                elif isinstance(data, dict) and isinstance(data.get("messages"), list):
+                    items.append({"id": str(data.get("id", f"line-{line_number}")), "messages": data["messages"]})
+                else:
+                    raise ValueError(f"输入文件第 {line_number} 行缺少消息列表")
+        return items
+
+    def _write_record(self, output_path: str, record: Dict) -> None:
+        with self._write_lock:
+            with open(output_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+
+    async def _run_item(self, item: Dict, output_path: str, semaphore: asyncio.Semaphore) -> None:
+        handler = self.context_handle_service.get_current_handler() if self.context_handle_service else None
+        async with semaphore:
+            request_id = self.llm_service.new_request_id()
+            start_time = time.monotonic()
+            record = {"id": item["id"], "model": self.model_name or self.llm_service.adapter.get_model_name()}
+            try:
+                llm_messages = handler.process_before_send(item["messages"])[1] if handler else item["messages"]
+                chunks = []
+                async for chunk in self.llm_service.send_message_async(
+                    llm_messages, self.model_name, self.model_params, request_id, BATCH_PRIORITY,
+                    rate_limit_per_key=self.rate_limit_per_key
+                ):
+                    chunks.append(chunk)
+                raw_response = "".join(chunks)
+                usage = self.llm_service.get_request_usage(request_id) or {}
+                prompt_tokens = usage.get("prompt_tokens")
+                if prompt_tokens is None:
+                    prompt_tokens = self.token_counter.count_messages(llm_messages, record["model"])
+                completion_tokens = usage.get("completion_tokens")
+                if completion_tokens is None:
+                    completion_tokens = self.token_counter.count_text(raw_response, record["model"])
+                record.update({
+                    "status": "ok",
+                    "response": handler.process_before_show(raw_response) if handler else raw_response,
+                    "raw_response": raw_response,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                })
+                self._stats["ok"] += 1
+                self._stats["prompt_tokens"] += prompt_tokens
+                self._stats["completion_tokens"] += completion_tokens
+            except Exception as e:
+                record.update({"status": "error", "error": str(e)})
+                self._stats["errors"] += 1
+                LoggerManager().get_logger().warning(f"BatchRunner: {item['id']} 失败: {e}")
+            record["latency"] = round(time.monotonic() - start_time, 3)
+            await asyncio.get_running_loop().run_in_executor(None, self._write_record, output_path, record)
+
+    async def run_async(self, input_path: str, output_path: str) -> Dict:
+        """运行批量任务，必须在 LLMEventLoop 上执行"""
+        items = self.load_items(input_path)
+        completed = self.load_completed_ids(output_path)
+        pending = [item for item in items if item["id"] not in completed]
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        self._stats = {"ok": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        LoggerManager().get_logger().info(
+            f"BatchRunner: 共 {len(items)} 条，已完成 {len(items) - len(pending)} 条，本次运行 {len(pending)} 条"
+        )
+
+        semaphore = asyncio.Semaphore(self.get_effective_concurrency())
+        start_time = time.monotonic()
+        await asyncio.gather(*(self._run_item(item, output_path, semaphore) for item in pending))
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+
+        finished = self._stats["ok"] + self._stats["errors"]
+        return {
+            "total": len(items),
+            "skipped": len(items) - len(pending),
+            "ok": self._stats["ok"],
+            "errors": self._stats["errors"],
+            "elapsed": round(elapsed, 3),
+            "requests_per_second": round(finished / elapsed, 3),
+            "prompt_tokens": self._stats["prompt_tokens"],
+            "completion_tokens": self._stats["completion_tokens"],
+            "tokens_per_second": round((self._stats["prompt_tokens"] + self._stats["completion_tokens"]) / elapsed, 1),
+            "completion_tokens_per_second": round(self._stats["completion_tokens"] / elapsed, 1),
+        }
+
+    def run(self, input_path: str, output_path: str) -> Dict:
+        """同步运行批量任务并返回吞吐报告"""
+        return LLMEventLoop().run(self.run_async(input_path, output_path))
+
+
+def format_report(report: Dict) -> str:
+    """格式化吞吐报告"""
+    return (
+        f"完成 {report['ok']} 条，失败 {report['errors']} 条，跳过 {report['skipped']} 条，"
+        f"耗时 {report['elapsed']}s\n"
+        f"吞吐: {report['requests_per_second']} req/s，{report['tokens_per_second']} tokens/s "
+        f"(completion {report['completion_tokens_per_second']} tokens/s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量运行 prompt")
+    parser.add_argument("input", help="输入JSONL，每行为消息列表或 {id, messages}")
+    parser.add_argument("output", help="输出JSONL，已成功的id会在重新运行时跳过")
+    parser.add_argument("--concurrency", type=int, default=None, help="同时进行的请求数")
+    parser.add_argument("--rate-limit", type=float, default=None, help="每个API Key每秒最多发起的请求数")
+    parser.add_argument("--handler", default=None, help="使用的上下文处理器，默认为当前处理器")
+    parser.add_argument("--model", default=None, help="模型名称，默认为当前配置的模型")
+    parser.add_argument("--no-handler", action="store_true", help="不经过上下文处理器")
+    args = parser.parse_args()
+
+    # 只初始化批量运行需要的服务
+    service_manager = ServiceManager()
+    service_manager.register_service("llm_service", LLMService)
+    service_manager.register_service("context_handle_service", ContextHandleService)
+    service_manager.initialize_service("llm_service")
+    service_manager.initialize_service("context_handle_service")
+    llm_service = service_manager.get_service("llm_service")
+    context_handle_service = None if args.no_handler else service_manager.get_service("context_handle_service")
+    if context_handle_service and args.handler and not context_handle_service.set_current_handler(args.handler):
+        raise SystemExit(f"未找到上下文处理器: {args.handler}")
+
+    runner = BatchRunner(
+        llm_service,
+        context_handle_service,
+        concurrency=args.concurrency,
+        rate_limit_per_key=args.rate_limit,
+        model_name=args.model
+    )
+    try:
+        report = runner.run(args.input, args.output)
+        print(format_report(report))
+    finally:
+        llm_service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
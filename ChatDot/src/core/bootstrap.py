@@ -1,13 +1,15 @@
-from typing import List, Type, Any
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 from global_managers.service_manager import ServiceManager
-from chat.service import ChatService
-from chat.context_handle.service import ContextHandleService
-from adapter.llm.service import LLMService
-from live2d.service import Live2DService
 from global_managers.logger_manager import LoggerManager
-from tts.service import TTSService
-from stt.service import STTService
-from rag.rag_service import RAGService
+
+# 服务初始化前必须已就绪的服务，其余服务互不依赖，可以并行初始化
+SERVICE_DEPENDENCIES = {
+    "chat_service": ("llm_service", "context_handle_service"),
+}
+DEFAULT_BOOTSTRAP_WORKERS = 4  # 后台初始化服务的线程数
 
 class Bootstrap:
     """
@@ -15,7 +17,7 @@ class Bootstrap:
     负责注册和初始化所有服务
     """
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Bootstrap, cls).__new__(cls)
@@ -24,8 +26,17 @@ class Bootstrap:
             cls._instance._services_initialized = False
             cls._instance._service_registry = []
             cls._instance.service_manager = ServiceManager()
+            # 后台初始化状态
+            cls._instance._lock = threading.Lock()
+            cls._instance._executor = None
+            cls._instance._pending = []
+            cls._instance._running = 0
+            cls._instance._failed = {}
+            cls._instance._stopping = False
+            cls._instance._callbacks = (None, None, None)
+            cls._instance._initialize_done = threading.Event()
         return cls._instance
-    
+
     def __init__(self):
         if not self._initialized:
             self._register_core_services()
@@ -43,46 +54,187 @@ class Bootstrap:
         if self._services_registered:
             print("Bootstrap: _register_core_services 服务已注册，无需重复注册")
             return
-            
-        # 按依赖顺序注册服务
+
+        # 按依赖顺序注册服务: (服务名, 模块, 类名)
+        # 模块在初始化服务时才导入，避免启动时加载所有依赖库
         self._service_registry.extend([
-            ("live2d_service", Live2DService),       # Live2D服务
-            ("tts_service", TTSService),             # TTS服务
-            ("stt_service", STTService),             # STT服务
-            
-            ("llm_service", LLMService),             # LLM服务
-            ("context_handle_service", ContextHandleService),  # 上下文处理服务
-            ("rag_service", RAGService),             # RAG服务
-            ("chat_service", ChatService),           # 聊天服务
+            ("live2d_service", "live2d.service", "Live2DService"),       # Live2D服务
+            ("tts_service", "tts.service", "TTSService"),                 # TTS服务
+            ("stt_service", "stt.service", "STTService"),                 # STT服务
+
+            ("llm_service", "adapter.llm.service", "LLMService"),         # LLM服务
+            ("context_handle_service", "chat.context_handle.service", "ContextHandleService"),  # 上下文处理服务
+            ("rag_service", "rag.rag_service", "RAGService"),             # RAG服务
+            ("chat_service", "chat.service", "ChatService"),              # 聊天服务
         ])
-        
+
         self._services_registered = True
 
     # def register_service(self, service_name: str, service_class: Type[Any]):
     #     """注册额外的服务"""
     #     self._service_registry.append((service_name, service_class))
 
+    def _register_service(self, service_name: str, module_name: str, class_name: str):
+        """导入服务所在模块并注册服务"""
+        if self.service_manager.is_service_registered(service_name):
+            return
+        service_class = getattr(importlib.import_module(module_name), class_name)
+        self.service_manager.register_service(service_name, service_class)
+
     def initialize(self):
         """初始化所有服务 (只能调用一次)"""
         if self._services_initialized:
             print("Bootstrap: initialize 服务已初始化，无需重复初始化")
             return
-            
+        if self._executor is not None:
+            # 后台初始化进行中，等待其完成
+            self._initialize_done.wait()
+            return
+
         # 注册服务
-        for service_name, service_class in self._service_registry:
-            self.service_manager.register_service(service_name, service_class)
+        for service_name, module_name, class_name in self._service_registry:
+            self._register_service(service_name, module_name, class_name)
 
         # 初始化服务
-        for service_name, _ in self._service_registry:
+        for service_name, _, _ in self._service_registry:
             self.service_manager.initialize_service(service_name)
-            
+
         self._services_initialized = True
+        self._initialize_done.set()
+
+    # region 后台初始化
+    def initialize_async(self,
+                         on_ready: Optional[Callable[[str], None]] = None,
+                         on_failed: Optional[Callable[[str, str], None]] = None,
+                         on_finished: Optional[Callable[[], None]] = None,
+                         max_workers: int = DEFAULT_BOOTSTRAP_WORKERS) -> bool:
+        """
+        在后台线程池中导入并初始化所有服务，立即返回
+        服务在其依赖就绪后开始初始化，互不依赖的服务并行初始化
+
+        Args:
+            on_ready: 服务就绪回调 (服务名)，在工作线程中调用
+            on_failed: 服务初始化失败回调 (服务名, 错误信息)，依赖失败的服务同样视为失败
+            on_finished: 所有服务处理完成回调
+            max_workers: 线程池大小
+
+        Returns:
+            bool: 是否启动了后台初始化(已初始化或正在初始化时返回False)
+        """
+        with self._lock:
+            if self._services_initialized or self._executor is not None:
+                return False
+            self._callbacks = (on_ready, on_failed, on_finished)
+            self._pending = [service_name for service_name, _, _ in self._service_registry]
+            self._failed = {}
+            self._stopping = False
+            self._initialize_done.clear()
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Bootstrap")
+            notices = self._schedule_pending()
+        self._notify(notices)
+        return True
+
+    def _schedule_pending(self) -> List[tuple]:
+        """提交依赖已就绪的服务，依赖失败的服务直接标记失败 (持锁调用)，返回待发出的通知"""
+        notices = []
+        changed = True
+        while changed:
+            changed = False
+            for service_name in list(self._pending):
+                dependencies = SERVICE_DEPENDENCIES.get(service_name, ())
+                failed = [name for name in dependencies if name in self._failed]
+                if failed:
+                    self._pending.remove(service_name)
+                    self._failed[service_name] = f"依赖服务 '{failed[0]}' 初始化失败"
+                    notices.append(("failed", service_name, self._failed[service_name]))
+                    changed = True
+                elif all(self.service_manager.is_service_ready(name) for name in dependencies):
+                    self._pending.remove(service_name)
+                    self._running += 1
+                    self._executor.submit(self._load_service, service_name)
+        if not self._pending and self._running == 0:
+            notices.append(("finished",))
+        return notices
+
+    def _load_service(self, service_name: str):
+        """在工作线程中注册并初始化单个服务"""
+        error = None
+        try:
+            _, module_name, class_name = next(
+                entry for entry in self._service_registry if entry[0] == service_name
+            )
+            self._register_service(service_name, module_name, class_name)
+            self.service_manager.initialize_service(service_name)
+        except Exception as e:
+            error = str(e)
+            LoggerManager().get_logger().error(f"Bootstrap: {e}")
+
+        with self._lock:
+            self._running -= 1
+            if error is None:
+                notices = [("ready", service_name)]
+            else:
+                self._failed[service_name] = error
+                notices = [("failed", service_name, error)]
+            if self._stopping:
+                self._pending = []
+                if self._running == 0:
+                    notices.append(("finished",))
+            else:
+                notices.extend(self._schedule_pending())
+        self._notify(notices)
+
+    def _notify(self, notices: List[tuple]):
+        """在锁外调用回调，避免回调中再次访问 Bootstrap 时死锁"""
+        on_ready, on_failed, on_finished = self._callbacks
+        for notice in notices:
+            if notice[0] == "finished":
+                with self._lock:
+                    self._services_initialized = not self._stopping
+                    executor, self._executor = self._executor, None
+                if executor is not None:
+                    executor.shutdown(wait=False)
+                self._initialize_done.set()
+                if on_finished:
+                    on_finished()
+            elif notice[0] == "ready" and on_ready:
+                on_ready(notice[1])
+            elif notice[0] == "failed" and on_failed:
+                on_failed(notice[1], notice[2])
+
+    def is_service_ready(self, service_name: str) -> bool:
+        """服务是否已完成初始化"""
+        return self.service_manager.is_service_ready(service_name)
+
+    def is_initialized(self) -> bool:
+        """所有服务是否都已处理完成(包括初始化失败的服务)"""
+        return self._initialize_done.is_set()
+
+    def get_failed_services(self) -> Dict[str, str]:
+        """初始化失败的服务 {服务名: 错误信息}"""
+        with self._lock:
+            return dict(self._failed)
+
+    def wait_until_initialized(self, timeout: float = None) -> bool:
+        """等待所有服务处理完成，超时返回False"""
+        return self._initialize_done.wait(timeout)
+    # endregion
 
     def shutdown(self):
         """关闭所有服务"""
+        # 停止提交新的初始化任务，等待正在初始化的服务完成后再关闭
+        with self._lock:
+            self._stopping = True
+            executor = self._executor
+        if executor is not None:
+            executor.shutdown(wait=True)
+
         # 按注册的相反顺序关闭服务
-        for service_name, _ in reversed(self._service_registry):
-            self.service_manager.shutdown_service(service_name)
-        
+        for service_name, _, _ in reversed(self._service_registry):
+            if self.service_manager.is_service_registered(service_name):
+                self.service_manager.shutdown_service(service_name)
+
         # 重置初始化状态，允许重新初始化
-        self._services_initialized = False
\ No newline at end of file
+        self._services_initialized = False
+        self._stopping = False
+        self._initialize_done.clear()
@@ -3,36 +3,64 @@ from typing import Callable, Iterator, List, Dict, Optional, Tuple
 from global_managers.service_manager import ServiceManager
 from global_managers.logger_manager import LoggerManager
 from chat.persistence import ChatPersistence
+from chat.settings import ChatSettings
+from chat.context_budget import ContextBudgeter
+from adapter.llm.coalescer import ChunkCoalescer
 
 class ChatAdapter:
-    def __init__(self, llm_service=None, service_manager=None, chat_persistence=None):
+    def __init__(self, llm_service=None, service_manager=None, chat_persistence=None, chat_settings=None):
         """
         初始化聊天客户端
         
         Args:
             llm_service: LLM服务实例
             context_handle_service: 上下文处理服务实例
+            chat_settings: 聊天设置
         """
         self.llm_service = llm_service
         self.service_manager = service_manager or ServiceManager()
         self.context_handle_service = self.service_manager.get_service("context_handle_service")
-        self.live2d_service = self.service_manager.get_service("live2d_service")
-        self.tts_service = self.service_manager.get_service("tts_service")
-        self.rag_service = self.service_manager.get_service("rag_service")
         self.chat_persistence = chat_persistence or ChatPersistence()
+        self.settings = chat_settings or ChatSettings()
+        self.context_budgeter = ContextBudgeter()
+        self.last_budget_report: Optional[Dict] = None  # 最近一次上下文预算裁剪报告
+        self.last_layout_report: Optional[Dict] = None  # 最近一次缓存友好布局的稳定前缀报告
+        self._last_stable_prefix: List[Dict] = []  # 上一次请求的稳定部分，用于计算公共前缀
+        self.last_candidates: List[str] = []  # 最近一次多候选生成的全部候选回复
         self._is_Stop_generating = False  # 停止生成标志
+        self.current_request_id: Optional[str] = None  # 当前进行中的LLM请求ID
         self.messages: List[Dict] = []
 
+    # Live2D/TTS/RAG 可能仍在后台初始化，就绪后才参与对话
+    @property
+    def live2d_service(self):
+        return self.service_manager.get_ready_service("live2d_service")
+
+    @property
+    def tts_service(self):
+        return self.service_manager.get_ready_service("tts_service")
+
+    @property
+    def rag_service(self):
+        return self.service_manager.get_ready_service("rag_service")
+
     def initialize(self):
         """初始化客户端"""
         if self.llm_service:
             self.llm_service.initialize()
             
-    def stop_generating(self):
-        """停止生成"""
-        self._is_Stop_generating = True
+    def stop_generating(self, request_id: Optional[str] = None):
+        """
+        停止生成
+        
+        Args:
+            request_id: 要停止的请求ID，默认为当前请求
+        """
+        request_id = request_id or self.current_request_id
+        if request_id is None or request_id == self.current_request_id:
+            self._is_Stop_generating = True
         try:
-            self.llm_service.stop_generating()
+            self.llm_service.stop_generating(request_id)
         except Exception as e:
             LoggerManager().get_logger().warning(f"chat.adapter: llm_service级停止生成失败: {e}")
 
@@ -56,40 +84,7 @@ class ChatAdapter:
         # 添加用户消息到历史
         self.add_response("user", message)
         
-        local_messages = self.messages
-        llm_messages = self.messages
-        
-        #region RAG处理
-        if self.rag_service and self.rag_service.is_enabled():
-            try:
-                #按最近的10条消息进行上下文检索
-                rag_context = self.rag_service.retrieve(
-                    query=local_messages[-10:],
-                    n_results=3,
-                )
-                #将检索到的上下文添加到消息列表中
-                llm_messages.insert(-10,
-                                    {"role": "system",
-                                     "content":
-                                        f"""
-[Memory Context]                                        
-按以下10条消息搜索的记忆中的相关上下文:
-{rag_context}
-[/Memory Context]
-                                        """
-                                    })
-            except Exception as e:
-                LoggerManager().get_logger().error(f"RAG上下文检索失败: {e}")
-        #endregion
-        
-        
-        # 使用上下文处理器处理消息
-        handler = self.context_handle_service.get_current_handler()
-        local_messages, llm_messages = (handler.process_before_send(llm_messages) 
-                                      if handler else (self.messages, self.messages))
-        
-        if not self.llm_service:
-            raise RuntimeError("LLM服务未初始化")
+        local_messages, llm_messages, handler, cache_friendly = self._prepare_llm_messages()
         #endregion 消息前处理
         
         #region 发送消息
@@ -97,9 +92,16 @@ class ChatAdapter:
         # 发送消息
         #
         # 发送消息并获取响应迭代器
+        self.current_request_id = self.llm_service.new_request_id()
+        request_id = self.current_request_id
+        model_params = {"stream": is_stream}
+        if cache_friendly and is_stream:
+            # 流式请求需显式要求返回 usage，才能拿到 cached_tokens
+            model_params["stream_options"] = {"include_usage": True}
         response_iterator = self.llm_service.send_message(
             messages=llm_messages,
-            model_params={"stream": is_stream}
+            model_params=model_params,
+            request_id=request_id
         )
         #endregion 发送消息
 
@@ -112,6 +114,10 @@ class ChatAdapter:
         if ttsenabled:
             LoggerManager().get_logger().info("TTS服务已启用...")
             
+        # 各消费者独立的片段合并窗口(未启用时为None，逐片段处理)
+        tts_coalescer = ChunkCoalescer.from_config(self.llm_service.get_coalescing_config("tts"))
+        live2d_coalescer = ChunkCoalescer.from_config(self.llm_service.get_coalescing_config("live2d"))
+
         def realtime_response():
             full_response = []
             try:
@@ -123,15 +129,21 @@ class ChatAdapter:
                     
                     #tts
                     if ttsenabled:
-                        LoggerManager().get_logger().debug(f"实时播放文本到语音: realtime_play_text_to_speech({chunk})")
-                        self.tts_service.realtime_play_text_to_speech(chunk)
+                        tts_text = tts_coalescer.push(chunk) if tts_coalescer else chunk
+                        if tts_text:
+                            LoggerManager().get_logger().debug(f"实时播放文本到语音: realtime_play_text_to_speech({tts_text})")
+                            self.tts_service.realtime_play_text_to_speech(tts_text)
                     #live2d
                     if self.live2d_service and self.live2d_service.is_live2d_enabled():
-                        LoggerManager().get_logger().debug(f"实时播放文本到Live2D: realtime_text_to_live2d({chunk})")
-                        self.live2d_service.realtime_text_to_live2d(chunk)
+                        live2d_text = live2d_coalescer.push(chunk) if live2d_coalescer else chunk
+                        if live2d_text:
+                            LoggerManager().get_logger().debug(f"实时播放文本到Live2D: realtime_text_to_live2d({live2d_text})")
+                            self.live2d_service.realtime_text_to_live2d(live2d_text)
                         
                     yield chunk# 实时返回每个片段
             finally:
+                if cache_friendly:
+                    self._report_cache_usage(request_id)
                 # 在迭代完成或发生异常时添加到历史
                 if full_response:
                     #添加到历史前经过处理器处理
@@ -153,10 +165,13 @@ class ChatAdapter:
                     #调用live2d服务
                     if self.live2d_service and self.live2d_service.is_live2d_enabled():
                         LoggerManager().get_logger().debug("调用 Live2D 服务...")
-                        self.live2d_service.realtime_text_to_live2d(force_process=True)
+                        # 合并窗口中剩余的文本随最后一次调用一并发送
+                        live2d_rest = live2d_coalescer.flush() if live2d_coalescer else None
+                        self.live2d_service.realtime_text_to_live2d(live2d_rest or None, force_process=True)
                     #调用tts服务
                     if ttsenabled:
-                        self.tts_service.realtime_play_text_to_speech(force_process=True)  # 处理剩余缓冲区
+                        tts_rest = tts_coalescer.flush() if tts_coalescer else None
+                        self.tts_service.realtime_play_text_to_speech(tts_rest or None, force_process=True)  # 处理剩余缓冲区
                         LoggerManager().get_logger().debug("TTS流处理完成...")
                     #if self.tts_service and self.tts_service.is_tts_enabled():
                         #LoggerManager().get_logger().debug("调用 TTS 服务...")
@@ -173,10 +188,162 @@ class ChatAdapter:
 
         return local_messages, realtime_response()
 
+    def generate_candidates(self, n: int, is_stream: bool = True) -> Iterator[Tuple[int, str]]:
+        """
+        为最后一条用户消息并发生成 n 个候选回复
+
+        当前消息列表应以用户消息结尾(重新生成时先移除旧回复)。
+        生成结束后第一个非空候选作为回复写入历史，全部候选保存在 last_candidates 中。
+        多候选生成不驱动TTS和Live2D。
+
+        Args:
+            n: 候选数量
+            is_stream: 是否使用流式输出
+
+        Returns:
+            Iterator[Tuple[int, str]]: (候选序号, 响应片段) 迭代器
+        """
+        if not self.llm_service:
+            raise RuntimeError("LLM服务未初始化")
+        if not self.messages or self.messages[-1].get("role") != "user":
+            raise ValueError("生成候选回复需要以用户消息结尾的消息列表")
+        self._is_Stop_generating = False
+        local_messages, llm_messages, handler, cache_friendly = self._prepare_llm_messages()
+
+        self.current_request_id = self.llm_service.new_request_id()
+        response_iterator = self.llm_service.generate_candidates(
+            messages=llm_messages,
+            n=n,
+            model_params={"stream": is_stream},
+            request_id=self.current_request_id
+        )
+
+        def realtime_candidates():
+            candidates = [[] for _ in range(n)]
+            try:
+                for index, chunk in response_iterator:
+                    if self._is_Stop_generating:
+                        break
+                    if 0 <= index < n:
+                        candidates[index].append(chunk)
+                    yield index, chunk
+            finally:
+                texts = [''.join(parts) for parts in candidates]
+                if handler:
+                    texts = [handler.process_before_show(text) if text else text for text in texts]
+                self.last_candidates = texts
+                chosen = next((text for text in texts if text), None)
+                if chosen is not None:
+                    self.add_response("assistant", chosen)
+
+        return realtime_candidates()
+
+    def _prepare_llm_messages(self) -> Tuple[List[Dict], List[Dict], Optional[object], bool]:
+        """
+        发送前处理当前消息列表：RAG检索、上下文处理器、token预算与缓存友好布局
+
+        Returns:
+            Tuple: (本地消息列表, 发送给LLM的消息列表, 上下文处理器, 是否使用缓存友好布局)
+        """
+        local_messages = self.messages
+        # 不在原消息列表中插入内容: 历史记录按索引写日志，且缓存友好布局需要保持历史前缀不变
+        cache_friendly = bool(self.settings.get_setting("cache_friendly_layout"))
+        llm_messages = list(self.messages)
+        volatile_messages: List[Dict] = []  # 追加在末尾的易变内容
+        
+        #region RAG处理
+        if self.rag_service and self.rag_service.is_enabled():
+            try:
+                #按最近的10条消息进行上下文检索
+                rag_context = self.rag_service.retrieve(
+                    query=local_messages[-10:],
+                    n_results=3,
+                )
+                rag_message = {"role": "system",
+                               "content":
+                                  f"""
+[Memory Context]                                        
+按以下10条消息搜索的记忆中的相关上下文:
+{rag_context}
+[/Memory Context]
+                                  """
+                              }
+                if cache_friendly:
+                    volatile_messages.append(rag_message)
+                else:
+                    #将检索到的上下文添加到消息列表中
+                    llm_messages.insert(-10, rag_message)
+            except Exception as e:
+                LoggerManager().get_logger().error(f"RAG上下文检索失败: {e}")
+        #endregion
+        
+        
+        # 使用上下文处理器处理消息
+        handler = self.context_handle_service.get_current_handler()
+        local_messages, llm_messages = (handler.process_before_send(llm_messages) 
+                                      if handler else (self.messages, llm_messages))
+        
+        if not self.llm_service:
+            raise RuntimeError("LLM服务未初始化")
+
+        # 按token预算裁剪发送给LLM的消息
+        llm_messages = self._apply_context_budget(llm_messages)
+        if cache_friendly:
+            llm_messages = self._build_cache_friendly_layout(llm_messages, volatile_messages)
+        return local_messages, llm_messages, handler, cache_friendly
+
+    def _apply_context_budget(self, llm_messages: List[Dict]) -> List[Dict]:
+        """按当前模型的token预算裁剪消息，未启用时原样返回"""
+        config = self.settings.get_setting("context_budget") or {}
+        if not config.get("enabled"):
+            return ContextBudgeter.strip_local_fields(llm_messages)
+        model_name = self.llm_service.settings.get_setting("model_name")
+        llm_messages, self.last_budget_report = self.context_budgeter.apply(llm_messages, model_name, config)
+        return llm_messages
+
+    def _build_cache_friendly_layout(self, stable_messages: List[Dict], volatile_messages: List[Dict]) -> List[Dict]:
+        """
+        组装缓存友好的消息布局：稳定部分(system与历史消息)在前，易变内容在末尾
+
+        同时计算与上一次请求的公共前缀长度，作为提供方 prompt 缓存可命中部分的估计
+        """
+        counter = self.context_budgeter.counter
+        model_name = self.llm_service.settings.get_setting("model_name")
+        prefix_count = 0
+        for previous, current in zip(self._last_stable_prefix, stable_messages):
+            if previous != current:
+                break
+            prefix_count += 1
+        self._last_stable_prefix = list(stable_messages)
+        layout = list(stable_messages) + volatile_messages
+        self.last_layout_report = {
+            "stable_prefix_messages": prefix_count,
+            "stable_prefix_tokens": sum(counter.count_message(m, model_name) for m in stable_messages[:prefix_count]),
+            "total_tokens": counter.count_messages(layout, model_name),
+            "volatile_messages": len(volatile_messages),
+            "prompt_tokens": None,
+            "cached_tokens": None,
+        }
+        return layout
+
+    def _report_cache_usage(self, request_id: str):
+        """请求结束后把提供方返回的 cached_tokens 记入布局报告"""
+        report = self.last_layout_report
+        usage = self.llm_service.get_request_usage(request_id)
+        if report is None or not usage:
+            return
+        report["prompt_tokens"] = usage.get("prompt_tokens")
+        report["cached_tokens"] = usage.get("cached_tokens")
+        LoggerManager().get_logger().info(
+            f"缓存友好布局: 稳定前缀 {report['stable_prefix_messages']} 条消息/约{report['stable_prefix_tokens']} tokens, "
+            f"prompt_tokens={report['prompt_tokens']}, cached_tokens={report['cached_tokens']}"
+        )
+
     def add_response(self, role: str, response: str):
         """添加消息到消息列表"""
-        self.messages.append({"role": role, "content": response})
-        self.chat_persistence.save_history(self.messages)
+        message = {"role": role, "content": response}
+        self.messages.append(message)
+        self.chat_persistence.append_message(message)
         
     def clear_context(self):
         """清除上下文"""
@@ -184,8 +351,10 @@ class ChatAdapter:
 
     def delete_message(self, index: int):
         """删除指定索引的消息"""
-        if 0 <= index < len(self.messages):
-            deleted_message = self.messages.pop(index)
+        if not 0 <= index < len(self.messages):
+            return
+        deleted_message = self.messages.pop(index)
+        self.chat_persistence.delete_message(index)
         #调用RAG服务删除消息
         if self.rag_service and self.rag_service.is_enabled():
             try:
@@ -200,6 +369,17 @@ class ChatAdapter:
         """编辑指定索引的消息内容"""
         if 0 <= index < len(self.messages):
             self.messages[index]["content"] = new_content
+            self.chat_persistence.edit_message(index, new_content)
+
+    def set_message_pinned(self, index: int, pinned: bool):
+        """置顶/取消置顶指定索引的消息，置顶消息在上下文预算裁剪时保留"""
+        if not 0 <= index < len(self.messages):
+            return
+        if pinned:
+            self.messages[index]["pinned"] = True
+        else:
+            self.messages[index].pop("pinned", None)
+        self.chat_persistence.set_message_pinned(index, pinned)
 
     def get_messages(self) -> List[Dict]:
         """获取当前所有消息"""
@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from global_managers.logger_manager import LoggerManager
+
+# tiktoken 为可选依赖，不可用时使用字符数估算
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+MESSAGE_OVERHEAD_TOKENS = 4  # 每条消息的格式开销(role/分隔符)
+REPLY_PRIMING_TOKENS = 3  # 回复起始的固定开销
+DEFAULT_TOKEN_CACHE_SIZE = 4096  # 消息token数缓存的条目上限
+DEFAULT_ENCODING = "cl100k_base"
+
+POLICY_DROP_OLDEST = "drop_oldest"  # 从最早的消息开始丢弃
+POLICY_KEEP_SYSTEM_PINNED = "keep_system_pinned"  # 保留system与置顶消息，从最早的其他消息开始丢弃
+POLICY_LAST_N_TURNS = "last_n_turns"  # 保留system与置顶消息及最近N轮对话
+BUDGET_POLICIES = (POLICY_DROP_OLDEST, POLICY_KEEP_SYSTEM_PINNED, POLICY_LAST_N_TURNS)
+
+DEFAULT_CONTEXT_BUDGET = {
+    "enabled": False,
+    "policy": POLICY_KEEP_SYSTEM_PINNED,
+    "default_max_tokens": 8000,  # 未单独配置的模型使用的预算
+    "model_max_tokens": {},  # 按模型配置的预算，如 {"gpt-4o": 60000}
+    "last_n_turns": 10  # last_n_turns 策略保留的对话轮数(以用户消息为一轮的开始)
+}
+
+
+class TokenCounter:
+    """
+    消息token计数器
+
+    优先使用 tiktoken 按模型对应的编码计数，不可用时按字符估算
+    (ASCII字符约4个一个token，其余字符各算一个)。
+    每条消息的计数按 (编码, role, content) 缓存，历史消息不会被重复分词。
+    """
+
+    def __init__(self, cache_size: int = DEFAULT_TOKEN_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, int]" = OrderedDict()
+        self._encodings = {}
+        self._lock = Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _get_encoding(self, model_name: Optional[str]):
+        if not TIKTOKEN_AVAILABLE:
+            return None
+        name = model_name or ""
+        if name not in self._encodings:
+            try:
+                self._encodings[name] = tiktoken.encoding_for_model(name)
+            except Exception:
+                self._encodings[name] = tiktoken.get_encoding(DEFAULT_ENCODING)
+        return self._encodings[name]
+
+    @staticmethod
+    def _estimate(text: str) -> int:
+        ascii_chars = sum(1 for char in text if ord(char) < 128)
+        return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+    def count_text(self, text: str, model_name: Optional[str] = None) -> int:
+        """计算文本的token数(不缓存)"""
+        encoding = self._get_encoding(model_name)
+        if encoding is None:
+            return self._estimate(text)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_message(self, message: Dict, model_name: Optional[str] = None) -> int:
+        """计算单条消息的token数(含格式开销)，结果会被缓存"""
+        content = message.get("content") or ""
+        if not isinstance(content, str):
+            content = str(content)
+        encoding = self._get_encoding(model_name)
+        cache_key = (encoding.name if encoding is not None else "estimate", message.get("role"), content)
+        with self._lock:
+            count = self._cache.get(cache_key)
+            if count is not None:
+                self._cache.move_to_end(cache_key)
+                self.cache_hits += 1
+                return count
+            self.cache_misses += 1
+        count = self.count_text(content, model_name) + MESSAGE_OVERHEAD_TOKENS
+        with self._lock:
+            self._cache[cache_key] = count
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return count
+
+    def count_messages(self, messages: List[Dict], model_name: Optional[str] = None) -> int:
+        """计算消息列表的总token数"""
+        return sum(self.count_message(message, model_name) for message in messages) + REPLY_PRIMING_TOKENS
+
+
+class ContextBudgeter:
+    """
+    上下文token预算器
+
+    位于上下文处理器与 llm_service.send_message 之间，按模型预算裁剪发送给LLM的消息列表，
+    不修改原消息列表。最后一条消息(当前用户输入)始终保留。
+
+    策略:
+    - drop_oldest: 从最早的消息开始丢弃
+    - keep_system_pinned: 保留 system 消息和 pinned 为True的消息，从最早的其他消息开始丢弃
+    - last_n_turns: 先只保留 system/置顶消息与最近N轮对话，仍超出预算时按 keep_system_pinned 继续裁剪
+
+    示例：
+        ```
+        budgeter = ContextBudgeter()
+        messages, report = budgeter.apply(messages, "gpt-4o", {"enabled": True, "default_max_tokens": 4000})
+        print(report["trimmed_tokens"])
+        ```
+    """
+
+    def __init__(self, counter: Optional[TokenCounter] = None):
+        self.counter = counter or TokenCounter()
+        self.last_report: Optional[Dict] = None
+
+    @staticmethod
+    def strip_local_fields(messages: List[Dict]) -> List[Dict]:
+        """去掉只在本地使用的 pinned 字段，不修改原消息"""
+        return [
+            {key: value for key, value in message.items() if key != "pinned"} if "pinned" in message else message
+            for message in messages
+        ]
+
+    @staticmethod
+    def _is_protected(message: Dict) -> bool:
+        return message.get("role") == "system" or bool(message.get("pinned"))
+
+    @staticmethod
+    def get_budget(model_name: Optional[str], config: Dict) -> int:
+        """获取模型的token预算"""
+        model_budgets = config.get("model_max_tokens") or {}
+        if model_name in model_budgets:
+            return model_budgets[model_name]
+        return config.get("default_max_tokens") or DEFAULT_CONTEXT_BUDGET["default_max_tokens"]
+
+    @staticmethod
+    def _last_turns_start(messages: List[Dict], turns: int) -> int:
+        """最近N轮对话的起始下标"""
+        seen = 0
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index].get("role") == "user":
+                seen += 1
+                if seen >= turns:
+                    return index
+        return 0
+
+    def apply(self, messages: List[Dict], model_name: Optional[str] = None,
+              config: Optional[Dict] = None) -> Tuple[List[Dict], Dict]:
+        """
+        按预算裁剪消息列表
+
+        Args:
+            messages: 待发送的消息列表
+            model_name: 模型名称，用于选择预算与分词编码
+            config: 预算配置，见 DEFAULT_CONTEXT_BUDGET
+
+        Returns:
+            Tuple[List[Dict], Dict]: (裁剪后的消息列表, 报告)
+                报告包含 budget/original_tokens/final_tokens/trimmed_tokens/trimmed_messages
+        """
+        config = {**DEFAULT_CONTEXT_BUDGET, **(config or {})}
+        budget = self.get_budget(model_name, config)
+        counts = [self.counter.count_message(message, model_name) for message in messages]
+        original_tokens = sum(counts) + REPLY_PRIMING_TOKENS
+        keep = [True] * len(messages)
+        total = original_tokens
+        policy = config.get("policy") or POLICY_KEEP_SYSTEM_PINNED
+        if policy not in BUDGET_POLICIES:
+            LoggerManager().get_logger().warning(f"未知的上下文预算策略 {policy}，使用 {POLICY_KEEP_SYSTEM_PINNED}")
+            policy = POLICY_KEEP_SYSTEM_PINNED
+        last_index = len(messages) - 1
+
+        if policy == POLICY_LAST_N_TURNS and messages:
+            start = self._last_turns_start(messages, max(1, config.get("last_n_turns") or 1))
+            for index in range(start):
+                if not self._is_protected(messages[index]):
+                    keep[index] = False
+                    total -= counts[index]
+
+        if total > budget:
+            protect = policy != POLICY_DROP_OLDEST
+            for index in range(last_index):
+                if total <= budget:
+                    break
+                if not keep[index] or (protect and self._is_protected(messages[index])):
+                    continue
+                keep[index] = False
+                total -= counts[index]
+
+        trimmed = self.strip_local_fields([message for message, kept in zip(messages, keep) if kept])
+        report = {
+            "model": model_name,
+            "policy": policy,
+            "budget": budget,
+            "original_tokens": original_tokens,
+            "final_tokens": total,
+            "trimmed_tokens": original_tokens - total,
+            "trimmed_messages": len(messages) - len(trimmed),
+            "over_budget": total > budget,
+        }
+        self.last_report = report
+        if report["trimmed_messages"]:
+            LoggerManager().get_logger().info(
+                f"上下文预算: 裁剪 {report['trimmed_messages']} 条消息/{report['trimmed_tokens']} tokens "
+                f"({original_tokens} -> {total}, 预算 {budget}, 策略 {policy})"
+            )
+        if report["over_budget"]:
+            LoggerManager().get_logger().warning(f"上下文预算: 受保护消息已超出预算 ({total} > {budget})")
+        return trimmed, report
@@ -0,0 +1,425 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from global_managers.logger_manager import LoggerManager
+
+DEFAULT_PAGE_SIZE = 50  # 分页查询默认每页的消息数
+MESSAGE_FIELDS = ("role", "content")  # 单独存列的字段，其余字段存入 extra
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT,
+    extra TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+CREATE INDEX IF NOT EXISTS idx_messages_session_created ON messages(session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class ConversationStore:
+    """
+    基于 SQLite 的会话存储
+
+    - 每个会话一行 sessions 记录，消息按插入顺序(自增id)存放在 messages 表
+    - messages 在 (session_id, id) 与 (session_id, created_at) 上建索引，分页查询只读取一页
+    - 使用 WAL 模式，每个线程独立连接，读取不会被写入阻塞；写入串行化
+    - 消息中 role/content 以外的字段(如 pinned)以JSON存入 extra 列
+
+    同一数据库文件共享一个实例，见 for_path()。
+
+    示例：
+        ```
+        store = ConversationStore.for_path("SECRETS/persistence/chat/conversations.db")
+        session_id = store.create_session("新对话")
+        store.append_messages(session_id, [{"role": "user", "content": "你好"}])
+        page = store.get_latest(session_id, 50)
+        older = store.get_before(session_id, page[0]["id"], 50)
+        ```
+    """
+
+    _instances: Dict[str, "ConversationStore"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, db_path: str) -> "ConversationStore":
+        """获取指定数据库文件共享的实例"""
+        key = os.path.abspath(db_path)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(key)
+            return cls._instances[key]
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: 数据库文件路径
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._write_lock:
+            self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """当前线程的数据库连接"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    # region 消息转换
+    @staticmethod
+    def _message_row(session_id: int, message: Dict, created_at: float) -> tuple:
+        extra = {key: value for key, value in message.items() if key not in MESSAGE_FIELDS}
+        content = message.get("content")
+        if content is not None and not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        return (
+            session_id,
+            message.get("role", "user"),
+            content,
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+            created_at,
+        )
+
+    @staticmethod
+    def _to_message(row: sqlite3.Row) -> Dict:
+        message = {"role": row["role"], "content": row["content"]}
+        if row["extra"]:
+            message.update(json.loads(row["extra"]))
+        return message
+
+    @classmethod
+    def _to_page_item(cls, row: sqlite3.Row) -> Dict:
+        return {"id": row["id"], "created_at": row["created_at"], **cls._to_message(row)}
+    # endregion
+
+    # region 会话
+    def create_session(self, title: Optional[str] = None, messages: Optional[Iterable[Dict]] = None) -> int:
+        """创建会话，可同时写入初始消息，返回会话id"""
+        now = time.time()
+        title = title or datetime_title(now)
+        with self._write_lock, self._connection() as connection:
+            cursor = connection.execute(
+                "INSERT INTO sessions (title, created_at, updated_at) VALUES (?, ?, ?)", (title, now, now)
+            )
+            session_id = cursor.lastrowid
+            if messages is not None:
+                self._insert_messages(connection, session_id, messages)
+        return session_id
+
+    def get_session(self, session_id: int) -> Optional[Dict]:
+        row = self._connection().execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_sessions(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """按最近更新时间倒序列出会话"""
+        rows = self._connection().execute(
+            "SELECT * FROM sessions ORDER BY updated_at DESC, id DESC LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def rename_session(self, session_id: int, title: str) -> None:
+        with self._write_lock, self._connection() as connection:
+            connection.execute("UPDATE sessions SET title = ? WHERE id = ?", (title, session_id))
+
+    def delete_session(self, session_id: int) -> None:
+        with self._write_lock, self._connection() as connection:
+            connection.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            connection.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def copy_session(self, session_id: int, title: Optional[str] = None) -> int:
+        """复制会话及其全部消息，返回新会话id"""
+        session = self.get_session(session_id)
+        if session is None:
+            raise KeyError(f"会话不存在: {session_id}")
+        now = time.time()
+        with self._write_lock, self._connection() as connection:
+            cursor = connection.execute(
+                "INSERT INTO sessions (title, created_at, updated_at, message_count) VALUES (?, ?, ?, ?)",
+                (title or f"(copy){session['title']}", now, now, session["message_count"])
+            )
+            new_session_id = cursor.lastrowid
+            connection.execute(
+                "INSERT INTO messages (session_id, role, content, extra, created_at) "
+                "SELECT ?, role, content, extra, created_at FROM messages WHERE session_id = ? ORDER BY id",
+                (new_session_id, session_id)
+            )
+        return new_session_id
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._write_lock, self._connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+    # endregion
+
+    # region 写入消息
+    def _insert_messages(self, connection: sqlite3.Connection, session_id: int, messages: Iterable[Dict]) -> int:
+        now = time.time()
+        rows = [self._message_row(session_id, message, now) for message in messages]
+        connection.executemany(
+            "INSERT INTO messages (session_id, role, content, extra, created_at) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        connection.execute(
+            "UPDATE sessions SET message_count = message_count + ?, updated_at = ? WHERE id = ?",
+            (len(rows), now, session_id)
+        )
+        return len(rows)
+
+    @staticmethod
+    def _id_at(connection: sqlite3.Connection, session_id: int, position: int) -> Optional[int]:
+        """会话中第 position 条消息(从0开始)的id"""
+        if position < 0:
+            return None
+        row = connection.execute(
+            "SELECT id FROM messages WHERE session_id = ? ORDER BY id LIMIT 1 OFFSET ?", (session_id, position)
+        ).fetchone()
+        return row["id"] if row else None
+
+    def append_messages(self, session_id: int, messages: Iterable[Dict]) -> None:
+        with self._write_lock, self._connection() as connection:
+            self._insert_messages(connection, session_id, messages)
+
+    def apply_records(self, session_id: int, records: List[Dict], base_offset: int = 0) -> int:
+        """
+        在一个事务中应用一批操作记录
+
+        Args:
+            session_id: 会话id
+            records: 操作记录 (append/edit/delete/pin)，见 write_behind.append_record 等；
+                带 id 的记录直接按消息id定位，否则按 index 定位
+            base_offset: edit/delete 记录中的索引相对于会话开头的偏移
+
+        Returns:
+            int: 应用后的 base_offset (按id删除了偏移之前的消息时减小)
+        """
+        if not records:
+            return base_offset
+        with self._write_lock, self._connection() as connection:
+            appended = []
+            for record in records:
+                op = record.get("op")
+                if op == "append":
+                    appended.append(record["message"])
+                    continue
+                # 先写入之前累积的追加，保证索引与顺序一致
+                if appended:
+                    self._insert_messages(connection, session_id, appended)
+                    appended = []
+                if "id" in record:
+                    message_id = record["id"]
+                else:
+                    message_id = self._id_at(connection, session_id, base_offset + record.get("index", -1))
+                if message_id is None:
+                    continue
+                if op == "edit":
+                    connection.execute(
+                        "UPDATE messages SET content = ? WHERE id = ? AND session_id = ?",
+                        (record.get("content"), message_id, session_id)
+                    )
+                elif op == "pin":
+                    self._set_pinned(connection, session_id, message_id, bool(record.get("pinned")))
+                elif op == "delete":
+                    position = connection.execute(
+                        "SELECT COUNT(*) AS position FROM messages WHERE session_id = ? AND id < ?",
+                        (session_id, message_id)
+                    ).fetchone()["position"]
+                    deleted = connection.execute(
+                        "DELETE FROM messages WHERE id = ? AND session_id = ?", (message_id, session_id)
+                    ).rowcount
+                    if not deleted:
+                        continue
+                    connection.execute(
+                        "UPDATE sessions SET message_count = message_count - 1 WHERE id = ?", (session_id,)
+                    )
+                    if position < base_offset:
+                        base_offset -= 1  # 窗口之前的消息被删除，窗口整体前移
+            if appended:
+                self._insert_messages(connection, session_id, appended)
+            connection.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (time.time(), session_id))
+        return base_offset
+
+    @staticmethod
+    def _set_pinned(connection: sqlite3.Connection, session_id: int, message_id: int, pinned: bool) -> None:
+        """置顶标记存放在 extra 中，取消置顶时移除该字段"""
+        row = connection.execute(
+            "SELECT extra FROM messages WHERE id = ? AND session_id = ?", (message_id, session_id)
+        ).fetchone()
+        if row is None:
+            return
+        extra = json.loads(row["extra"]) if row["extra"] else {}
+        if pinned:
+            extra["pinned"] = True
+        else:
+            extra.pop("pinned", None)
+        connection.execute(
+            "UPDATE messages SET extra = ? WHERE id = ?",
+            (json.dumps(extra, ensure_ascii=False) if extra else None, message_id)
+        )
+
+    def replace_messages(self, session_id: int, messages: Iterable[Dict], from_position: int = 0) -> None:
+        """用给定消息替换会话中从 from_position 开始的全部消息"""
+        with self._write_lock, self._connection() as connection:
+            start_id = self._id_at(connection, session_id, from_position)
+            if start_id is not None:
+                connection.execute("DELETE FROM messages WHERE session_id = ? AND id >= ?", (session_id, start_id))
+            connection.execute(
+                "UPDATE sessions SET message_count = (SELECT COUNT(*) FROM messages WHERE session_id = ?) WHERE id = ?",
+                (session_id, session_id)
+            )
+            self._insert_messages(connection, session_id, messages)
+    # endregion
+
+    # region 读取消息
+    def count_messages(self, session_id: int) -> int:
+        row = self._connection().execute("SELECT message_count FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row["message_count"] if row else 0
+
+    def get_messages(self, session_id: int) -> List[Dict]:
+        """读取会话的全部消息"""
+        rows = self._connection().execute(
+            "SELECT * FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+        return [self._to_message(row) for row in rows]
+
+    def get_latest_messages(self, session_id: int, limit: int) -> List[Dict]:
+        """读取会话最近 limit 条消息(按时间正序)"""
+        return [
+            {key: value for key, value in item.items() if key not in ("id", "created_at")}
+            for item in self.get_latest(session_id, limit)
+        ]
+
+    def get_latest(self, session_id: int, limit: int = DEFAULT_PAGE_SIZE) -> List[Dict]:
+        """分页: 最近 limit 条消息(按时间正序)，每项包含 id/created_at 与消息字段"""
+        rows = self._connection().execute(
+            "SELECT * FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?", (session_id, limit)
+        ).fetchall()
+        return [self._to_page_item(row) for row in reversed(rows)]
+
+    def get_before(self, session_id: int, before_id: int, limit: int = DEFAULT_PAGE_SIZE) -> List[Dict]:
+        """分页: id 小于 before_id 的最近 limit 条消息(按时间正序)"""
+        rows = self._connection().execute(
+            "SELECT * FROM messages WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (session_id, before_id, limit)
+        ).fetchall()
+        return [self._to_page_item(row) for row in reversed(rows)]
+
+    def get_after(self, session_id: int, after_id: int, limit: int = DEFAULT_PAGE_SIZE) -> List[Dict]:
+        """分页: id 大于 after_id 的最早 limit 条消息(按时间正序)"""
+        rows = self._connection().execute(
+            "SELECT * FROM messages WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (session_id, after_id, limit)
+        ).fetchall()
+        return [self._to_page_item(row) for row in rows]
+
+    def get_position(self, session_id: int, message_id: int) -> int:
+        """消息在会话中的位置(从0开始)"""
+        row = self._connection().execute(
+            "SELECT COUNT(*) AS position FROM messages WHERE session_id = ? AND id < ?", (session_id, message_id)
+        ).fetchone()
+        return row["position"]
+    # endregion
+
+    # region 导入导出
+    def import_json(self, filepath: str, title: Optional[str] = None) -> int:
+        """从JSON消息列表文件导入为新会话，返回会话id"""
+        with open(filepath, "r", encoding="utf-8") as f:
+            messages = json.load(f)
+        if not isinstance(messages, list):
+            raise ValueError("历史记录文件应为消息列表")
+        return self.create_session(title or os.path.splitext(os.path.basename(filepath))[0], messages)
+
+    def export_json(self, session_id: int, filepath: str) -> str:
+        """把会话导出为JSON消息列表文件，逐行读取不一次性载入全部消息"""
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        cursor = self._connection().execute(
+            "SELECT * FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+        )
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("[")
+            for index, row in enumerate(cursor):
+                f.write(",\n  " if index else "\n  ")
+                f.write(json.dumps(self._to_message(row), ensure_ascii=False))
+            f.write("\n]")
+        os.replace(tmp_path, filepath)
+        return filepath
+    # endregion
+
+    def close(self) -> None:
+        """关闭所有线程的连接"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception as e:
+                LoggerManager().get_logger().warning(f"ConversationStore: 关闭数据库连接失败: {e}")
+        self._local = threading.local()
+
+
+def datetime_title(timestamp: float) -> str:
+    """按时间生成默认会话标题"""
+    return time.strftime("对话 %Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+class SessionHistory:
+    """
+    当前会话的历史记录，供 WriteBehindPersister 写入
+
+    只把会话最近的一段消息(窗口)载入内存，edit/delete 记录中的索引相对于窗口开头。
+    """
+
+    def __init__(self, store: ConversationStore, session_id: int):
+        self.store = store
+        self.session_id = session_id
+        self.base_offset = 0  # 已载入窗口的第一条消息在会话中的位置
+
+    def load(self, limit: Optional[int] = None) -> List[Dict]:
+        """载入会话最近 limit 条消息，limit 为空或0时载入全部"""
+        if limit:
+            messages = self.store.get_latest_messages(self.session_id, limit)
+        else:
+            messages = self.store.get_messages(self.session_id)
+        self.base_offset = max(0, self.store.count_messages(self.session_id) - len(messages))
+        return messages
+
+    def reset(self, messages: List[Dict]) -> None:
+        """用给定消息替换已载入的窗口，窗口之前的消息保留"""
+        self.store.replace_messages(self.session_id, messages, self.base_offset)
+
+    def write_records(self, records: List[Dict]) -> None:
+        self.base_offset = self.store.apply_records(self.session_id, records, self.base_offset)
@@ -0,0 +1,63 @@
+import json
+import os
+import re
+from typing import Dict, List
+
+
+def _apply(messages: List[Dict], record: Dict) -> None:
+    op = record.get("op")
+    if op == "append":
+        messages.append(record["message"])
+    elif op == "edit":
+        index = record.get("index", -1)
+        if 0 <= index < len(messages):
+            messages[index] = {**messages[index], "content": record.get("content")}
+    elif op == "delete":
+        index = record.get("index", -1)
+        if 0 <= index < len(messages):
+            messages.pop(index)
+
+
+def load_legacy_history(directory: str, name: str) -> List[Dict]:
+    """
+    读取旧版日志式聊天历史，供首次启动时迁移到 ConversationStore
+
+    旧版文件布局(均位于同一目录):
+    - <name>.json: 快照 {"generation": G, "messages": [...]}，已包含所有代号小于G的日志
+      (更早的版本直接保存消息列表，视为代号0)
+    - <name>.journal.<G>.jsonl: 代号为G的日志，每行一条操作记录 (append/edit/delete)
+
+    读取快照后按代号顺序重放不小于快照代号的日志，崩溃时写了一半的行被忽略。
+
+    Returns:
+        List[Dict]: 消息列表，文件不存在时为空
+    """
+    generation, messages = 0, []
+    snapshot_path = os.path.join(directory, f"{name}.json")
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            messages = data  # 旧版快照
+        elif isinstance(data, dict):
+            generation, messages = int(data.get("generation", 0)), list(data.get("messages") or [])
+
+    if not os.path.isdir(directory):
+        return messages
+    journal_pattern = re.compile(re.escape(name) + r"\.journal\.(\d+)\.jsonl$")
+    journals = sorted(
+        (int(match.group(1)), filename)
+        for filename in os.listdir(directory)
+        for match in [journal_pattern.match(filename)] if match
+    )
+    for journal_generation, filename in journals:
+        if journal_generation < generation:
+            continue
+        with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时写了一半的行
+                _apply(messages, record)
+    return messages
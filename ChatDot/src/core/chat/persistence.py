@@ -1,71 +1,270 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 from global_managers.persistence_manager import PersistenceManager
 from global_managers.logger_manager import LoggerManager
+from chat.journal import load_legacy_history
+from chat.conversation_store import ConversationStore, SessionHistory, DEFAULT_PAGE_SIZE
+from chat.write_behind import (
+    WriteBehindPersister, append_record, edit_record, delete_record, pin_record,
+    edit_by_id_record, delete_by_id_record, pin_by_id_record
+)
+from utils.path_utils import get_core_path
 import os
 import json
 from datetime import datetime
+from threading import Lock
 
 class ChatPersistence:
     # 全局常量定义
     BASE_DIR = "SECRETS"
     HISTORY_DIR = os.path.join(BASE_DIR, "chat_history")
     CURRENT_HISTORY_FILE = "current_history.json"
+    CURRENT_HISTORY_NAME = "current_history"
+    CONVERSATIONS_DB = "conversations.db"
+    CURRENT_SESSION_KEY = "current_session_id"
+    LEGACY_MIGRATED_KEY = "legacy_current_history_migrated"
     EXPORTS_DIR = os.path.join(BASE_DIR, "chat_exports")
 
+    # 所有实例共享的会话存储与后台写入器
+    _store = None
+    _history = None
+    _writer = None
+    _shared_lock = Lock()
+
     def __init__(self):
         self.persistence_manager = PersistenceManager()
+        with ChatPersistence._shared_lock:
+            if ChatPersistence._store is None:
+                self._init_shared()
+        self.store = ChatPersistence._store
+        self.history = ChatPersistence._history
+        self.writer = ChatPersistence._writer
+
+    def _init_shared(self):
+        """打开会话数据库，首次运行时迁移旧版 current_history，并创建后台写入器"""
+        directory = os.path.join(get_core_path(), "SECRETS", "persistence", "chat")
+        store = ConversationStore.for_path(os.path.join(directory, self.CONVERSATIONS_DB))
+        if store.get_meta(self.LEGACY_MIGRATED_KEY) is None:
+            # 旧版: current_history.json 快照 + 追加日志
+            legacy_messages = load_legacy_history(directory, self.CURRENT_HISTORY_NAME)
+            session_id = store.create_session("当前对话", legacy_messages)
+            store.set_meta(self.CURRENT_SESSION_KEY, str(session_id))
+            store.set_meta(self.LEGACY_MIGRATED_KEY, "1")
+            LoggerManager().get_logger().info(f"ChatPersistence: 已迁移旧版历史记录 ({len(legacy_messages)} 条消息)")
+        session_id = store.get_meta(self.CURRENT_SESSION_KEY)
+        if session_id is None or store.get_session(int(session_id)) is None:
+            session_id = store.create_session()
+            store.set_meta(self.CURRENT_SESSION_KEY, str(session_id))
+        history = SessionHistory(store, int(session_id))
+        # 写入由后台线程延迟批量完成，不阻塞对话
+        ChatPersistence._writer = WriteBehindPersister(
+            history, lambda config: PersistenceManager().save("chat", config)
+        )
+        ChatPersistence._history = history
+        ChatPersistence._store = store
+
+    def set_write_behind_interval(self, interval: float):
+        """设置后台写入的最大延迟(秒)，0表示同步写入"""
+        self.writer.set_flush_interval(interval)
+
+    def save_config(self, config: Dict):
+        """保存聊天配置"""
+        self.writer.submit_config(dict(config))
+
+    def load_config(self) -> Dict:
+        """加载聊天配置"""
+        self.writer.flush()
+        return self.persistence_manager.load("chat")
+
+    # region 当前会话
+    def get_current_session_id(self) -> int:
+        return self.history.session_id
+
+    def switch_session(self, session_id: int):
+        """切换当前会话，之前提交的写入先落盘到原会话"""
+        if self.store.get_session(session_id) is None:
+            raise KeyError(f"会话不存在: {session_id}")
+        self.writer.flush()
+        self.history.session_id = session_id
+        self.history.base_offset = 0
+        self.store.set_meta(self.CURRENT_SESSION_KEY, str(session_id))
 
     def save_history(self, messages: List[Dict]):
-        """保存当前聊天历史记录"""
-        self.persistence_manager.save("chat", messages, self.CURRENT_HISTORY_FILE)
+        """用给定消息替换已载入的当前历史记录(编辑后整体保存等)"""
+        # 复制消息，避免写入前被调用方修改
+        self.writer.submit_reset([dict(message) for message in messages])
+
+    def clear_history(self):
+        """
+        开始一个新的空会话作为当前会话，已保存的会话(包括导入与载入的会话)不受影响
+        当前会话本身为空时直接沿用，避免每次启动都留下空会话
+        """
+        self.writer.flush()
+        if self.store.count_messages(self.history.session_id) == 0:
+            self.history.base_offset = 0
+            return
+        self.switch_session(self.store.create_session())
+
+    def append_message(self, message: Dict):
+        """追加一条消息到当前聊天历史记录"""
+        self.writer.submit_records([append_record(dict(message))])
+
+    def edit_message(self, index: int, content: str):
+        """记录对已载入历史中指定消息的编辑"""
+        self.writer.submit_records([edit_record(index, content)])
+
+    def delete_message(self, index: int):
+        """记录删除已载入历史中的指定消息"""
+        self.writer.submit_records([delete_record(index)])
+
+    def set_message_pinned(self, index: int, pinned: bool):
+        """记录已载入历史中指定消息的置顶状态"""
+        self.writer.submit_records([pin_record(index, pinned)])
 
-    def load_history(self) -> List[Dict]:
-        """加载当前聊天历史记录"""
-        return self.persistence_manager.load("chat", self.CURRENT_HISTORY_FILE) or []
+    def edit_message_by_id(self, message_id: int, content: str):
+        """记录对当前会话中指定id消息的编辑(消息不在已载入窗口内时使用)"""
+        self.writer.submit_records([edit_by_id_record(message_id, content)])
+
+    def delete_message_by_id(self, message_id: int):
+        """记录删除当前会话中指定id的消息(消息不在已载入窗口内时使用)"""
+        self.writer.submit_records([delete_by_id_record(message_id)])
+
+    def set_message_pinned_by_id(self, message_id: int, pinned: bool):
+        """记录当前会话中指定id消息的置顶状态(消息不在已载入窗口内时使用)"""
+        self.writer.submit_records([pin_by_id_record(message_id, pinned)])
+
+    def load_history(self, limit: Optional[int] = None) -> List[Dict]:
+        """
+        加载当前会话的历史记录
 
+        Args:
+            limit: 只载入最近的消息条数，为空或0时载入全部
+        """
+        self.writer.flush()
+        return self.history.load(limit)
+
+    def load_history_page(self, before_id: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE,
+                          after_id: Optional[int] = None) -> List[Dict]:
+        """
+        分页读取当前会话的消息(按时间正序)，每项包含 id/created_at/position 与消息字段
+
+        Args:
+            before_id: 只读取id小于该值的最近消息
+            limit: 每页消息数
+            after_id: 只读取id大于该值的最早消息；两者都为空时读取最近一页
+        """
+        self.writer.flush()
+        session_id = self.history.session_id
+        if after_id is not None:
+            page = self.store.get_after(session_id, after_id, limit)
+        elif before_id is not None:
+            page = self.store.get_before(session_id, before_id, limit)
+        else:
+            page = self.store.get_latest(session_id, limit)
+        if page:
+            # 同一页的消息位置连续
+            first_position = self.store.get_position(session_id, page[0]["id"])
+            for offset, item in enumerate(page):
+                item["position"] = first_position + offset
+        return page
+
+    def get_loaded_offset(self) -> int:
+        """已载入内存的历史窗口在当前会话中的起始位置"""
+        return self.history.base_offset
+
+    def count_history(self) -> int:
+        """当前会话的消息总数"""
+        self.writer.flush()
+        return self.store.count_messages(self.history.session_id)
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待所有已提交的写入落盘"""
+        return self.writer.flush(timeout)
+
+    def close(self):
+        """写入剩余内容并关闭数据库连接，之后创建的实例会重新打开"""
+        with ChatPersistence._shared_lock:
+            self.writer.close()
+            self.store.close()
+            if ChatPersistence._store is self.store:
+                ChatPersistence._store = None
+                ChatPersistence._history = None
+                ChatPersistence._writer = None
+    # endregion
+
+    # region 会话列表与导入导出
     def export_history(self, filepath: str = None, messages: List[Dict] = None):
         """
         导出历史记录到文件
         
         Args:
             filepath: 可选，指定导出文件路径。如果未指定，将使用当前日期时间创建文件名
-            messages: 要导出的消息列表
+            messages: 要导出的消息列表，未指定时导出当前会话的全部消息
         """
         if filepath is None:
             current_time = datetime.now().strftime('%Y%m%d_%H%M%S')
             filepath = os.path.join(self.EXPORTS_DIR, f"chat_history_{current_time}.json")
         
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        if messages is None:
+            self.writer.flush()
+            return self.store.export_json(self.history.session_id, filepath)
+
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(messages, f, ensure_ascii=False, indent=2)
         
         return filepath
 
-    def import_history(self, filepath: str) -> List[Dict]:
-        """从文件导入历史记录"""
+    def import_history(self, filepath: str) -> int:
+        """从文件导入历史记录为新会话，返回会话id"""
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return self.store.import_json(filepath)
         except Exception as e:
             raise ValueError(f"导入历史记录失败: {str(e)}")
 
+    def import_legacy_directory(self, directory: str) -> int:
+        """把目录中旧版导出的JSON历史文件各导入为一个会话(每个文件只导入一次)，返回导入的数量"""
+        if not os.path.isdir(directory):
+            return 0
+        imported = 0
+        for file in sorted(os.listdir(directory)):
+            if not file.endswith('.json'):
+                continue
+            filepath = os.path.abspath(os.path.join(directory, file))
+            meta_key = f"legacy_file:{filepath}"
+            if self.store.get_meta(meta_key) is not None:
+                continue
+            try:
+                self.store.import_json(filepath)
+                imported += 1
+            except Exception as e:
+                LoggerManager().get_logger().warning(f"ChatPersistence: 导入旧版历史文件 {file} 失败: {e}")
+            self.store.set_meta(meta_key, "1")
+        return imported
+
     def get_history_list(self) -> List[Dict]:
-        """获取历史记录文件列表"""
-        history_files = []
-        
-        exports_dir = self.EXPORTS_DIR
-        if os.path.exists(exports_dir):
-            for file in os.listdir(exports_dir):
-                if file.endswith('.json'):
-                    filepath = os.path.join(exports_dir, file)
-                    history_files.append({
-                        'filename': file,
-                        'filepath': filepath,
-                        'modified_time': datetime.fromtimestamp(
-                            os.path.getmtime(filepath)
-                        ).strftime('%Y-%m-%d %H:%M:%S')
-                    })
-                    
-        return sorted(history_files, 
-                     key=lambda x: x['modified_time'], 
-                     reverse=True)
\ No newline at end of file
+        """获取会话列表(按最近更新时间倒序)"""
+        self.writer.flush()
+        current_session_id = self.history.session_id
+        return [
+            {
+                **session,
+                'is_current': session['id'] == current_session_id,
+                'modified_time': datetime.fromtimestamp(session['updated_at']).strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for session in self.store.list_sessions()
+        ]
+
+    def copy_session(self, session_id: int) -> int:
+        """复制会话，返回新会话id"""
+        self.writer.flush()
+        return self.store.copy_session(session_id)
+
+    def delete_session(self, session_id: int):
+        """删除会话，删除当前会话时切换到一个新的空会话"""
+        if session_id == self.history.session_id:
+            self.writer.flush()
+            self.store.delete_session(session_id)
+            self.switch_session(self.store.create_session())
+        else:
+            self.store.delete_session(session_id)
+    # endregion
@@ -16,14 +16,20 @@ class ChatService:
         """初始化服务"""
         # 获取依赖的服务
         llm_service = self.service_manager.get_service("llm_service")
+
+        # 加载聊天配置
+        config = self.persistence.load_config()
+        if config:
+            for key, value in config.items():
+                self.settings.update_setting(key, value)
+        self.persistence.set_write_behind_interval(self.settings.get_setting("write_behind_interval"))
         
         # 初始化客户端
-        self.adapter = ChatAdapter(llm_service, self.service_manager, self.persistence)
+        self.adapter = ChatAdapter(llm_service, self.service_manager, self.persistence, self.settings)
         self.adapter.initialize()
         
-        # 加载历史记录
-        history = self.persistence.load_history()
-        self.adapter.set_messages(history)
+        # 加载当前会话最近的历史记录
+        self.adapter.set_messages(self.persistence.load_history(self.settings.get_setting("history_load_limit")))
 
     def send_message(self, message: str, is_stream: bool = True) -> Iterator[str]:
         """
@@ -41,27 +47,155 @@ class ChatService:
         # 将响应迭代器直接返回给调用者
         return response_iter
     
-    def stop_generating(self):
-        """停止当前生成过程"""
+    def generate_candidates(self, n: Optional[int] = None, is_stream: bool = True) -> Iterator[Tuple[int, str]]:
+        """
+        为最后一条用户消息并发生成多个候选回复
+        
+        Args:
+            n: 候选数量，默认使用 candidate_count 设置
+            is_stream: 是否使用流式输出
+            
+        Returns:
+            Iterator[Tuple[int, str]]: (候选序号, 响应片段) 迭代器，各候选的片段交错到达
+        """
+        n = n or self.settings.get_setting("candidate_count") or 1
+        return self.adapter.generate_candidates(n, is_stream)
+
+    def get_last_candidates(self) -> List[str]:
+        """获取最近一次多候选生成的全部候选回复"""
+        return list(self.adapter.last_candidates) if self.adapter else []
+
+    def stop_generating(self, request_id: Optional[str] = None):
+        """
+        停止当前生成过程
+        
+        Args:
+            request_id: 要停止的请求ID，默认为当前请求
+        """
         if self.adapter:
-            self.adapter.stop_generating()
+            self.adapter.stop_generating(request_id)
+
+    def update_setting(self, key, value):
+        """更新设置并保存"""
+        self.settings.update_setting(key, value)
+        if key == "write_behind_interval":
+            self.persistence.set_write_behind_interval(value)
+        self.persistence.save_config({
+            "context_budget": self.settings.get_setting("context_budget"),
+            "cache_friendly_layout": self.settings.get_setting("cache_friendly_layout"),
+            "candidate_count": self.settings.get_setting("candidate_count"),
+            "history_load_limit": self.settings.get_setting("history_load_limit"),
+            "write_behind_interval": self.settings.get_setting("write_behind_interval")
+        })
+
+    def get_context_budget_report(self) -> Optional[Dict]:
+        """获取最近一次发送时的上下文预算报告（裁剪的消息数与token数等）"""
+        return self.adapter.last_budget_report if self.adapter else None
+
+    def get_layout_report(self) -> Optional[Dict]:
+        """获取最近一次发送的稳定前缀报告（前缀消息数/token数与提供方返回的 cached_tokens）"""
+        return self.adapter.last_layout_report if self.adapter else None
+
+    def shutdown(self):
+        """关闭服务，写入剩余的聊天状态并关闭会话数据库"""
+        self.persistence.close()
 
     def clear_context(self):
-        """清空上下文"""
+        """清空上下文，切换到新的空会话(原会话保留在会话列表中)"""
         self.adapter.clear_context()
-        self.persistence.save_history([])
+        self.persistence.clear_history()
 
     def get_messages(self) -> List[Dict]:
         """获取所有消息"""
         return self.adapter.get_messages()
 
+    def set_messages(self, messages: List[Dict]):
+        """设置消息列表并保存"""
+        self.adapter.set_messages(messages)
+        self.persistence.save_history(messages)
+
     def export_history(self, filepath: str = None):
-        """导出历史记录"""
-        messages = self.adapter.get_messages()
-        return self.persistence.export_history(filepath, messages)
+        """导出当前会话的全部历史记录"""
+        return self.persistence.export_history(filepath)
 
     def import_history(self, filepath: str):
-        """导入历史记录"""
-        messages = self.persistence.import_history(filepath)
-        self.adapter.set_messages(messages)
-        self.persistence.save_history(messages)
\ No newline at end of file
+        """导入历史记录文件为新会话并切换到该会话"""
+        session_id = self.persistence.import_history(filepath)
+        self.load_session(session_id)
+        return session_id
+
+    def load_session(self, session_id: int):
+        """切换到指定会话并载入其最近的历史记录"""
+        self.persistence.switch_session(session_id)
+        self.adapter.set_messages(self.persistence.load_history(self.settings.get_setting("history_load_limit")))
+
+    def get_current_session_id(self) -> int:
+        return self.persistence.get_current_session_id()
+
+    def get_history_list(self) -> List[Dict]:
+        """获取会话列表"""
+        return self.persistence.get_history_list()
+
+    def copy_session(self, session_id: int) -> int:
+        return self.persistence.copy_session(session_id)
+
+    def delete_session(self, session_id: int):
+        """删除会话，删除的是当前会话时清空当前消息"""
+        is_current = session_id == self.persistence.get_current_session_id()
+        self.persistence.delete_session(session_id)
+        if is_current:
+            self.adapter.set_messages([])
+
+    def import_legacy_directory(self, directory: str) -> int:
+        """把目录中旧版导出的历史文件导入为会话"""
+        return self.persistence.import_legacy_directory(directory)
+
+    def get_history_page(self, before_id: Optional[int] = None, limit: int = 50,
+                         after_id: Optional[int] = None) -> List[Dict]:
+        """
+        分页读取当前会话的消息
+
+        Args:
+            before_id: 只读取id小于该值的最近消息
+            limit: 每页消息数
+            after_id: 只读取id大于该值的最早消息；两者都为空时读取最近一页
+
+        Returns:
+            List[Dict]: 按时间正序的消息，每项包含 id/created_at/role/content，
+                以及 index (在 get_messages() 中的索引，不在已载入窗口内时为-1)
+        """
+        page = self.persistence.load_history_page(before_id, limit, after_id)
+        offset = self.persistence.get_loaded_offset()
+        loaded_count = len(self.adapter.get_messages())
+        for item in page:
+            index = item["position"] - offset
+            item["index"] = index if 0 <= index < loaded_count else -1
+        return page
+
+    def edit_message(self, index: int, content: str):
+        """编辑已载入历史中指定索引的消息"""
+        self.adapter.edit_message(index, content)
+
+    def delete_message(self, index: int):
+        """删除已载入历史中指定索引的消息"""
+        self.adapter.delete_message(index)
+
+    def set_message_pinned(self, index: int, pinned: bool):
+        """置顶/取消置顶已载入历史中指定索引的消息，置顶消息在上下文预算裁剪时保留"""
+        self.adapter.set_message_pinned(index, pinned)
+
+    def set_message_pinned_by_id(self, message_id: int, pinned: bool):
+        """置顶/取消置顶当前会话中指定id的消息，用于分页载入的、不在已载入历史中的消息"""
+        self.persistence.set_message_pinned_by_id(message_id, pinned)
+
+    def edit_message_by_id(self, message_id: int, content: str):
+        """编辑当前会话中指定id的消息，用于分页载入的、不在已载入历史中的消息"""
+        self.persistence.edit_message_by_id(message_id, content)
+
+    def delete_message_by_id(self, message_id: int):
+        """删除当前会话中指定id的消息，用于分页载入的、不在已载入历史中的消息"""
+        self.persistence.delete_message_by_id(message_id)
+
+    def count_history(self) -> int:
+        """当前会话的消息总数"""
+        return self.persistence.count_history()
\ No newline at end of file
@@ -1,8 +1,15 @@
 from global_managers.settings_manager import SettingsManager
 from global_managers.logger_manager import LoggerManager
+from chat.context_budget import DEFAULT_CONTEXT_BUDGET
+from chat.write_behind import DEFAULT_WRITE_BEHIND_INTERVAL
 
 DEFAULT_CHAT_SETTINGS = {
     "current_handler": "defaultPrompt",  # 默认的上下文处理器
+    "context_budget": dict(DEFAULT_CONTEXT_BUDGET),  # 发送前按模型token预算裁剪上下文
+    "cache_friendly_layout": False,  # 缓存友好布局: 保持system与历史消息前缀稳定，RAG等易变内容放在末尾
+    "candidate_count": 3,  # 重新生成时并发生成的候选回复数
+    "history_load_limit": 500,  # 启动/切换会话时载入内存的最近消息数，更早的消息按需分页读取，0表示全部载入
+    "write_behind_interval": DEFAULT_WRITE_BEHIND_INTERVAL,  # 聊天状态后台写入的最大延迟(秒)，0表示同步写入
 }
 
 class ChatSettings:
@@ -0,0 +1,196 @@
+import time
+from threading import Condition, Lock, Thread
+from typing import Callable, Dict, List, Optional
+from global_managers.logger_manager import LoggerManager
+
+DEFAULT_WRITE_BEHIND_INTERVAL = 0.2  # 写入最多延迟的时间(秒)，0表示在调用线程同步写入
+
+
+# region 历史操作记录
+def append_record(message: Dict) -> Dict:
+    return {"op": "append", "message": message}
+
+
+def edit_record(index: int, content: str) -> Dict:
+    return {"op": "edit", "index": index, "content": content}
+
+
+def delete_record(index: int) -> Dict:
+    return {"op": "delete", "index": index}
+
+
+def pin_record(index: int, pinned: bool) -> Dict:
+    return {"op": "pin", "index": index, "pinned": pinned}
+
+
+def edit_by_id_record(message_id: int, content: str) -> Dict:
+    """按会话存储中的消息id编辑，用于已载入窗口之外的消息"""
+    return {"op": "edit", "id": message_id, "content": content}
+
+
+def delete_by_id_record(message_id: int) -> Dict:
+    """按会话存储中的消息id删除，用于已载入窗口之外的消息"""
+    return {"op": "delete", "id": message_id}
+
+
+def pin_by_id_record(message_id: int, pinned: bool) -> Dict:
+    """按会话存储中的消息id置顶/取消置顶，用于已载入窗口之外的消息"""
+    return {"op": "pin", "id": message_id, "pinned": pinned}
+# endregion
+
+
+class WriteBehindPersister:
+    """
+    聊天状态的后台延迟写入器
+
+    调用方只把写入请求放进合并队列后立即返回，由专用线程在 flush_interval 内批量落盘，
+    磁盘延迟不再出现在对话的关键路径上。
+
+    - 历史操作记录按顺序批量写入，整批只提交一次
+    - 整体替换历史(清空/导入)时丢弃之前尚未写入的日志记录，只保留最新状态
+    - 配置写入只保留最新一份
+    - flush() 阻塞到当前已提交的写入全部落盘，关闭时调用
+
+    示例：
+        ```
+        persister = WriteBehindPersister(history_store, save_config=lambda config: ...)
+        persister.submit_records([append_record(message)])
+        persister.flush()
+        ```
+    """
+
+    def __init__(self, history_store, save_config: Callable[[Dict], None],
+                 flush_interval: float = DEFAULT_WRITE_BEHIND_INTERVAL):
+        """
+        Args:
+            history_store: 历史记录存储，需提供 reset(messages) 与 write_records(records)
+            save_config: 写入配置的函数
+            flush_interval: 写入最多延迟的时间(秒)，0表示同步写入
+        """
+        self.history_store = history_store
+        self.save_config = save_config
+        self.flush_interval = flush_interval
+        self._condition = Condition()
+        self._write_lock = Lock()  # 保证各批次按提交顺序写入
+        self._pending_reset: Optional[List[Dict]] = None  # 待写入的整体替换
+        self._pending_records: List[Dict] = []  # 待追加的日志记录(在整体替换之后)
+        self._pending_config: Optional[Dict] = None
+        self._submitted = 0  # 已提交的写入批次序号
+        self._written = 0  # 已落盘的写入批次序号
+        self._flush_requested = False
+        self._stopped = False
+        self._thread: Optional[Thread] = None
+
+    def set_flush_interval(self, flush_interval: float) -> None:
+        """设置写入延迟，0表示同步写入"""
+        self.flush_interval = max(0.0, flush_interval or 0.0)
+        if not self.flush_interval:
+            self.flush()
+
+    # region 提交
+    def _submit(self, apply: Callable[[], None]) -> None:
+        with self._condition:
+            apply()
+            self._submitted += 1
+            synchronous = not self.flush_interval
+            if not synchronous:
+                self._ensure_thread()
+                self._condition.notify_all()
+        if synchronous:
+            self._write_pending()
+
+    def submit_records(self, records: List[Dict]) -> None:
+        """提交历史操作记录(append/edit/delete)"""
+        self._submit(lambda: self._pending_records.extend(records))
+
+    def submit_reset(self, messages: List[Dict]) -> None:
+        """提交整体替换历史，丢弃之前尚未写入的日志记录"""
+        def apply():
+            self._pending_reset = list(messages)
+            self._pending_records = []
+        self._submit(apply)
+
+    def submit_config(self, config: Dict) -> None:
+        """提交配置写入，只保留最新一份"""
+        def apply():
+            self._pending_config = config
+        self._submit(apply)
+    # endregion
+
+    # region 写入
+    def _write_pending(self) -> None:
+        """取出并写入当前所有待写内容"""
+        with self._write_lock:
+            with self._condition:
+                reset, records, config = self._pending_reset, self._pending_records, self._pending_config
+                self._pending_reset, self._pending_records, self._pending_config = None, [], None
+                batch = self._submitted
+            try:
+                if config is not None:
+                    self.save_config(config)
+                if reset is not None:
+                    self.history_store.reset(reset)
+                self.history_store.write_records(records)
+            except Exception as e:
+                LoggerManager().get_logger().error(f"WriteBehindPersister: 写入聊天状态失败: {e}")
+            finally:
+                with self._condition:
+                    self._written = max(self._written, batch)
+                    self._condition.notify_all()
+
+    def _has_pending(self) -> bool:
+        return self._written < self._submitted
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = Thread(target=self._run, name="ChatWriteBehind", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._has_pending() and not self._stopped:
+                    self._condition.wait()
+                if self._stopped and not self._has_pending():
+                    return
+                # 等待最多 flush_interval，合并期间到达的写入；请求flush时立即写入
+                deadline = time.monotonic() + self.flush_interval
+                while not self._flush_requested and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                self._flush_requested = False
+            self._write_pending()
+    # endregion
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        立即写入并等待所有已提交的写入落盘
+
+        Returns:
+            bool: 是否在超时前全部写入
+        """
+        with self._condition:
+            target = self._submitted
+            thread_alive = self._thread is not None and self._thread.is_alive()
+            if thread_alive:
+                self._flush_requested = True
+                self._condition.notify_all()
+        if not thread_alive:
+            if self._written < target:
+                self._write_pending()
+            return True
+        with self._condition:
+            return self._condition.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self, timeout: Optional[float] = 5) -> None:
+        """写入剩余内容并停止后台线程"""
+        self.flush(timeout)
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -29,6 +29,7 @@ class ConsoleInterface:
             'tts': self.configure_tts,
             'stt': self.configure_stt,
             'rag': self.configure_rag,
+            'batch': self.run_batch,
             'exit': lambda: print("退出程序...")
         }
 
@@ -70,6 +71,7 @@ class ConsoleInterface:
         print("tts     - 配置TTS语音合成服务")
         print("stt     - 配置STT语音识别服务")
         print("rag     - 管理RAG长期记忆服务")
+        print("batch   - 批量运行JSONL中的对话")
         print("exit    - 退出程序")
 
     def chat_mode(self):
@@ -381,6 +383,22 @@ class ConsoleInterface:
         chat_service.import_history(filepath)
         print("聊天历史导入成功")
 
+    def run_batch(self):
+        """批量运行JSONL中的对话"""
+        from batch_runner import BatchRunner, format_report
+        input_path = input("请输入输入JSONL路径: ").strip()
+        output_path = input("请输入输出JSONL路径(已完成的条目会被跳过): ").strip()
+        concurrency = input("并发数(留空使用默认): ").strip()
+        rate_limit = input("每个Key每秒请求数上限(留空不限速): ").strip()
+        runner = BatchRunner(
+            self.service_manager.get_service("llm_service"),
+            self.service_manager.get_service("context_handle_service"),
+            concurrency=int(concurrency) if concurrency else None,
+            rate_limit_per_key=float(rate_limit) if rate_limit else None
+        )
+        print("正在运行...")
+        print(format_report(runner.run(input_path, output_path)))
+
     def list_models(self):
         """列出可用的LLM模型"""
         llm_service = self.service_manager.get_service("llm_service")
@@ -398,9 +416,10 @@ class ConsoleInterface:
         print("2. 设置API基础URL")
         print("3. 设置默认模型")
         print("4. 管理模型参数")
-        print("5. 返回")
+        print("5. 查看API Key状态")
+        print("6. 返回")
         
-        choice = input("请选择 (1-5): ")
+        choice = input("请选择 (1-6): ")
         if choice == "1":
             key = input("请输入API密钥: ").strip()
             llm_service.update_setting("api_keys", [key])
@@ -412,6 +431,43 @@ class ConsoleInterface:
             llm_service.update_setting("model_name", model)
         elif choice == "4":
             self._manage_model_params(llm_service)
+        elif choice == "5":
+            self._show_llm_key_stats(llm_service)
+
+    def _show_llm_key_stats(self, llm_service):
+        """显示API Key调度统计"""
+        key_stats = llm_service.get_key_stats()
+        if not key_stats:
+            print("当前没有配置API Key")
+            return
+
+        def fmt_seconds(value):
+            return f"{value * 1000:.0f}ms" if value is not None else "-"
+
+        print("\nAPI Key 状态:")
+        for stats in key_stats:
+            print(f"- {stats['key']}")
+            print(f"  并发: {stats['in_flight']}  总请求: {stats['total_requests']}")
+            print(f"  平均TTFT: {fmt_seconds(stats['avg_ttft'])}  平均耗时: {fmt_seconds(stats['avg_latency'])}")
+            print(f"  错误率: {stats['error_rate']:.0%}  429比例: {stats['rate_limit_rate']:.0%}")
+            if stats['cooldown_remaining'] > 0:
+                print(f"  冷却中: 剩余 {stats['cooldown_remaining']:.1f}s")
+
+        pool_stats = llm_service.get_pool_stats()
+        print(f"\n请求工作池: 并发 {pool_stats['active']}/{pool_stats['max_concurrency']}  排队 {pool_stats['queued']}  "
+              f"已拒绝 {pool_stats['rejected']}")
+        print(f"  平均排队: {fmt_seconds(pool_stats['avg_queue_wait'])}  P95排队: {fmt_seconds(pool_stats['p95_queue_wait'])}")
+
+        cache_stats = llm_service.get_cache_stats()
+        hit_rate = f"{cache_stats['hit_rate']:.0%}" if cache_stats['hit_rate'] is not None else "-"
+        print(f"\n响应缓存: 命中 {cache_stats['hits']}  未命中 {cache_stats['misses']}  命中率 {hit_rate}  "
+              f"内存条目 {cache_stats['memory_entries']}")
+
+        hedge_stats = llm_service.get_hedge_stats()
+        if hedge_stats['hedged_requests']:
+            print(f"对冲请求: 发出 {hedge_stats['hedges_fired']}/{hedge_stats['hedged_requests']}  "
+                  f"对冲胜出 {hedge_stats['hedge_wins']}  原请求胜出 {hedge_stats['primary_wins']}  "
+                  f"额外prompt token≈{hedge_stats['extra_prompt_tokens']}")
     
     def _manage_model_params(self, llm_service):
         """管理模型参数"""
@@ -552,9 +608,10 @@ class ConsoleInterface:
             print("5. 管理预设角色")
             print("6. 管理TTS处理器") # 新增选项
             print("7. 测试 TTS")
-            print("8. 返回主菜单")
+            print("8. 音频缓存")
+            print("9. 返回主菜单")
             
-            choice = input("请选择 (1-8): ").strip()
+            choice = input("请选择 (1-9): ").strip()
             
             if choice == "1":
                 current_status = tts_service.settings.get_setting("initialize")
@@ -587,12 +644,52 @@ class ConsoleInterface:
             elif choice == "7":  # 测试
                 self._test_tts(tts_service)
                 
-            elif choice == "8":  # 返回
+            elif choice == "8":
+                self._manage_tts_cache(tts_service)
+                
+            elif choice == "9":  # 返回
                 break
                 
             else:
                 print("无效的选择，请重试")
 
+    def _manage_tts_cache(self, tts_service):
+        """查看音频缓存统计、预热常用短句"""
+        while True:
+            stats = tts_service.get_cache_stats()
+            hit_rate = f"{stats['hit_rate']:.0%}" if stats['hit_rate'] is not None else "-"
+            print(f"\n音频缓存: 命中 {stats['hits']} (磁盘 {stats['disk_hits']})  未命中 {stats['misses']}  命中率 {hit_rate}")
+            print(f"内存: {stats['memory_entries']} 条 / {stats['memory_bytes'] / 1024 / 1024:.1f} MB  淘汰 {stats['memory_evictions']}")
+            if stats['disk_entries'] is not None:
+                print(f"磁盘: {stats['disk_entries']} 条 / {stats['disk_bytes'] / 1024 / 1024:.1f} MB  淘汰 {stats['disk_evictions']}")
+            http_stats = tts_service.get_connection_stats()
+            if http_stats:
+                print(f"后端连接: 请求 {http_stats['requests']}  重试 {http_stats['retries']}  失败 {http_stats['failures']}  "
+                      f"新建连接 {http_stats['connections_opened']}  复用 {http_stats['connections_reused']}")
+            print("1. 预热常用短句(当前预设)")
+            print("2. 清空缓存")
+            print("3. 返回")
+
+            choice = input("请选择 (1-3): ").strip()
+
+            if choice == "1":
+                phrases = input("请输入短句，用 | 分隔 (例如: 你好|好的|嗯嗯): ").strip()
+                try:
+                    result = tts_service.prewarm_cache(phrases.split("|"))
+                    print(f"预热完成: 新缓存 {result['cached']}  已存在 {result['skipped']}  失败 {result['failed']}")
+                except Exception as e:
+                    print(f"预热失败: {e}")
+
+            elif choice == "2":
+                tts_service.clear_audio_cache()
+                print("音频缓存已清空")
+
+            elif choice == "3":
+                break
+
+            else:
+                print("无效的选择，请重试")
+
     def _configure_tts_params(self, tts_service):
         """配置 TTS 详细参数"""
         print("\nTTS 参数配置:")
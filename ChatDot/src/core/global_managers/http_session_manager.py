@@ -0,0 +1,315 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from global_managers.logger_manager import LoggerManager
+
+# httpx 为可选依赖，不可用时只提供同步会话
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+DEFAULT_HTTP_SETTINGS = {
+    "connect_timeout": 3.05,  # 建立连接的超时(秒)
+    "read_timeout": 60,  # 等待响应数据的超时(秒)，流式合成时为两个数据块之间的最长间隔
+    "max_retries": 2,  # 失败后的重试次数
+    "backoff_base": 0.2,  # 重试等待的基数(秒)，第n次重试在 [0, base * 2^n] 内随机等待
+    "backoff_max": 2.0,  # 单次重试等待的上限(秒)
+    "pool_size": 4,  # 每个后端地址保持的 keep-alive 连接数
+}
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+RETRY_STATUS_CODES = frozenset((502, 503, 504))  # 后端重启或过载时的临时错误
+
+
+class HttpSessionManager:
+    """
+    后端HTTP连接管理器 (单例模式)
+
+    为每个后端地址(scheme://host:port)维护一个长期存活的 requests.Session，
+    以及一个 httpx.AsyncClient 异步客户端，复用 keep-alive 连接，
+    避免 TTS / Live2D 等后端的每次请求都重新进行 TCP 握手。
+
+    所有请求都带有连接超时与读取超时；连接失败、超时以及 502/503/504 时
+    按指数退避加随机抖动(full jitter)重试。非幂等请求(如 POST)只在连接
+    阶段失败(请求未发出)时重试，避免后端重复处理。
+
+    同步会话通过 urllib3 连接池的计数统计新建连接数，异步客户端通过
+    httpcore 的 trace 扩展统计，请求总数减去新建连接数即为复用连接数。
+    异步客户端绑定首次使用它的事件循环，只能在 LLMEventLoop 共享事件循环上使用和关闭。
+
+    示例：
+        ```
+        http = HttpSessionManager()
+        http.configure(server_url, {"read_timeout": 30})
+        response = http.request("GET", f"{server_url}/tts", params=params)
+        ```
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                instance = super(HttpSessionManager, cls).__new__(cls)
+                instance._sessions = {}  # origin -> requests.Session
+                instance._async_clients = {}  # origin -> httpx.AsyncClient
+                instance._settings = {}  # origin -> 覆盖默认值的设置
+                instance._stats_lock = threading.Lock()
+                instance._stats = {
+                    "requests": 0,
+                    "retries": 0,
+                    "failures": 0,
+                    "async_requests": 0,
+                    "async_connections_opened": 0,
+                }
+                cls._instance = instance
+        return cls._instance
+
+    @staticmethod
+    def get_origin(url: str) -> str:
+        """提取 scheme://host:port，同一后端的不同路径共享连接"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    # region 配置
+    def configure(self, url: str, settings: Optional[Dict] = None) -> None:
+        """
+        设置某个后端地址的超时、重试与连接池大小，未指定的项使用 DEFAULT_HTTP_SETTINGS
+        连接池大小变化时重建该地址的会话
+        """
+        origin = self.get_origin(url)
+        settings = {key: value for key, value in (settings or {}).items()
+                    if key in DEFAULT_HTTP_SETTINGS and value is not None}
+        with self._lock:
+            previous = self.get_settings(url)
+            self._settings[origin] = settings
+            rebuild = previous["pool_size"] != self.get_settings(url)["pool_size"]
+            session = self._sessions.pop(origin, None) if rebuild else None
+            # 异步客户端只能在其事件循环上关闭，这里只丢弃引用，由垃圾回收释放连接
+            if rebuild:
+                self._async_clients.pop(origin, None)
+        if session is not None:
+            session.close()
+
+    def get_settings(self, url: str) -> Dict:
+        """获取某个后端地址生效的设置"""
+        return {**DEFAULT_HTTP_SETTINGS, **self._settings.get(self.get_origin(url), {})}
+
+    def _timeout(self, settings: Dict):
+        return (settings["connect_timeout"], settings["read_timeout"])
+
+    def _backoff(self, settings: Dict, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间，在 [0, 上限] 内均匀随机，避免多个请求同时重试"""
+        return random.uniform(0, min(settings["backoff_max"], settings["backoff_base"] * (2 ** attempt)))
+    # endregion
+
+    # region 同步会话
+    def get_session(self, url: str) -> requests.Session:
+        """获取(必要时创建)后端地址对应的会话"""
+        origin = self.get_origin(url)
+        with self._lock:
+            session = self._sessions.get(origin)
+            if session is None:
+                pool_size = self.get_settings(url)["pool_size"]
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+                session = requests.Session()
+                session.mount(f"{urlsplit(origin).scheme}://", adapter)
+                self._sessions[origin] = session
+                LoggerManager().get_logger().debug(f"HttpSessionManager: 新建会话 {origin}")
+            return session
+
+    @staticmethod
+    def _should_retry(method: str, error: Exception) -> bool:
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True  # 连接未建立，请求一定没有发出
+        if isinstance(error, requests.exceptions.ConnectionError) and error.args and \
+                isinstance(getattr(error.args[0], "reason", None), NewConnectionError):
+            return True  # 连接被拒绝等，请求同样没有发出
+        if method not in IDEMPOTENT_METHODS:
+            return False
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        通过共享会话发送请求，失败时按设置重试
+
+        未传入 timeout 时使用该后端地址的 (连接超时, 读取超时)。
+        stream=True 时只重试到收到响应头为止，之后读取数据块的错误由调用方处理。
+
+        Raises:
+            requests.RequestException: 重试用尽后的最后一次错误
+        """
+        method = method.upper()
+        settings = self.get_settings(url)
+        kwargs.setdefault("timeout", self._timeout(settings))
+        session = self.get_session(url)
+        attempt = 0
+        while True:
+            self._count("requests")
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                if attempt >= settings["max_retries"] or not self._should_retry(method, e):
+                    self._count("failures")
+                    raise
+                error = e
+            else:
+                if (response.status_code not in RETRY_STATUS_CODES or method not in IDEMPOTENT_METHODS
+                        or attempt >= settings["max_retries"]):
+                    return response
+                error = f"状态码 {response.status_code}"
+                response.close()
+            delay = self._backoff(settings, attempt)
+            attempt += 1
+            self._count("retries")
+            LoggerManager().get_logger().debug(
+                f"HttpSessionManager: {method} {url} 失败({error})，{delay:.2f}秒后第{attempt}次重试"
+            )
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+    # endregion
+
+    # region 异步客户端
+    async def _on_request_async(self, request):
+        """httpx 请求钩子，为每个请求挂载 trace 回调"""
+        request.extensions["trace"] = self._trace_async
+        self._count("async_requests")
+
+    async def _trace_async(self, event_name, info):
+        """httpcore trace 回调，只在建立新 TCP 连接时触发 connect_tcp"""
+        if event_name == "connection.connect_tcp.complete":
+            self._count("async_connections_opened")
+
+    def get_async_client(self, url: str) -> "httpx.AsyncClient":
+        """
+        获取(必要时创建)后端地址对应的异步客户端，只能在 LLMEventLoop 上使用
+
+        Raises:
+            RuntimeError: httpx 不可用
+        """
+        if not HTTPX_AVAILABLE:
+            raise RuntimeError("httpx 未安装，无法使用异步客户端")
+        origin = self.get_origin(url)
+        with self._lock:
+            client = self._async_clients.get(origin)
+            if client is None:
+                settings = self.get_settings(url)
+                client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings["pool_size"],
+                        max_keepalive_connections=settings["pool_size"]
+                    ),
+                    follow_redirects=True,
+                    event_hooks={"request": [self._on_request_async]}
+                )
+                self._async_clients[origin] = client
+                LoggerManager().get_logger().debug(f"HttpSessionManager: 新建异步客户端 {origin}")
+            return client
+
+    @staticmethod
+    def _should_retry_async(method: str, error: Exception) -> bool:
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return True  # 连接未建立，请求一定没有发出
+        if method not in IDEMPOTENT_METHODS:
+            return False
+        return isinstance(error, httpx.TransportError)
+
+    async def request_async(self, method: str, url: str, **kwargs) -> "httpx.Response":
+        """
+        request() 的异步版本，在 LLMEventLoop 上通过共享异步客户端发送请求并读取完整响应
+
+        Raises:
+            httpx.HTTPError: 重试用尽后的最后一次错误
+        """
+        method = method.upper()
+        settings = self.get_settings(url)
+        if "timeout" not in kwargs:
+            kwargs["timeout"] = httpx.Timeout(settings["read_timeout"], connect=settings["connect_timeout"])
+        client = self.get_async_client(url)
+        attempt = 0
+        while True:
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.HTTPError as e:
+                if attempt >= settings["max_retries"] or not self._should_retry_async(method, e):
+                    self._count("failures")
+                    raise
+                error = e
+            else:
+                if (response.status_code not in RETRY_STATUS_CODES or method not in IDEMPOTENT_METHODS
+                        or attempt >= settings["max_retries"]):
+                    return response
+                error = f"状态码 {response.status_code}"
+            delay = self._backoff(settings, attempt)
+            attempt += 1
+            self._count("retries")
+            LoggerManager().get_logger().debug(
+                f"HttpSessionManager: {method} {url} 失败({error})，{delay:.2f}秒后第{attempt}次重试"
+            )
+            await asyncio.sleep(delay)
+
+    async def post_async(self, url: str, **kwargs) -> "httpx.Response":
+        return await self.request_async("POST", url, **kwargs)
+
+    async def aclose(self) -> None:
+        """关闭所有异步客户端，需在 LLMEventLoop 上调用"""
+        with self._lock:
+            clients, self._async_clients = list(self._async_clients.values()), {}
+        for client in clients:
+            await client.aclose()
+    # endregion
+
+    def _count(self, name: str, value: int = 1):
+        with self._stats_lock:
+            self._stats[name] += value
+
+    def get_stats(self) -> Dict:
+        """
+        获取请求数、重试与失败次数，以及新建/复用的连接数
+
+        同步请求的新建连接数与发出的请求数来自各会话的 urllib3 连接池，
+        其中发出的请求数包含重试。
+        """
+        connections_opened = 0
+        requests_sent = 0
+        with self._lock:
+            sessions = dict(self._sessions)
+        for session in sessions.values():
+            for adapter in session.adapters.values():
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    connections_opened += pool.num_connections
+                    requests_sent += pool.num_requests
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            "sessions": len(sessions),
+            "connections_opened": connections_opened,
+            "connections_reused": max(0, requests_sent - connections_opened),
+            "async_clients": len(self._async_clients),
+            "async_connections_reused": max(0, stats["async_requests"] - stats["async_connections_opened"]),
+        })
+        return stats
+
+    def close(self) -> None:
+        """关闭所有同步会话(异步客户端见 aclose)"""
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
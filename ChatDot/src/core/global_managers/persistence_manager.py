@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 from utils.path_utils import get_core_path
 
 class PersistenceManager:
@@ -17,8 +18,11 @@ class PersistenceManager:
         directory = os.path.join(core_path, "SECRETS", "persistence", module_name)
         os.makedirs(directory, exist_ok=True)
         filepath = os.path.join(directory, filename)
-        with open(filepath, "w", encoding="utf-8") as f:
+        # 先写临时文件再原子替换，中途崩溃不会留下写了一半的文件
+        tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, filepath)
 
     def load(self, module_name, filename="data.json"):
         """从文件加载模块的数据"""
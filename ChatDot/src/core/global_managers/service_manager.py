@@ -11,6 +11,7 @@ class ServiceManager:
         if not cls._instance:
             cls._instance = super(ServiceManager, cls).__new__(cls)
             cls._instance._services = {}
+            cls._instance._ready = set()  # 已完成初始化的服务名
             cls._instance._initialized = False
         return cls._instance
     
@@ -68,6 +69,7 @@ class ServiceManager:
                 service.initialize()
             except Exception as e:
                 raise RuntimeError(f"初始化服务 '{service_name}' 失败: {str(e)}")
+        self._ready.add(service_name)
     
     def shutdown_service(self, service_name: str) -> None:
         """
@@ -77,6 +79,7 @@ class ServiceManager:
             service_name: 要关闭的服务名称
         """
         service = self.get_service(service_name)
+        self._ready.discard(service_name)
         if hasattr(service, 'shutdown'):
             service.shutdown()
     
@@ -90,4 +93,30 @@ class ServiceManager:
         Returns:
             bool: 服务是否已注册
         """
-        return service_name in self._services
\ No newline at end of file
+        return service_name in self._services
+
+    def is_service_ready(self, service_name: str) -> bool:
+        """
+        检查服务是否已完成初始化
+
+        Args:
+            service_name: 服务名称
+
+        Returns:
+            bool: 服务是否已注册并初始化
+        """
+        return service_name in self._ready
+
+    def get_ready_service(self, service_name: str) -> Any:
+        """
+        获取已完成初始化的服务实例
+
+        Args:
+            service_name: 服务名称
+
+        Returns:
+            服务实例，服务尚未就绪时返回None
+        """
+        if service_name not in self._ready:
+            return None
+        return self._services.get(service_name)
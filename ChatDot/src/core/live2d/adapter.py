@@ -1,14 +1,19 @@
-import requests
+import asyncio
 from global_managers.logger_manager import LoggerManager
+from global_managers.http_session_manager import HttpSessionManager, HTTPX_AVAILABLE
 
 class Live2DAdapter:
-    def __init__(self, server_url: str = None, enable_emotion: bool = True):
+    def __init__(self, server_url: str = None, enable_emotion: bool = True, http_settings: dict = None):
         """
         初始化 Live2D 客户端
         :param server_url: Live2D 后端的服务器地址（可选）
         :param enable_emotion: 是否启用情感分析
+        :param http_settings: 超时、重试与连接池设置，见 DEFAULT_HTTP_SETTINGS
         """
-        self.server_url = server_url
+        self.http = HttpSessionManager()
+        self.http_settings = http_settings
+        self.server_url = None
+        self.set_server_url(server_url)
 
     def set_server_url(self, server_url: str):
         """
@@ -16,6 +21,17 @@ class Live2DAdapter:
         :param server_url: Live2D 后端的服务器地址
         """
         self.server_url = server_url
+        if server_url:
+            self.http.configure(server_url, self.http_settings)
+
+    def set_http_settings(self, http_settings: dict):
+        """
+        设置超时、重试与连接池
+        :param http_settings: 见 DEFAULT_HTTP_SETTINGS
+        """
+        self.http_settings = http_settings
+        if self.server_url:
+            self.http.configure(self.server_url, http_settings)
 
     def text_to_live2d(self, text: str):
         """
@@ -34,7 +50,7 @@ class Live2DAdapter:
             LoggerManager().get_logger().debug(f"发送数据到 Live2D 后端: {payload}")
 
             # 发送 POST 请求到 Live2D 后端
-            response = requests.post(self.server_url, json=payload)
+            response = self.http.post(self.server_url, json=payload)
 
             # 检查响应状态
             if response.status_code == 200:
@@ -44,6 +60,31 @@ class Live2DAdapter:
         except Exception as e:
             LoggerManager().get_logger().warning(f"发送数据时发生错误: {e}")
 
+    async def text_to_live2d_async(self, text: str):
+        """
+        text_to_live2d 的异步版本，通过共享异步客户端发送，需在 LLMEventLoop 上调用
+        httpx 不可用时在线程池中执行同步版本
+        :param text: 输入的文本
+        """
+        if not HTTPX_AVAILABLE:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.text_to_live2d, text)
+            return
+        if not self.server_url:
+            LoggerManager().get_logger().warning("警告: Live2D 后端 URL 未设置，无法处理请求")
+            return
+
+        try:
+            payload = {"chunk": text}
+            LoggerManager().get_logger().debug(f"发送数据到 Live2D 后端: {payload}")
+            response = await self.http.post_async(self.server_url, json=payload)
+            if response.status_code == 200:
+                LoggerManager().get_logger().debug("成功发送数据到 Live2D 后端")
+            else:
+                LoggerManager().get_logger().warning(f"发送失败，状态码: {response.status_code}, 响应: {response.text}")
+        except Exception as e:
+            LoggerManager().get_logger().warning(f"发送数据时发生错误: {e}")
+
 # 示例用法
 if __name__ == "__main__":
     # 初始化 Live2D 客户端，指定后端地址
@@ -1,4 +1,4 @@
-import asyncio
+from adapter.llm.event_loop import LLMEventLoop
 from live2d.adapter import Live2DAdapter
 from live2d.settings import Live2DSettings
 from live2d.persistence import Live2DPersistence
@@ -36,7 +36,8 @@ class Live2DService:
         # 设置客户端 URL 和情感分析状态
         url = self.settings.get_setting("url")
         enable_emotion = self.settings.get_setting("initialize")
-        self.adapter = Live2DAdapter(server_url=url, enable_emotion=enable_emotion)
+        self.adapter = Live2DAdapter(server_url=url, enable_emotion=enable_emotion,
+                                     http_settings=self.settings.get_setting("http"))
 
         if url:
             self.adapter.set_server_url(url)
@@ -59,18 +60,14 @@ class Live2DService:
         """
         self.adapter.set_server_url(server_url)
         self.settings.update_setting("url", server_url)
-        self.persistence.save_config({
-            "url": server_url,
-            "initialize": self.settings.get_setting("initialize")
-        })
+        self.save_config()
 
     async def _text_to_live2d_async(self, text: str):
         """
-        异步处理文本并调用 Live2DAdapter 的 text_to_live2d 方法
+        异步处理文本并调用 Live2DAdapter 的 text_to_live2d_async 方法
         :param text: 输入的文本
         """
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self.adapter.text_to_live2d, text)
+        await self.adapter.text_to_live2d_async(text)
 
     def text_to_live2d(self, text: str):
         """
@@ -87,7 +84,12 @@ class Live2DService:
             LoggerManager().get_logger().warning("警告: Live2D URL 未设置，无法处理请求")
             return
 
-        asyncio.run(self._text_to_live2d_async(text))
+        # 在共享事件循环上发送，异步客户端的 keep-alive 连接跨请求复用
+        event_loop = LLMEventLoop()
+        if event_loop.in_loop_thread():
+            event_loop.submit(self._text_to_live2d_async(text))  # 不能在事件循环线程中同步等待
+        else:
+            event_loop.run(self._text_to_live2d_async(text))
         
     def realtime_text_to_live2d(self, text_chunk=None, force_process=False):
         """
@@ -105,7 +107,8 @@ class Live2DService:
         """
         config = {
             "url": self.settings.get_setting("url"),
-            "initialize": self.settings.get_setting("initialize")
+            "initialize": self.settings.get_setting("initialize"),
+            "http": self.settings.get_setting("http")
         }
         self.persistence.save_config(config)
 
@@ -117,6 +120,8 @@ class Live2DService:
         self.save_config()
         if key == "url":
             self.adapter.set_server_url(value)
+        elif key == "http" and self.adapter:
+            self.adapter.set_http_settings(value)
         elif key == "initialize":
             if value:  # 如果启用
                 LoggerManager().get_logger().debug("正在启用 Live2D 服务...")
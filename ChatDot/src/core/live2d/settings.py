@@ -3,7 +3,12 @@ from global_managers.logger_manager import LoggerManager
 
 DEFAULT_LIVE2D_SETTINGS = {
     "url": None,  # Live2D 后端的 URL，默认为 None
-    "initialize": True  # 是否初始化 Live2D，默认为 True
+    "initialize": True,  # 是否初始化 Live2D，默认为 True
+    "http": {  # 后端连接: 超时(秒)与重试，实时动作请求超时应较短，未指定的项使用 DEFAULT_HTTP_SETTINGS
+        "connect_timeout": 1.0,
+        "read_timeout": 5,
+        "max_retries": 1
+    }
 }
 
 class Live2DSettings:
@@ -1,13 +1,20 @@
-import requests
 from global_managers.logger_manager import LoggerManager
+from global_managers.http_session_manager import HttpSessionManager
 
 class TTSAdapter:
-    def __init__(self, server_url: str = None):
+    def __init__(self, server_url: str = None, http_settings: dict = None):
         """
         初始化 TTS 客户端
         :param server_url: TTS 后端的服务器地址
+        :param http_settings: 超时、重试与连接池设置，见 DEFAULT_HTTP_SETTINGS
         """
-        self.server_url = server_url
+        self.http = HttpSessionManager()
+        self.http_settings = http_settings
+        self.server_url = None
+        # 最近一次成功加载到后端的模型权重，参与音频缓存键
+        self.gpt_weights_path = None
+        self.sovits_weights_path = None
+        self.set_server_url(server_url)
 
     def set_server_url(self, server_url: str):
         """
@@ -15,6 +22,17 @@ class TTSAdapter:
         :param server_url: TTS 后端的服务器地址
         """
         self.server_url = server_url
+        if server_url:
+            self.http.configure(server_url, self.http_settings)
+
+    def set_http_settings(self, http_settings: dict):
+        """
+        设置超时、重试与连接池
+        :param http_settings: 见 DEFAULT_HTTP_SETTINGS
+        """
+        self.http_settings = http_settings
+        if self.server_url:
+            self.http.configure(self.server_url, http_settings)
         
     def set_gpt_weights(self, weights_path: str):
         """
@@ -34,8 +52,9 @@ class TTSAdapter:
         
         try:
             LoggerManager().get_logger().debug(f"切换GPT模型: {url}, 参数: {params}")
-            response = requests.get(url, params=params)
+            response = self.http.get(url, params=params)
             if response.status_code == 200:
+                self.gpt_weights_path = weights_path
                 return "success"
             else:
                 return {"error": f"请求失败，状态码: {response.status_code}", "details": response.text}
@@ -60,8 +79,9 @@ class TTSAdapter:
         
         try:
             LoggerManager().get_logger().debug(f"切换Sovits模型: {url}, 参数: {params}")
-            response = requests.get(url, params=params)
+            response = self.http.get(url, params=params)
             if response.status_code == 200:
+                self.sovits_weights_path = weights_path
                 return "success"
             else:
                 return {"error": f"请求失败，状态码: {response.status_code}", "details": response.text}
@@ -90,7 +110,7 @@ class TTSAdapter:
 
         try:
             LoggerManager().get_logger().debug(f"tts.adapter: 请求 URL: {url}, 参数: {params}")
-            response = requests.get(url, params=params)
+            response = self.http.get(url, params=params)
             if response.status_code == 200:
                 return response.content  # 返回完整的音频数据
             else:
@@ -120,7 +140,7 @@ class TTSAdapter:
 
         try:
             LoggerManager().get_logger().debug(f"tts.adapter: 请求 URL: {url}, 参数: {params}")
-            with requests.get(url, params=params, stream=True) as response:
+            with self.http.get(url, params=params, stream=True) as response:
                 if response.status_code == 200:
                     for chunk in response.iter_content(chunk_size=1024):
                         if chunk:
@@ -1,16 +1,122 @@
 import pyaudio
-import queue
 import threading
+import time
 import io
 import wave
-import time
-import numpy as np
+from typing import Optional, Tuple
 from global_managers.logger_manager import LoggerManager
 
 # 全局输出设备索引
 AUDIO_OUTPUT_DEVICE_INDEX = 10
 
+RING_BUFFER_BYTES = 1 << 20  # 环形缓冲区大小，32kHz 16bit 单声道约 16 秒音频
+FRAMES_PER_BUFFER = 1024  # 每次回调输出的帧数，决定输出延迟
+WAV_HEADER_SIZE = 44  # 标准WAV头长度，找不到 data 块时使用
+
+
+class _RingBuffer:
+    """
+    预分配的字节环形缓冲区
+
+    写入方(播放线程)在空间不足时阻塞等待，读取方(PyAudio 回调)从不阻塞，
+    数据不足时只读出已有的部分。
+    """
+
+    def __init__(self, capacity: int):
+        self._data = bytearray(capacity)
+        self._capacity = capacity
+        self._start = 0  # 第一个未读字节的位置
+        self._size = 0  # 未读字节数
+        self._generation = 0  # clear() 时递增，使等待中的写入放弃
+        self.condition = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def write(self, data: bytes, generation: int, is_alive=lambda: True) -> bool:
+        """
+        写入全部数据，空间不足时等待读取方腾出空间
+
+        Args:
+            generation: 调用方开始处理这块数据时的 generation，之后发生过 clear() 则丢弃
+            is_alive: 等待期间检查输出流是否仍在运行，返回False时放弃剩余数据
+
+        Returns:
+            bool: 数据是否全部写入(被 clear() 或输出流停止打断时返回False)
+        """
+        view = memoryview(data)
+        with self.condition:
+            while view:
+                while self._size == self._capacity:
+                    # 超时只用于检查输出流是否意外停止，正常情况下由回调读取后唤醒
+                    self.condition.wait(0.5)
+                    if generation != self._generation or not is_alive():
+                        return False
+                if generation != self._generation:
+                    return False
+                count = min(len(view), self._capacity - self._size)
+                end = (self._start + self._size) % self._capacity
+                first = min(count, self._capacity - end)
+                self._data[end:end + first] = view[:first]
+                if count > first:
+                    self._data[:count - first] = view[first:count]
+                self._size += count
+                view = view[count:]
+        return True
+
+    def read(self, count: int, frame_size: int = 1) -> bytes:
+        """读出最多 count 字节(按整帧对齐)，不等待"""
+        with self.condition:
+            count = min(count, self._size)
+            count -= count % frame_size
+            if count <= 0:
+                return b""
+            first = min(count, self._capacity - self._start)
+            data = bytes(self._data[self._start:self._start + first])
+            if count > first:
+                data += bytes(self._data[:count - first])
+            self._start = (self._start + count) % self._capacity
+            self._size -= count
+            self.condition.notify_all()
+            return data
+
+    def clear(self):
+        """丢弃所有未读数据，并打断等待中的写入"""
+        with self.condition:
+            self._start = 0
+            self._size = 0
+            self._generation += 1
+            self.condition.notify_all()
+
+    def wait_empty(self, is_alive=lambda: True, timeout: Optional[float] = None) -> bool:
+        """等待数据全部被读出(输出流停止时不再等待)，返回是否已读空"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self._size and is_alive():
+                remaining = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return self._size == 0
+
+
 class AudioPlayer:
+    """
+    音频播放器 (单例模式)
+
+    使用 PyAudio 回调模式播放：feed_data 把PCM数据写入预分配的环形缓冲区，
+    PortAudio 的音频线程在回调中按需取走数据，缓冲区不足时输出静音，不再有
+    Python 播放线程阻塞在 stream.write 或轮询队列。
+
+    输出流在采样格式(位宽、声道、采样率)不变时一直保持打开，每句话的WAV头
+    只用于确认格式，不再关闭重开设备；格式变化时等缓冲区中已有的音频播完再重建。
+    缓冲区写满时 feed_data 阻塞，为上游提供背压。
+    """
     _instance = None
     _lock = threading.Lock()
 
@@ -22,98 +128,117 @@ class AudioPlayer:
 
     def __init__(self, output_device_index=AUDIO_OUTPUT_DEVICE_INDEX):
         if not hasattr(self, 'initialized'):
-            self.audio_queue = queue.Queue()
-            self.play_thread = None
-            self.stop_flag = False
-            self.first_chunk = True
             self.pyaudio = pyaudio.PyAudio()
             self.stream = None
+            self.stream_format = None  # (位宽, 声道数, 采样率)
+            self.frame_size = 1  # 每帧字节数
             self.output_device_index = output_device_index
+            self._buffer = _RingBuffer(RING_BUFFER_BYTES)
+            self._stream_lock = threading.Lock()
             self.initialized = True
             #LoggerManager().get_logger().debug("AudioPlayer 初始化完成")
 
     def start(self):
-        """启动播放线程"""
-        if self.play_thread is None or not self.play_thread.is_alive():
-            self.stop_flag = False
-            self.first_chunk = True  # 重置标志，用于识别头部WAV
-            self.play_thread = threading.Thread(target=self._play_from_queue)
-            self.play_thread.daemon = True
-            self.play_thread.start()
-            #LoggerManager().get_logger().debug("音频播放线程已启动")
+        """回调模式下没有播放线程，输出流在收到WAV头时按需打开；保留以兼容调用方"""
 
     def is_playing(self):
-        """检查是否有音频正在播放"""
-        return self.stream is not None and self.stream.is_active() or not self.audio_queue.empty()
+        """检查是否有音频正在播放(缓冲区中还有未输出的数据)"""
+        return self._buffer.size > 0
 
     def stop(self):
-        """停止播放"""
-        self.stop_flag = True
-        
-        # 清空队列
-        while not self.audio_queue.empty():
-            try:
-                self.audio_queue.get_nowait()
-            except queue.Empty:
-                break
-        
-        # 停止并关闭流
-        if self.stream:
-            if self.stream.is_active():
-                self.stream.stop_stream()
-            self.stream.close()
-            self.stream = None
-        
+        """停止播放，丢弃缓冲区中的音频；输出流保持打开，下一句无需重开设备"""
+        self._buffer.clear()
         #LoggerManager().get_logger().debug("音频播放已停止")
 
-    def _play_from_queue(self):
-        """从队列中获取并播放音频数据"""
-        while not self.stop_flag:
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """等待缓冲区中的音频全部输出，返回是否已播完"""
+        return self._buffer.wait_empty(self._stream_alive, timeout)
+
+    def close(self):
+        """停止播放并关闭输出流，下次收到WAV头时重新打开"""
+        self._buffer.clear()
+        with self._stream_lock:
+            self._close_stream()
+
+    # region 输出流
+    def _callback(self, in_data, frame_count, time_info, status):
+        """PortAudio 音频线程回调，不能阻塞；数据不足时用静音补齐"""
+        needed = frame_count * self.frame_size
+        data = self._buffer.read(needed, self.frame_size)
+        if len(data) < needed:
+            data += b"\x00" * (needed - len(data))
+        return data, pyaudio.paContinue
+
+    def _stream_alive(self) -> bool:
+        stream = self.stream
+        return stream is not None and stream.is_active()
+
+    def _close_stream(self):
+        """关闭输出流(需持有 _stream_lock)"""
+        if self.stream:
             try:
-                # 非阻塞方式获取数据
-                try:
-                    chunk = self.audio_queue.get(timeout=0.5)
-                except queue.Empty:
-                    continue
-                
-                # 检查是否为WAV数据
-                if len(chunk) >= 44 and chunk.startswith(b'RIFF'):
-                    LoggerManager().get_logger().debug("收到WAV头部数据，开始播放音频")
-                    # 解析WAV头获取音频参数
-                    wav_file = wave.open(io.BytesIO(chunk))
-                    
-                    # 如果流存在且参数不同，则关闭重建
-                    if self.stream:
-                        self.stream.stop_stream()
-                        self.stream.close()
-                    
-                    # 创建新的音频流
-                    self.stream = self.pyaudio.open(
-                        format=self.pyaudio.get_format_from_width(wav_file.getsampwidth()),
-                        channels=wav_file.getnchannels(),
-                        rate=wav_file.getframerate(),
-                        output=True,
-                        output_device_index=self.output_device_index
-                    )
-                    
-                    # 跳过WAV头，播放剩余部分
-                    if len(chunk) > 44:
-                        audio_data = chunk[44:]
-                        if audio_data and self.stream:
-                            self.stream.write(audio_data)
-                else:
-                    # 如果是音频数据，直接播放
-                    if self.stream:
-                        self.stream.write(chunk)
-                    
+                if self.stream.is_active():
+                    self.stream.stop_stream()
+                self.stream.close()
             except Exception as e:
-                LoggerManager().get_logger().warning(f"tts/audio_player: 音频播放错误: {e}")
-    
+                LoggerManager().get_logger().warning(f"tts/audio_player: 关闭音频流失败: {e}")
+            self.stream = None
+            self.stream_format = None
+
+    def _ensure_stream(self, stream_format: Tuple[int, int, int]):
+        """格式与当前输出流一致时直接复用，否则等已缓冲的音频播完后按新格式重建"""
+        if self.stream is not None and self.stream_format == stream_format and self.stream.is_active():
+            return
+        if self.stream is not None:
+            self._buffer.wait_empty(self._stream_alive)
+        with self._stream_lock:
+            self._close_stream()
+            sample_width, channels, rate = stream_format
+            LoggerManager().get_logger().debug(f"打开音频输出流: {rate}Hz, {channels}声道, {sample_width * 8}bit")
+            self.frame_size = sample_width * channels
+            self.stream = self.pyaudio.open(
+                format=self.pyaudio.get_format_from_width(sample_width),
+                channels=channels,
+                rate=rate,
+                output=True,
+                output_device_index=self.output_device_index,
+                frames_per_buffer=FRAMES_PER_BUFFER,
+                stream_callback=self._callback
+            )
+            self.stream_format = stream_format
+    # endregion
+
+    @staticmethod
+    def _parse_wav_header(chunk: bytes) -> Tuple[Tuple[int, int, int], int]:
+        """解析WAV头，返回 ((位宽, 声道数, 采样率), PCM数据起始位置)"""
+        wav_file = wave.open(io.BytesIO(chunk))
+        stream_format = (wav_file.getsampwidth(), wav_file.getnchannels(), wav_file.getframerate())
+        data_chunk = chunk.find(b"data", 12)
+        offset = data_chunk + 8 if data_chunk >= 0 else WAV_HEADER_SIZE
+        return stream_format, offset
 
     def feed_data(self, audio_data: bytes):
-        """添加音频数据到播放队列"""
-        if audio_data:
-            self.audio_queue.put(audio_data)
+        """
+        写入音频数据，每句话的第一块应以WAV头开始
+        缓冲区写满时阻塞到有空间为止，stop() 会打断等待并丢弃这块数据
+        """
+        if not audio_data:
+            return
+        generation = self._buffer.generation
+        try:
+            if len(audio_data) >= WAV_HEADER_SIZE and audio_data.startswith(b'RIFF'):
+                stream_format, offset = self._parse_wav_header(audio_data)
+                self._ensure_stream(stream_format)
+                if generation != self._buffer.generation:
+                    return  # 等待上一句播完时被 stop() 打断
+                audio_data = audio_data[offset:]
+            if not self.stream:
+                LoggerManager().get_logger().warning("tts/audio_player: 未收到WAV头，无法确定音频格式，已丢弃音频数据")
+                return
+            if audio_data:
+                self._buffer.write(audio_data, generation, self._stream_alive)
+        except Exception as e:
+            LoggerManager().get_logger().warning(f"tts/audio_player: 音频播放错误: {e}")
 
     def __del__(self):
         """析构函数，确保资源释放"""
@@ -137,37 +262,36 @@ player = AudioPlayer.get_instance()
 
 if __name__ == "__main__":
     import os
-    
+
     # 测试音频播放
     def test_play_audio(wav_path):
         LoggerManager().get_logger().debug(f"\n开始播放音频: {wav_path}")
-        
+
         # 获取播放器实例
         player = AudioPlayer.get_instance()
         player.start()
-        
+
         try:
             # 读取WAV文件
             with open(wav_path, 'rb') as f:
                 audio_data = f.read()
-                
-            # 连续播放3次
+
+            # 连续播放3次，输出流只打开一次
             for i in range(3):
                 LoggerManager().get_logger().debug(f"\n第 {i+1} 次播放")
                 player.feed_data(audio_data)
-                # 等待2秒
-                time.sleep(2)
-                
+            player.wait_until_idle()
+
         except Exception as e:
             LoggerManager().get_logger().warning(f"播放出错: {e}")
         finally:
             player.stop()
-    
-    # 测试用的WAV文件路径 
+
+    # 测试用的WAV文件路径
     wav_path = r"D:\jiajingyi\projects\ChatDot\ChatDot_Main\Refactoring_src\core\tts\测试.wav"
-    
+
     if os.path.exists(wav_path):
         test_play_audio(wav_path)
     else:
-        LoggerManager().get_logger().warning(f"测试文件不存在: {wav_path}") 
-        LoggerManager().get_logger().warning("请修改为正确的WAV文件路径")
\ No newline at end of file
+        LoggerManager().get_logger().warning(f"测试文件不存在: {wav_path}")
+        LoggerManager().get_logger().warning("请修改为正确的WAV文件路径")
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional
+from utils.path_utils import get_core_path
+from global_managers.logger_manager import LoggerManager
+
+DEFAULT_MAX_MEMORY_MB = 32  # 内存LRU缓存的容量上限(MB)
+DEFAULT_MAX_DISK_MB = 256  # 磁盘缓存的容量上限(MB)
+
+# 参与缓存键的合成参数，任一变化都对应不同的音频
+VOICE_KEYS = ("gpt_weights_path", "sovits_weights_path", "ref_audio_path", "prompt_text",
+              "text_lang", "prompt_lang", "text_split_method", "media_type")
+
+
+class TTSAudioCache:
+    """
+    合成音频缓存
+
+    两级缓存: 内存LRU在前，磁盘存储在后(SECRETS/persistence/tts/audio_cache)。
+    每条缓存保存一句话的完整音频，命中时直接交给播放器，不再请求TTS后端。
+
+    缓存键是规范化文本与音色参数(模型权重、参考音频、提示文本、语言、分句方式)的哈希，
+    不包含 streaming_mode，流式与非流式合成共享同一条缓存。
+
+    内存缓存按总字节数淘汰，磁盘缓存按最近访问时间(文件mtime)淘汰。
+
+    示例：
+        ```
+        cache = TTSAudioCache()
+        key = cache.make_key(text, voice)
+        audio = cache.get(key)
+        if audio is None:
+            audio = synthesize(text)
+            cache.put(key, audio)
+        ```
+    """
+
+    def __init__(self, max_memory_mb: float = DEFAULT_MAX_MEMORY_MB,
+                 max_disk_mb: float = DEFAULT_MAX_DISK_MB, directory: Optional[str] = None):
+        self.directory = directory or os.path.join(
+            get_core_path(), "SECRETS", "persistence", "tts", "audio_cache"
+        )
+        self.max_memory_bytes = int(max(0, max_memory_mb) * 1024 * 1024)
+        self.max_disk_bytes = int(max(0, max_disk_mb) * 1024 * 1024)
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_index: Optional[Dict[str, list]] = None  # key -> [size, last_access]，首次使用时扫描目录
+        self._disk_bytes = 0
+        self._lock = Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._memory_evictions = 0
+        self._disk_evictions = 0
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """统一全角/半角字符并合并空白，避免同一句话因格式不同而重复合成"""
+        return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+    @classmethod
+    def make_key(cls, text: str, voice: Dict) -> str:
+        """计算 (规范化文本, 音色参数) 的哈希"""
+        payload = json.dumps(
+            {"text": cls.normalize_text(text), **{key: (voice or {}).get(key) for key in VOICE_KEYS}},
+            sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def configure(self, max_memory_mb: Optional[float] = None, max_disk_mb: Optional[float] = None) -> None:
+        """运行时修改容量上限，超出部分立即淘汰"""
+        with self._lock:
+            if max_memory_mb is not None:
+                self.max_memory_bytes = int(max(0, max_memory_mb) * 1024 * 1024)
+            if max_disk_mb is not None:
+                self.max_disk_bytes = int(max(0, max_disk_mb) * 1024 * 1024)
+            self._trim_memory()
+            if self._disk_index is not None:
+                self._trim_disk()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.audio")
+
+    def _load_disk_index(self) -> None:
+        """扫描磁盘缓存目录，建立大小与访问时间索引(需持有锁)"""
+        if self._disk_index is not None:
+            return
+        self._disk_index = {}
+        self._disk_bytes = 0
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".audio"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+            except OSError:
+                continue
+            self._disk_index[filename[:-6]] = [stat.st_size, stat.st_mtime]
+            self._disk_bytes += stat.st_size
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        """放入内存LRU(需持有锁)"""
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        self._trim_memory()
+
+    def _trim_memory(self) -> None:
+        while self._memory and self._memory_bytes > self.max_memory_bytes:
+            _, audio = self._memory.popitem(last=False)
+            self._memory_bytes -= len(audio)
+            self._memory_evictions += 1
+
+    def _trim_disk(self) -> None:
+        """按最近访问时间淘汰磁盘缓存直到总大小不超过上限(需持有锁)"""
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        for key, (size, _) in sorted(self._disk_index.items(), key=lambda item: item[1][1]):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del self._disk_index[key]
+            self._disk_bytes -= size
+            self._disk_evictions += 1
+
+    def contains(self, key: str) -> bool:
+        """是否已缓存(不计入命中统计)"""
+        with self._lock:
+            if key in self._memory:
+                return True
+            self._load_disk_index()
+            return key in self._disk_index
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        查询缓存
+
+        Returns:
+            Optional[bytes]: 缓存的音频，未命中时返回None
+        """
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return audio
+            self._load_disk_index()
+            if key not in self._disk_index:
+                self._misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    audio = f.read()
+                # 更新访问时间，磁盘淘汰按最近访问排序
+                now = time.time()
+                os.utime(path, (now, now))
+                self._disk_index[key][1] = now
+            except OSError as e:
+                LoggerManager().get_logger().warning(f"TTSAudioCache: 读取缓存失败，已丢弃: {e}")
+                self._disk_bytes -= self._disk_index.pop(key)[0]
+                self._misses += 1
+                return None
+            self._remember(key, audio)
+            self._hits += 1
+            self._disk_hits += 1
+            return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        """写入缓存(内存与磁盘)"""
+        if not audio:
+            return
+        with self._lock:
+            self._remember(key, audio)
+            self._load_disk_index()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(key)
+                temp_path = f"{path}.tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(audio)
+                os.replace(temp_path, path)
+            except OSError as e:
+                LoggerManager().get_logger().warning(f"TTSAudioCache: 写入缓存失败: {e}")
+                return
+            if key in self._disk_index:
+                self._disk_bytes -= self._disk_index[key][0]
+            self._disk_index[key] = [len(audio), time.time()]
+            self._disk_bytes += len(audio)
+            self._trim_disk()
+
+    def clear(self) -> None:
+        """清空内存与磁盘缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._load_disk_index()
+            for key in list(self._disk_index):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._disk_index = {}
+            self._disk_bytes = 0
+
+    def get_stats(self) -> Dict:
+        """获取命中/未命中次数、淘汰次数、条目数与占用"""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else None,
+                "memory_evictions": self._memory_evictions,
+                "disk_evictions": self._disk_evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk_index) if self._disk_index is not None else None,
+                "disk_bytes": self._disk_bytes if self._disk_index is not None else None,
+            }
@@ -0,0 +1,291 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, Tuple, Union
+from global_managers.logger_manager import LoggerManager
+
+DEFAULT_TTS_PIPELINE = {
+    "text_queue_size": 4096,  # 待分句的文本片段，足够大使LLM流只需入队
+    "segment_queue_size": 32,  # 待合成的句子
+    "max_concurrent_synthesis": 2,  # 同时进行的合成请求数
+    "max_buffered_sentences": 4,  # 已开始合成但未播放完的句子数上限(含正在播放的句子)
+}
+MAX_SYNTHESIS_WORKERS = 8  # 合成线程池大小，max_concurrent_synthesis 不能超过此值
+
+_FLUSH = object()  # 分句线程: 强制处理缓冲区剩余文本
+_STOP = object()  # 工作线程退出
+_END = object()  # 一句话的音频结束
+
+
+class _Limit:
+    """可在运行时调整上限的计数信号量"""
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._count < self._limit)
+            self._count += 1
+
+    def release(self):
+        with self._condition:
+            self._count -= 1
+            self._condition.notify_all()
+
+    def resize(self, limit: int):
+        """调整上限，已占用的名额不受影响，降低上限时等已占用的名额释放后生效"""
+        with self._condition:
+            self._limit = limit
+            self._condition.notify_all()
+
+
+class _SynthesisSlot:
+    """一句话的合成结果，按句子顺序排队等待播放，音频块在合成过程中逐块写入"""
+    __slots__ = ("generation", "text", "chunks", "cancelled")
+
+    def __init__(self, generation, text):
+        self.generation = generation
+        self.text = text
+        self.chunks = queue.Queue()
+        self.cancelled = False
+
+    def cancel(self):
+        """放弃这句话，正在等待它的播放线程立即继续"""
+        self.cancelled = True
+        self.chunks.put(_END)
+
+
+class TTSPipeline:
+    """
+    TTS 生产者/消费者流水线
+
+    分句、合成、播放在后台线程中完成，之间通过有界队列连接：
+    文本片段 -> [分句] -> 句子 -> [合成调度] -> 按句排序的合成结果 -> [播放]
+    调用方(LLM流)只需把文本片段放入队列，不等待合成和播放。
+
+    合成调度为每句话预留一个按顺序排队的结果槽，并提交到线程池并发合成，
+    最多 max_concurrent_synthesis 个合成请求同时进行，已合成但未播放完的句子
+    不超过 max_buffered_sentences；播放线程按句子顺序取出结果槽，边合成边播放，
+    后续句子的合成与当前句的播放重叠。
+    stop() 使所有已排队和进行中的任务失效，并取消进行中的合成。
+    """
+
+    def __init__(self,
+                 split_text: Callable[[Optional[str], str, bool], Tuple[str, str]],
+                 synthesize: Callable[[str], Union[bytes, Iterable[bytes]]],
+                 player,
+                 config: dict = None):
+        """
+        Args:
+            split_text: 分句函数 (文本片段, 缓冲区, 是否强制处理) -> (要合成的文本, 新缓冲区)
+            synthesize: 合成函数，返回完整音频或音频块迭代器
+            player: 音频播放器，需提供 start/stop/feed_data/is_playing
+            config: 队列大小，见 DEFAULT_TTS_PIPELINE
+        """
+        config = {**DEFAULT_TTS_PIPELINE, **(config or {})}
+        self._split_text = split_text
+        self._synthesize = synthesize
+        self.player = player
+        self._text_queue = queue.Queue(maxsize=config["text_queue_size"])
+        self._segment_queue = queue.Queue(maxsize=config["segment_queue_size"])
+        self._slot_queue = queue.Queue()  # 按句子顺序排列的结果槽
+        self._synthesis_limit = _Limit(self._clamp_concurrency(config["max_concurrent_synthesis"]))  # 合成名额，合成结束时释放
+        self._slot_limit = _Limit(max(1, int(config["max_buffered_sentences"])))  # 预读名额，播放结束时释放
+        self._active_slots = set()  # 未播放完的结果槽，stop() 时取消
+        self._executor = None
+        self._generation = 0  # stop() 时递增，旧代的任务被丢弃
+        self._buffer = ""  # 分句缓冲区，只由分句线程访问
+        self._buffer_generation = 0
+        self._busy = 0  # 正在处理中的任务数(已出队但未完成)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=MAX_SYNTHESIS_WORKERS,
+                                                thread_name_prefix="TTSSynthesis")
+            for name, target in (("TTSSegmenter", self._segment_loop),
+                                 ("TTSSynthesisDispatcher", self._dispatch_loop),
+                                 ("TTSPlayer", self._play_loop)):
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    # region 生产者接口
+    def submit_text(self, text_chunk: Optional[str] = None, force_process: bool = False):
+        """放入LLM流的文本片段，由分句线程按当前处理器策略切分；force_process 时处理剩余文本"""
+        self._ensure_started()
+        generation = self._generation
+        if text_chunk:
+            self._text_queue.put((generation, text_chunk))
+        if force_process:
+            self._text_queue.put((generation, _FLUSH))
+
+    def submit_segment(self, text: str):
+        """跳过分句，直接放入一段待合成的文本"""
+        if not text or not text.strip():
+            return
+        self._ensure_started()
+        self._segment_queue.put((self._generation, text))
+
+    @staticmethod
+    def _clamp_concurrency(count) -> int:
+        return min(MAX_SYNTHESIS_WORKERS, max(1, int(count)))
+
+    def set_max_concurrent_synthesis(self, count: int):
+        """设置同时进行的合成请求数，立即生效，不打断正在进行的合成与播放"""
+        self._synthesis_limit.resize(self._clamp_concurrency(count))
+
+    def stop(self):
+        """丢弃所有排队和进行中的文本、句子与音频，取消进行中的合成，并停止播放"""
+        with self._lock:
+            self._generation += 1
+            slots, self._active_slots = self._active_slots, set()
+        for slot in slots:
+            slot.cancel()
+        for pending in (self._text_queue, self._segment_queue):
+            self._drain(pending)
+        self.player.stop()
+
+    def is_busy(self) -> bool:
+        """是否还有未播放完的内容"""
+        pending_text = bool(self._buffer) and self._is_current(self._buffer_generation)
+        return (self._busy > 0 or pending_text or not self._text_queue.empty()
+                or not self._segment_queue.empty() or bool(self._active_slots)
+                or self.player.is_playing())
+
+    def close(self):
+        """停止并退出所有工作线程，之后再提交时重新启动"""
+        self.stop()
+        with self._lock:
+            threads, self._threads = self._threads, []
+            executor, self._executor = self._executor, None
+        if threads:
+            self._text_queue.put((self._generation, _STOP))
+            for thread in threads:
+                thread.join(timeout=1)
+        if executor is not None:
+            executor.shutdown(wait=False)
+    # endregion
+
+    @staticmethod
+    def _drain(pending: queue.Queue):
+        while True:
+            try:
+                pending.get_nowait()
+            except queue.Empty:
+                return
+
+    def _set_busy(self, delta: int):
+        with self._lock:
+            self._busy += delta
+
+    def _is_current(self, generation: int) -> bool:
+        return generation == self._generation
+
+    # region 工作线程
+    def _segment_loop(self):
+        while True:
+            generation, item = self._text_queue.get()
+            if item is _STOP:
+                self._segment_queue.put((generation, _STOP))
+                return
+            if not self._is_current(generation):
+                continue
+            if self._buffer_generation != generation:
+                # stop() 之后的新回复，丢弃旧缓冲区
+                self._buffer = ""
+                self._buffer_generation = generation
+            self._set_busy(1)
+            try:
+                force_process = item is _FLUSH
+                text, self._buffer = self._split_text(None if force_process else item, self._buffer, force_process)
+                if text and text.strip() and self._is_current(generation):
+                    LoggerManager().get_logger().debug(f"TTS分句: {text}")
+                    self._segment_queue.put((generation, text))
+            except Exception as e:
+                LoggerManager().get_logger().warning(f"TTS分句失败: {e}")
+            finally:
+                self._set_busy(-1)
+
+    def _dispatch_loop(self):
+        while True:
+            generation, text = self._segment_queue.get()
+            if text is _STOP:
+                self._slot_queue.put(_STOP)
+                return
+            if not self._is_current(generation):
+                continue
+            # 等待前面的句子播放完，保持预读的句子数不超过上限
+            self._slot_limit.acquire()
+            # 等待其他句子合成结束，保持同时进行的合成请求数不超过上限
+            self._synthesis_limit.acquire()
+            slot = _SynthesisSlot(generation, text)
+            with self._lock:
+                if not self._is_current(generation):
+                    self._synthesis_limit.release()
+                    self._slot_limit.release()
+                    continue
+                self._active_slots.add(slot)
+            self._slot_queue.put(slot)
+            try:
+                self._executor.submit(self._synthesize_slot, slot)
+            except RuntimeError:
+                # 线程池已关闭
+                self._synthesis_limit.release()
+                slot.cancel()
+
+    def _synthesize_slot(self, slot: _SynthesisSlot):
+        """在合成线程池中合成一句话，音频块写入结果槽"""
+        result = None
+        try:
+            result = self._synthesize(slot.text)
+            if isinstance(result, bytes):
+                result = [result]
+            elif isinstance(result, dict):
+                LoggerManager().get_logger().warning(f"合成失败: {result}")
+                return
+            for chunk in result:
+                if slot.cancelled or not self._is_current(slot.generation):
+                    break  # 已停止，放弃剩余音频
+                if not isinstance(chunk, bytes):
+                    LoggerManager().get_logger().warning(f"处理音频块失败: {chunk}")
+                    break
+                slot.chunks.put(chunk)
+        except Exception as e:
+            LoggerManager().get_logger().warning(f"TTS合成失败: {e}")
+        finally:
+            # 流式合成提前结束时关闭HTTP响应
+            close = getattr(result, "close", None)
+            if close:
+                close()
+            slot.chunks.put(_END)
+            self._synthesis_limit.release()
+
+    def _play_loop(self):
+        while True:
+            slot = self._slot_queue.get()
+            if slot is _STOP:
+                return
+            try:
+                while not slot.cancelled:
+                    chunk = slot.chunks.get()
+                    if chunk is _END or slot.cancelled:
+                        break
+                    try:
+                        self.player.start()
+                        self.player.feed_data(chunk)
+                    except Exception as e:
+                        LoggerManager().get_logger().warning(f"播放音频时发生错误: {e}")
+            finally:
+                with self._lock:
+                    self._active_slots.discard(slot)
+                self._slot_limit.release()
+    # endregion
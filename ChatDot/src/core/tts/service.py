@@ -1,15 +1,19 @@
 import asyncio
-import types
 from tts.adapter import TTSAdapter
 from tts.settings import TTSSettings
 from tts.persistence import TTSPersistence
 from tts.audio_player import AudioPlayer
 from tts.audio_player import player
+from tts.pipeline import TTSPipeline
+from tts.cache import TTSAudioCache, VOICE_KEYS
 import time
 from typing import List, Dict, Optional
 from global_managers.logger_manager import LoggerManager
 from tts.tts_handle.manager import TTSHandleManager
 
+# 旧的分句方式使用的句子结束标点
+SENTENCE_END_PUNCTUATION = ["。", "！", "？", ".", "!", "?", "\n"]
+
 class TTSService:
     """
     TTS 服务类
@@ -23,6 +27,14 @@ class TTSService:
         # 初始化TTS处理器管理器
         self.handler_manager = TTSHandleManager()
 
+        # 合成音频缓存，重复的短句不再请求后端
+        self.audio_cache = TTSAudioCache()
+
+        # 分句、合成、播放在后台流水线中进行，LLM流只需入队
+        self.pipeline = TTSPipeline(self._split_text, self.text_to_speech, player, {
+            "max_concurrent_synthesis": self.settings.get_setting("max_concurrent_synthesis")
+        })
+
     def initialize(self):
         """
         初始化服务
@@ -35,6 +47,8 @@ class TTSService:
         if config:
             for key, value in config.items():
                 self.settings.update_setting(key, value)
+        self.pipeline.set_max_concurrent_synthesis(self.settings.get_setting("max_concurrent_synthesis"))
+        self._configure_audio_cache()
 
         # 检查是否需要初始化
         if not self.settings.get_setting("initialize"):
@@ -44,7 +58,7 @@ class TTSService:
         # 设置客户端 URL
         url = self.settings.get_setting("url")
         if url:
-            self.adapter = TTSAdapter(server_url=url)
+            self.adapter = TTSAdapter(server_url=url, http_settings=self.settings.get_setting("http"))
         else:
             LoggerManager().get_logger().warning("警告: TTS URL 未设置，无法初始化客户端")
 
@@ -65,22 +79,16 @@ class TTSService:
             bool: 是否有音频在播放
         """
         #LoggerManager().get_logger().debug("检查是否有音频正在播放...")
-        if hasattr(self, '_text_buffer') and self._text_buffer:
-            return True  # 缓冲区有内容，视为正在播放
-        return player.is_playing() if hasattr(player, 'is_playing') else False
+        # 流水线中还有待分句、合成或播放的内容时视为正在播放
+        return self.pipeline.is_busy()
 
     def stop_playing(self):
         """
         停止所有正在播放的TTS音频
         """
-        # 清空缓冲区
+        # 丢弃流水线中的文本和音频，并停止播放器
         LoggerManager().get_logger().debug("停止播放音频，清空缓冲区")
-        if hasattr(self, '_text_buffer'):
-            self._text_buffer = ""
-        if hasattr(self, '_processed_sentences'):
-            self._processed_sentences.clear()
-        # 停止播放器
-        player.stop()
+        self.pipeline.stop()
     
     def switch_gpt_model(self, weights_path: str):
         """
@@ -208,18 +216,126 @@ class TTSService:
             return {"error": f"切换预设时发生错误: {str(e)}"}
     #endregion
 
+    def _check_synthesis_settings(self):
+        """检查是否可以合成，不满足时抛出异常"""
+        if not self.settings.get_setting("initialize"):
+            raise RuntimeError("TTS 未启用")
+
+        if not self.adapter:
+            raise RuntimeError("TTS 客户端未初始化")
+
+        missing = [param for param in ['text_lang', 'ref_audio_path', 'prompt_lang', 'prompt_text']
+                   if not self.settings.get_setting(param)]
+        if missing:
+            raise ValueError(f"TTS 设置不完整，当前缺失的参数：{', '.join(missing)}")
+
+    #region 音频缓存
+    def _configure_audio_cache(self):
+        config = self.settings.get_setting("audio_cache") or {}
+        self.audio_cache.configure(
+            max_memory_mb=config.get("max_memory_mb"),
+            max_disk_mb=config.get("max_disk_mb")
+        )
+
+    def _get_cache_key(self, text: str) -> Optional[str]:
+        """
+        计算文本在当前音色下的缓存键，未启用缓存时返回None
+        模型权重优先使用后端最近一次成功加载的路径，设置中的路径可能未同步(如直接修改 sovits_model_path)
+        """
+        if not (self.settings.get_setting("audio_cache") or {}).get("enabled"):
+            return None
+        voice = {key: self.settings.get_setting(key) for key in VOICE_KEYS}
+        if self.adapter:
+            for key in ("gpt_weights_path", "sovits_weights_path"):
+                loaded = getattr(self.adapter, key, None)
+                if loaded:
+                    voice[key] = loaded
+        return TTSAudioCache.make_key(text, voice)
+
+    def _caching_stream(self, cache_key: str, stream):
+        """边产出流式音频块边收集，完整结束后写入缓存；中途取消或出错时不缓存"""
+        chunks = []
+        try:
+            for chunk in stream:
+                if not isinstance(chunk, bytes):
+                    chunks = None
+                if chunks is not None:
+                    chunks.append(chunk)
+                yield chunk
+        finally:
+            stream.close()
+        if chunks:
+            self.audio_cache.put(cache_key, b"".join(chunks))
+
+    def get_cache_stats(self) -> Dict:
+        """获取合成音频缓存的命中、淘汰与占用统计"""
+        return self.audio_cache.get_stats()
+
+    def get_connection_stats(self) -> Dict:
+        """获取后端HTTP请求、重试与连接复用统计(所有后端共享)"""
+        return self.adapter.http.get_stats() if self.adapter else {}
+
+    def clear_audio_cache(self):
+        """清空合成音频缓存"""
+        self.audio_cache.clear()
+
+    def prewarm_cache(self, phrases: List[str]) -> Dict:
+        """
+        用当前预设的音色预先合成常用短句(问候、应答等)并写入缓存，阻塞直到完成
+
+        Args:
+            phrases: 短句列表，已缓存的短句会跳过
+
+        Returns:
+            Dict: {"cached": 新缓存数, "skipped": 已缓存数, "failed": 失败数}
+        """
+        self._check_synthesis_settings()
+        result = {"cached": 0, "skipped": 0, "failed": 0}
+        for phrase in dict.fromkeys(phrase.strip() for phrase in phrases if phrase and phrase.strip()):
+            cache_key = self._get_cache_key(phrase)
+            if cache_key is None:
+                raise RuntimeError("TTS 音频缓存未启用")
+            if self.audio_cache.contains(cache_key):
+                result["skipped"] += 1
+                continue
+            audio = self._synthesize(phrase, streaming_mode=False)
+            if isinstance(audio, bytes) and audio:
+                self.audio_cache.put(cache_key, audio)
+                result["cached"] += 1
+            else:
+                LoggerManager().get_logger().warning(f"TTS缓存预热失败: {phrase}: {audio}")
+                result["failed"] += 1
+        LoggerManager().get_logger().info(f"TTS缓存预热完成: {result}")
+        return result
+    #endregion
+
     def text_to_speech(self, text: str):
         """
-        调用 TTS 客户端进行语音合成
+        调用 TTS 客户端进行语音合成，相同文本与音色优先使用缓存的音频
         :param text: 文本内容
         :return: 音频数据（字节流）或生成器
         """
-        if not self.settings.get_setting("initialize"):
-            raise RuntimeError("TTS 未启用")
+        self._check_synthesis_settings()
 
-        if not self.adapter:
-            raise RuntimeError("TTS 客户端未初始化")
+        cache_key = self._get_cache_key(text)
+        if cache_key:
+            audio = self.audio_cache.get(cache_key)
+            if audio is not None:
+                LoggerManager().get_logger().debug(f"TTS音频缓存命中: {text}")
+                return audio
+
+        streaming_mode = self.settings.get_setting("streaming_mode")
+        result = self._synthesize(text, streaming_mode)
+        if not cache_key:
+            return result
+        if streaming_mode:
+            return self._caching_stream(cache_key, result)
+        if isinstance(result, bytes):
+            self.audio_cache.put(cache_key, result)
+        return result
 
+    def _synthesize(self, text: str, streaming_mode: bool):
+        """请求 TTS 后端合成，不经过缓存"""
         # 从设置中获取参数
         text_lang = self.settings.get_setting("text_lang")
         ref_audio_path = self.settings.get_setting("ref_audio_path")
@@ -228,10 +344,6 @@ class TTSService:
         text_split_method = self.settings.get_setting("text_split_method")
         batch_size = self.settings.get_setting("batch_size")
         media_type = self.settings.get_setting("media_type")
-        streaming_mode = self.settings.get_setting("streaming_mode")
-
-        if not text_lang or not ref_audio_path or not prompt_lang or not prompt_text:
-            raise ValueError(f"TTS 设置不完整，当前缺失的参数：{', '.join([param for param in ['text_lang', 'ref_audio_path', 'prompt_lang', 'prompt_text'] if not self.settings.get_setting(param)])}")
                              
         if streaming_mode:
             #LoggerManager().get_logger().debug("使用流式合成")
@@ -263,117 +375,76 @@ class TTSService:
     def play_text_to_speech(self, text: str, force_play=True):
         """
         播放合成的语音
+        文本放入后台流水线合成和播放，立即返回；设置不完整时直接抛出异常
+
+        Args:
+            text: 要合成的文本
+            force_play: 是否先停止正在播放和排队的音频
         """
         LoggerManager().get_logger().debug("开始播放合成语音...")
-        result = self.text_to_speech(text)
-        
-        if not isinstance(result, (bytes, types.GeneratorType)):
-            LoggerManager().get_logger().debug(f"合成失败: {result}")
-            return
-
-        try:
-            if force_play:
-                # 强制停止任何正在播放的音频
-                player.stop()
-            
-            # 重新启动播放器
-            player.start()
-            
-            if isinstance(result, bytes):
-                # 非流式模式：直接播放完整音频
-                LoggerManager().get_logger().debug(f"播放完整音频，大小: {len(result)} 字节")
-                player.feed_data(result)
-            else:
-                # 流式模式：逐块处理
-                chunk_count = 0
-                total_size = 0
-                for chunk in result:
-                    if isinstance(chunk, bytes):
-                        chunk_count += 1
-                        chunk_size = len(chunk)
-                        total_size += chunk_size
-                        #LoggerManager().get_logger().debug(f"处理第 {chunk_count} 个音频块，大小: {chunk_size} 字节")
-                        player.feed_data(chunk)
-                        # 添加小延迟，防止缓冲区溢出
-                        time.sleep(0.01)
-                    else:
-                        LoggerManager().get_logger().warning(f"处理音频块失败: {chunk}")
-                        break
-                LoggerManager().get_logger().debug(f"流式处理完成，共处理 {chunk_count} 个音频块，总大小 {total_size} 字节")
-        except Exception as e:
-            LoggerManager().get_logger().warning(f"播放音频时发生错误: {e}")
+        self._check_synthesis_settings()
+        if force_play:
+            # 强制停止任何正在播放的音频
+            self.pipeline.stop()
+        self.pipeline.submit_segment(text)
             
     def realtime_play_text_to_speech(self, text_chunk=None, force_process=False):
         """
-        实时文本转语音处理，将文本块收集到缓冲区，根据当前处理器策略进行TTS
+        实时文本转语音处理，将文本块放入流水线，由分句线程根据当前处理器策略进行TTS
         
         Args:
             text_chunk: 新的文本块，None表示不添加新文本
             force_process: 是否强制处理缓冲区中的所有文本，不论是否遇到标点
         """
-        # 第一次调用时初始化缓冲区
-        if not hasattr(self, '_text_buffer'):
-            self._text_buffer = ""
+        self.pipeline.submit_text(text_chunk, force_process)
+
+    def _split_text(self, text_chunk, buffer, force_process):
+        """
+        分句(在流水线的分句线程中调用)
         
+        Returns:
+            tuple[str, str]: (要合成的文本, 更新后的缓冲区)
+        """
         # 获取当前处理器
         handler = self.handler_manager.get_current_handler()
         if not handler:
             # 降级到默认处理方式（旧的逻辑）
-            self._legacy_realtime_play_text_to_speech(text_chunk, force_process)
-            return
+            return self._legacy_split_text(text_chunk, buffer, force_process)
         
         # 使用处理器处理文本
-        process_text, self._text_buffer = handler.process_text_chunk(
-            text_chunk, 
-            self._text_buffer,
-            force_process
-        )
-        
-        # 处理得到的文本
+        process_text, buffer = handler.process_text_chunk(text_chunk, buffer, force_process)
         if process_text and process_text.strip():
             LoggerManager().get_logger().debug(f"TTS处理器[{handler.__class__.__name__}]处理文本: {process_text}")
-            self.play_text_to_speech(process_text, force_play=False)
+        return process_text, buffer
             
-    def _legacy_realtime_play_text_to_speech(self, text_chunk=None, force_process=False):
+    def _legacy_split_text(self, text_chunk, buffer, force_process):
         """
-        旧的实时文本转语音处理，作为备用方法
+        旧的分句方式，作为备用方法: 处理到最后一个句子结束标点为止的文本
         """
         # 添加新文本到缓冲区
         if text_chunk:
-            self._text_buffer += text_chunk
-        
-        # 定义句子结束标点
-        sentence_end_punctuation = ["。", "！", "？", ".", "!", "?", "\n"]
+            buffer += text_chunk
         
         # 缓冲区为空直接返回
-        if not self._text_buffer:
-            return
+        if not buffer:
+            return "", buffer
         
         # 强制处理模式 - 用于处理最后剩余的文本
         if force_process:
-            if self._text_buffer.strip():
-                LoggerManager().get_logger().debug(f"强制处理剩余文本: {self._text_buffer}")
-                self.play_text_to_speech(self._text_buffer, force_play=False)
-                self._text_buffer = ""
-            return
+            if buffer.strip():
+                LoggerManager().get_logger().debug(f"强制处理剩余文本: {buffer}")
+            return buffer, ""
         
         # 寻找句子结束标点
-        process_index = -1
-        for punct in sentence_end_punctuation:
-            pos = self._text_buffer.rfind(punct)
-            if pos > process_index:
-                process_index = pos
+        process_index = max(buffer.rfind(punct) for punct in SENTENCE_END_PUNCTUATION)
         
-        # 如果找到标点，处理到该标点为止的文本
+        # 如果找到标点，处理到该标点为止的文本，剩余文本保留在缓冲区
         if process_index >= 0:
-            # 提取要处理的文本（包括标点）
-            process_text = self._text_buffer[:process_index + 1]
-            # 保留剩余文本在缓冲区
-            self._text_buffer = self._text_buffer[process_index + 1:]
-            
+            process_text = buffer[:process_index + 1]
             if process_text.strip():
                 LoggerManager().get_logger().debug(f"处理句子: {process_text}")
-                self.play_text_to_speech(process_text, force_play=False)
+            return process_text, buffer[process_index + 1:]
+        return "", buffer
                 
     #region TTS处理器管理
     def get_tts_handler(self) -> str:
@@ -410,7 +481,7 @@ class TTSService:
         # URL 相关设置
         elif key == "url":
             if not self.adapter:
-                self.adapter = TTSAdapter(value)
+                self.adapter = TTSAdapter(value, http_settings=self.settings.get_setting("http"))
             else:
                 self.adapter.set_server_url(value)
         
@@ -424,6 +495,18 @@ class TTSService:
         elif key == "tts_handler" and hasattr(self, "handler_manager"):
             self.handler_manager.set_handler(value)
 
+        # 并发合成数
+        elif key == "max_concurrent_synthesis":
+            self.pipeline.set_max_concurrent_synthesis(value)
+
+        # 音频缓存
+        elif key == "audio_cache":
+            self._configure_audio_cache()
+
+        # 后端连接超时与重试
+        elif key == "http" and self.adapter:
+            self.adapter.set_http_settings(value)
+
     def save_config(self):
         """
         保存当前配置
@@ -442,6 +525,9 @@ class TTSService:
             "batch_size": self.settings.get_setting("batch_size"),
             "media_type": self.settings.get_setting("media_type"),
             "streaming_mode": self.settings.get_setting("streaming_mode"),
+            "max_concurrent_synthesis": self.settings.get_setting("max_concurrent_synthesis"),
+            "audio_cache": self.settings.get_setting("audio_cache"),
+            "http": self.settings.get_setting("http"),
             
             # 模型配置
             "sovits_model_path": self.settings.get_setting("sovits_model_path"),
@@ -460,7 +546,8 @@ class TTSService:
         """
         关闭服务
         """
-        self.stop_playing()
+        self.pipeline.close()
+        player.close()
         self.save_config()
         LoggerManager().get_logger().debug("TTS服务已关闭")
 
@@ -14,6 +14,17 @@ DEFAULT_TTS_SETTINGS = {
     "batch_size": 1,
     "media_type": "wav",
     "streaming_mode": True,
+    "max_concurrent_synthesis": 2,  # 同时进行的合成请求数，下一句的合成与当前句的播放重叠
+    "audio_cache": {  # 合成音频缓存: 相同文本与音色直接播放缓存的音频
+        "enabled": True,
+        "max_memory_mb": 32,
+        "max_disk_mb": 256
+    },
+    "http": {  # 后端连接: 超时(秒)与重试，未指定的项使用 DEFAULT_HTTP_SETTINGS
+        "connect_timeout": 3.05,
+        "read_timeout": 60,
+        "max_retries": 2
+    },
     
     # 模型配置
     "gpt_weights_path": None,
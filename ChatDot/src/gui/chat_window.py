@@ -1,12 +1,17 @@
 from PyQt5.QtWidgets import (QMainWindow, QVBoxLayout, QWidget, QLineEdit,
                            QPushButton, QHBoxLayout, QMessageBox, QSizePolicy,
-                           QScrollArea, QDesktopWidget, QApplication)
+                           QDesktopWidget, QApplication)
 from PyQt5.QtCore import Qt, QPoint, QRect, QTimer, QThread, pyqtSignal
 from PyQt5.QtGui import QCursor, QColor
 
 from core.bootstrap import Bootstrap
 from core.global_managers.service_manager import ServiceManager
-from gui.components.message_bubble import MessageBubble
+from gui.components.message_list import MessageListView, MessageItem
+
+HISTORY_PAGE_SIZE = 30  # 每次从会话存储读取的消息数
+MAX_LOADED_MESSAGES = 600  # 列表中同时保留的消息上限，超出后释放离视口最远的一端
+LOAD_MORE_THRESHOLD = 40  # 滚动到距顶部/底部多少像素内时加载下一页
+DEFAULT_REFRESH_RATE = 60  # 无法获取屏幕刷新率时，流式输出每秒最多刷新的次数
 
 class ChatThread(QThread):
     """处理LLM响应的线程"""
@@ -35,6 +40,32 @@ class ChatThread(QThread):
     def stop(self):
         self.is_running = False
 
+class CandidateThread(QThread):
+    """并发生成多个候选回复的线程"""
+    chunk_received = pyqtSignal(int, str)  # (候选序号, 片段)
+    completed = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def __init__(self, chat_service, count):
+        super().__init__()
+        self.chat_service = chat_service
+        self.count = count
+        self.is_running = True
+
+    def run(self):
+        try:
+            for index, chunk in self.chat_service.generate_candidates(self.count, is_stream=True):
+                if not self.is_running:
+                    break
+                self.chunk_received.emit(index, chunk)
+            if self.is_running:
+                self.completed.emit()
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def stop(self):
+        self.is_running = False
+
 # 添加STT处理线程
 class STTThread(QThread):
     """语音识别线程"""
@@ -105,6 +136,7 @@ class ChatWindow(QMainWindow):
         self._init_services()
         self.init_ui()
         self.llm_thread = None  # 初始化llm_thread
+        self.candidate_thread = None  # 多候选生成线程
 
     def _init_window(self):
         """初始化窗口基础属性"""
@@ -125,21 +157,28 @@ class ChatWindow(QMainWindow):
 
     def _init_services(self):
         """初始化核心服务"""
-        # 初始化 Bootstrap
+        # 服务由 Bootstrap 在后台初始化，就绪后通过 on_service_ready 获取
         self.bootstrap = Bootstrap()
-        self.bootstrap.initialize()
 
         # 使用 Bootstrap 中已有的 ServiceManager，而不是创建新实例
         self.service_manager = self.bootstrap.service_manager
 
-        # 获取核心服务
-        self.chat_service = self.service_manager.get_service("chat_service")
-        self.context_handle_service = self.service_manager.get_service("context_handle_service")
-        self.llm_service = self.service_manager.get_service("llm_service")
+        # 核心服务，就绪前为None
+        self.chat_service = None
+        self.context_handle_service = None
+        self.llm_service = None
 
         # 初始化消息列表
         self.messages = []
         self.assistant_prefix_added = False
+        self._streaming_item = None  # 正在流式输出的AI回复
+        self._pending_chunks = []  # 尚未显示的流式片段，按屏幕刷新率合并显示
+
+        # 分页显示状态
+        self._oldest_loaded_id = None  # 已显示的最早一条历史消息id
+        self._newest_loaded_id = None  # 底部气泡被释放后已显示的最新消息id，None表示已显示到最新
+        self._has_older_history = False
+        self._loading_history = False
 
     def init_ui(self):
         """初始化UI布局"""
@@ -159,40 +198,56 @@ class ChatWindow(QMainWindow):
 
         # 添加输入区域
         self._init_input_area()
-
-        # 初始滚动到底部
-        QTimer.singleShot(0, self.scroll_to_bottom)
+        self._set_chat_enabled(False)
+
+    def _set_chat_enabled(self, enabled):
+        """聊天服务就绪前禁用输入"""
+        self.user_input.setEnabled(enabled)
+        self.send_button.setEnabled(enabled)
+        self.user_input.setPlaceholderText("请输入消息..." if enabled else "服务加载中...")
+
+    def on_service_ready(self, service_name):
+        """服务就绪后启用对应功能"""
+        if service_name == "context_handle_service":
+            self.context_handle_service = self.service_manager.get_service(service_name)
+        elif service_name == "llm_service":
+            self.llm_service = self.service_manager.get_service(service_name)
+        elif service_name == "chat_service":
+            self.chat_service = self.service_manager.get_service(service_name)
+            self._set_chat_enabled(True)
+            # 载入当前会话最近一页历史并滚动到底部
+            self.load_chat_history()
+
+    def on_service_failed(self, service_name, error_message):
+        if service_name == "chat_service":
+            self.user_input.setPlaceholderText("聊天服务不可用")
+            self.message_model.append_item(MessageItem(f"聊天服务初始化失败: {error_message}", "error", -1))
 
     def _init_message_area(self):
         """初始化消息显示区域"""
-        # 滚动区域设置
-        self.scroll_area = QScrollArea(self)
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-
-        # 滚动区域样式
-        self.scroll_area.setStyleSheet(
-            "QScrollArea { background: transparent; border: 0px; }"
-        )
-        self.scroll_area.viewport().setStyleSheet(
-            "QWidget{background: transparent;}"
-        )
-
-        # 消息内容区域
-        self.scroll_content = QWidget(self.scroll_area)
-        self.messages_layout = QVBoxLayout(self.scroll_content)
-        self.messages_layout.setContentsMargins(0, 0, 0, 0)
-        self.messages_layout.setSpacing(10)
-        self.messages_layout.addStretch()
-
-        # 设置内容区域样式
-        self.scroll_content.setStyleSheet("QWidget { background: transparent; }")
-
-        # 组装滚动区域
-        self.scroll_content.setLayout(self.messages_layout)
-        self.scroll_area.setWidget(self.scroll_content)
-        self.layout.addWidget(self.scroll_area)
+        # 虚拟化消息列表: 只绘制可见消息，编辑时才创建编辑框
+        self.message_view = MessageListView(self)
+        self.message_model = self.message_view.message_model
+        self.message_view.delete_requested.connect(self.delete_message)
+        self.message_view.retry_requested.connect(self.retry_message)
+        self.message_view.pin_requested.connect(self.pin_message)
+        self.message_model.content_edited.connect(self.edit_message)
+        self.layout.addWidget(self.message_view)
+
+        # 滚动到顶部/底部附近时按需加载更多历史
+        self.message_view.verticalScrollBar().valueChanged.connect(self._on_scroll)
+
+        # 流式片段先缓存，每个刷新周期合并追加并滚动一次
+        self._stream_timer = QTimer(self)
+        self._stream_timer.setSingleShot(True)
+        self._stream_timer.setInterval(self._refresh_interval())
+        self._stream_timer.timeout.connect(self._flush_stream)
+
+    def _refresh_interval(self):
+        """屏幕一帧的时长(毫秒)"""
+        screen = QApplication.primaryScreen()
+        rate = screen.refreshRate() if screen else 0
+        return max(1, int(1000 / (rate if rate > 0 else DEFAULT_REFRESH_RATE)))
 
     def _init_input_area(self):
         """初始化输入区域"""
@@ -236,6 +291,9 @@ class ChatWindow(QMainWindow):
 
     def toggle_voice_input(self):
         """切换语音输入模式"""
+        if not self.service_manager.is_service_ready("stt_service"):
+            QMessageBox.information(self, "请稍候", "语音识别服务正在加载")
+            return
         stt_service = self.service_manager.get_service("stt_service")
         
         # 检查STT是否启用
@@ -309,12 +367,16 @@ class ChatWindow(QMainWindow):
             if not user_message:
                 return
 
+            if self._newest_loaded_id is not None:
+                # 正在查看较早的历史，先回到最新一页
+                self.load_chat_history()
             self.add_message_bubble(user_message, "user")
             self.user_input.clear()
 
         # 停止之前的线程
         if self.llm_thread and self.llm_thread.isRunning():
             self.llm_thread.stop()
+            self.chat_service.stop_generating()
             self.llm_thread.wait()
 
         # 创建新的线程
@@ -326,36 +388,46 @@ class ChatWindow(QMainWindow):
 
     def update_llm_output(self, chunk):
         if not self.assistant_prefix_added:
-            self.add_message_bubble(chunk, "assistant")
+            self._streaming_item = self.add_message_bubble(chunk, "assistant")
             self.assistant_prefix_added = True
-        else:
-            # 更新最后一个气泡的内容
-            last_item = self.messages_layout.itemAt(self.messages_layout.count() - 2)
-            if last_item and isinstance(last_item.widget(), MessageBubble):
-                bubble = last_item.widget()
-                current_text = bubble.content_edit.toPlainText()
-                new_text = current_text + chunk
-                bubble.content_edit.setText(new_text)
+        elif self._streaming_item is not None:
+            # 片段在下一帧合并追加到最后一条回复
+            self._pending_chunks.append(chunk)
+            if not self._stream_timer.isActive():
+                self._stream_timer.start()
+
+    def _flush_stream(self):
+        """把缓存的流式片段一次性追加到回复末尾，并滚动到底部"""
+        self._stream_timer.stop()
+        if not self._pending_chunks:
+            return
+        text = "".join(self._pending_chunks)
+        self._pending_chunks = []
+        if self._streaming_item is not None:
+            self.message_model.append_text(self._streaming_item, text)
+            self.scroll_to_bottom()
 
-        self.scroll_to_bottom()
+    def _end_stream(self):
+        self._flush_stream()
+        self.assistant_prefix_added = False
+        self._streaming_item = None
 
     def complete_output(self):
         self.enable_send_buttons()
-        self.assistant_prefix_added = False
+        self._end_stream()
 
     def handle_error_response(self, error_message):
+        self._end_stream()
         QMessageBox.critical(self, "错误", f"发生错误: {error_message}")
         self.enable_send_buttons()
-        self.assistant_prefix_added = False
 
     def clear_context(self):
+        if self.chat_service is None:
+            return
         self.chat_service.clear_context()
 
         # 清除UI中的消息气泡
-        while self.messages_layout.count() > 1:
-            item = self.messages_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+        self.clear_chat_display()
 
         self.enable_send_buttons()
 
@@ -372,47 +444,181 @@ class ChatWindow(QMainWindow):
             QMessageBox.warning(self, "错误", "切换处理器失败")
 
 
-    def add_message_bubble(self, message, role):
-        index = len(self.messages) - 1
-        bubble = MessageBubble(message, index, role)
-        bubble.delete_requested.connect(self.delete_message)
-        bubble.edit_completed.connect(self.edit_message)
-        bubble.retry_requested.connect(self.retry_message)
-        self.messages_layout.insertWidget(self.messages_layout.count() - 1, bubble)
+    def add_message_bubble(self, message, role, index=None, message_id=None):
+        """
+        在底部添加一条消息
+
+        Args:
+            message: 消息内容
+            role: 消息角色
+            index: 消息在 chat_service.get_messages() 中的索引，默认为即将追加的位置
+            message_id: 消息在会话存储中的id，实时添加的消息为None
+
+        Returns:
+            MessageItem: 添加的消息
+        """
+        if index is None:
+            index = len(self.chat_service.get_messages())
+        item = self.message_model.append_item(MessageItem(message, role, index, message_id))
+        self._release_top_messages()
         self.scroll_to_bottom()
+        return item
+
+    def _history_items(self, page):
+        """把一页历史消息转换为列表项，system 消息不显示"""
+        return [
+            MessageItem(entry["content"], entry["role"], entry["index"], entry["id"], bool(entry.get("pinned")))
+            for entry in page if entry["role"] not in ["system"]
+        ]
+
+    def _is_generating(self):
+        return bool((self.llm_thread and self.llm_thread.isRunning())
+                    or (self.candidate_thread and self.candidate_thread.isRunning()))
+
+    def _release_top_messages(self):
+        """消息超出上限时释放最上方(最早)的消息，需要时再按页重新加载"""
+        excess = self.message_model.rowCount() - MAX_LOADED_MESSAGES
+        if excess <= 0:
+            return
+        anchor = self.message_view.capture_anchor()
+        self.message_model.remove_rows(0, excess)
+        first = self.message_model.item_at(0)
+        if first is not None and first.message_id is not None:
+            self._oldest_loaded_id = first.message_id
+            self._has_older_history = True
+        self.message_view.restore_anchor(anchor)
+
+    def _assign_live_ids(self):
+        """为实时添加的消息补上会话存储中的id(它们总是位于底部)"""
+        live = [item for item in self.message_model.items() if item.message_id is None]
+        if not live:
+            return
+        page = [entry for entry in self.chat_service.get_history_page(None, len(live))
+                if entry["role"] not in ["system"]]
+        for item, entry in zip(live[-len(page):], page):
+            item.message_id = entry["id"]
+
+    def _release_bottom_messages(self):
+        """向上翻页后消息超出上限时释放最下方的消息，滚动回底部时重新加载"""
+        excess = self.message_model.rowCount() - MAX_LOADED_MESSAGES
+        if excess <= 0 or self._is_generating():
+            return
+        self._assign_live_ids()
+        last_kept = self.message_model.item_at(self.message_model.rowCount() - excess - 1)
+        if last_kept is None or last_kept.message_id is None:
+            return
+        self.message_model.remove_rows(self.message_model.rowCount() - excess, excess)
+        self._newest_loaded_id = last_kept.message_id
 
-    def delete_message(self, index):
-        if 0 <= index < len(self.messages):
-            # 使用chat_service删除消息
-            messages = self.chat_service.get_messages()
-            messages.pop(index)
-            self.chat_service.set_messages(messages)
-
-            # 更新UI
-            for i in range(self.messages_layout.count()):
-                item = self.messages_layout.itemAt(i)
-                if item and isinstance(item.widget(), MessageBubble):
-                    item.widget().deleteLater()
-            self.messages_layout.removeItem(item)
-
-    def edit_message(self, index, new_text):
-        # 使用chat_service编辑消息
+    def _on_scroll(self, value):
+        if self._loading_history:
+            return
+        scroll_bar = self.message_view.verticalScrollBar()
+        if value <= LOAD_MORE_THRESHOLD and self._has_older_history:
+            self.load_older_history()
+        elif value >= scroll_bar.maximum() - LOAD_MORE_THRESHOLD and self._newest_loaded_id is not None:
+            self.load_newer_history()
+
+    def load_older_history(self):
+        """向上滚动时加载更早的一页历史"""
+        if self._oldest_loaded_id is None:
+            self._has_older_history = False
+            return
+        page = self.chat_service.get_history_page(before_id=self._oldest_loaded_id, limit=HISTORY_PAGE_SIZE)
+        self._has_older_history = len(page) >= HISTORY_PAGE_SIZE
+        if not page:
+            return
+        self._loading_history = True
+        try:
+            anchor = self.message_view.capture_anchor()
+            self._oldest_loaded_id = page[0]["id"]
+            self.message_model.insert_items(0, self._history_items(page))
+            self._release_bottom_messages()
+            self.message_view.restore_anchor(anchor)
+        finally:
+            self._loading_history = False
+
+    def load_newer_history(self):
+        """底部消息被释放后，向下滚动时重新加载较新的一页"""
+        page = self.chat_service.get_history_page(after_id=self._newest_loaded_id, limit=HISTORY_PAGE_SIZE)
+        self._newest_loaded_id = page[-1]["id"] if len(page) >= HISTORY_PAGE_SIZE else None
+        if not page:
+            return
+        self._loading_history = True
+        try:
+            self.message_model.insert_items(self.message_model.rowCount(), self._history_items(page))
+            self._release_top_messages()
+        finally:
+            self._loading_history = False
+
+    def delete_message(self, item):
+        """删除消息：同步删除历史中的消息和列表中的消息"""
+        index = item.index
         messages = self.chat_service.get_messages()
         if 0 <= index < len(messages):
-            messages[index]["content"] = new_text
-            self.chat_service.set_messages(messages)
+            self.chat_service.delete_message(index)
+            # 更新UI: 移除消息，之后的消息索引前移
+            for other in self.message_model.items():
+                if other.index > index:
+                    other.index -= 1
+        elif item.message_id is not None:
+            # 分页载入的更早消息不在已载入历史中，按id删除
+            self.chat_service.delete_message_by_id(item.message_id)
+        else:
+            return
+        self.message_model.remove_item(item)
+
+    def edit_message(self, item, new_text):
+        # 使用chat_service编辑消息
+        messages = self.chat_service.get_messages()
+        if 0 <= item.index < len(messages):
+            self.chat_service.edit_message(item.index, new_text)
+        elif item.message_id is not None:
+            self.chat_service.edit_message_by_id(item.message_id, new_text)
 
-    def retry_message(self, index):
+    def pin_message(self, item, pinned):
+        """置顶/取消置顶消息，置顶消息在上下文预算裁剪时保留"""
         messages = self.chat_service.get_messages()
-        if index == len(messages) - 1:
-            current_response = messages[index]["content"]
-            last_bubble = self.messages_layout.itemAt(index).widget()
-            if last_bubble:
-                last_bubble.add_alternative(current_response)
+        if 0 <= item.index < len(messages):
+            self.chat_service.set_message_pinned(item.index, pinned)
+        elif item.message_id is not None:
+            self.chat_service.set_message_pinned_by_id(item.message_id, pinned)
+        else:
+            return
+        self.message_model.set_pinned(item, pinned)
 
-            retry_messages = messages[:index]
-            self.chat_service.set_messages(retry_messages)
-            self.send_message(retry=True)
+    def retry_message(self, item):
+        """重新生成最后一条AI回复：并发生成多个候选，流式写入该消息的候选列表"""
+        messages = self.chat_service.get_messages()
+        if not messages or messages[-1].get("role") != "assistant":
+            return
+        if self.message_model.row_of(item) != self.message_model.rowCount() - 1:
+            return  # 只能重新生成最后一条回复
+
+        self.stop_llm()
+        # 保留旧回复作为候选，并从历史中移除(只删除这一条，不重写已载入的历史)
+        self.message_model.add_alternative(item, messages[-1]["content"])
+        self.chat_service.delete_message(len(messages) - 1)
+        item.message_id = None  # 新回复写入后由 _assign_live_ids 补上id
+
+        count = self.chat_service.settings.get_setting("candidate_count") or 1
+        base_index = self.message_model.begin_candidates(item, count)
+        self.send_button.setEnabled(False)
+        self.candidate_thread = CandidateThread(self.chat_service, count)
+        self.candidate_thread.chunk_received.connect(
+            lambda candidate_index, chunk: self.message_model.append_candidate_chunk(
+                item, base_index + candidate_index, chunk
+            )
+        )
+        self.candidate_thread.completed.connect(lambda: self.complete_candidates(item))
+        self.candidate_thread.error.connect(self.handle_error_response)
+        self.candidate_thread.start()
+
+    def complete_candidates(self, item):
+        """候选生成完成：消息索引指向写入历史的回复，切换候选时同步修改历史"""
+        item.index = len(self.chat_service.get_messages()) - 1
+        self.candidate_thread = None
+        self.enable_send_buttons()
 
     def toggleChatWindow(self):
         """显示/隐藏聊天窗口"""
@@ -445,18 +651,19 @@ class ChatWindow(QMainWindow):
 
     def scroll_to_bottom(self):
         """滚动到底部"""
-        self.scroll_area.verticalScrollBar().setValue(
-            self.scroll_area.verticalScrollBar().maximum()
-        )
+        self.message_view.scrollToBottom()
 
     def dropEvent(self, event):
+        if self.chat_service is None:
+            QMessageBox.information(self, "请稍候", "聊天服务正在加载")
+            return
         files = [u.toLocalFile() for u in event.mimeData().urls()]
         for file_path in files:
             if file_path.lower().endswith('.json'):
                 try:
                     # 使用chat_service导入历史记录
                     self.chat_service.import_history(file_path)
-                    self.load_chat_history(self.chat_service.get_messages())
+                    self.load_chat_history()
                 except Exception as e:
                     QMessageBox.warning(self, "导入失败", f"导入历史记录失败: {str(e)}")
             else:
@@ -468,54 +675,57 @@ class ChatWindow(QMainWindow):
         else:
             event.ignore()
 
-    def load_chat_history(self, messages):
-        """直接加载消息列表"""
+    def load_chat_history(self):
+        """载入当前会话最近一页历史，更早的消息在向上滚动时按页加载"""
         try:
             # 清空显示
             self.clear_chat_display()
             
-            # 添加消息
-            for msg in messages:
-                if msg["role"] not in ["system"]:
-                    self.add_message_bubble(msg["content"], msg["role"])
+            page = self.chat_service.get_history_page(limit=HISTORY_PAGE_SIZE)
+            self._oldest_loaded_id = page[0]["id"] if page else None
+            self._newest_loaded_id = None
+            self._has_older_history = len(page) >= HISTORY_PAGE_SIZE
+            self.message_model.insert_items(0, self._history_items(page))
                     
             # 滚动到底部
-            self.scroll_to_bottom()
+            self._loading_history = True
+            QTimer.singleShot(0, self._finish_initial_load)
             
         except Exception as e:
             QMessageBox.warning(self, "错误", f"加载聊天历史失败：{str(e)}")
 
+    def _finish_initial_load(self):
+        self.scroll_to_bottom()
+        self._loading_history = False
+
 
     def enable_send_buttons(self):
         """启用所有按钮"""
-        self.send_button.setEnabled(True)
+        self.send_button.setEnabled(self.chat_service is not None)
 
     def stop_llm(self):
         """停止 LLM 线程"""
+        if self.candidate_thread and self.candidate_thread.isRunning():
+            self.candidate_thread.stop()
+            self.chat_service.stop_generating()
+            self.candidate_thread = None
         if self.llm_thread and self.llm_thread.isRunning():
             self.llm_thread.stop()
+            # 关闭上游响应，停止继续下载和生成
+            self.chat_service.stop_generating()
             # self.llm_thread.wait()
             self.llm_thread = None  # 重置 llm_thread
         self.enable_send_buttons()
-        self.assistant_prefix_added = False
+        self._end_stream()
 
-    def update_chat_display(self, file_path):
-        """更新聊天显示"""
+    def update_chat_display(self, session_id):
+        """切换会话并更新聊天显示"""
         try:
-            # 先导入历史记录
-            self.chat_service.import_history(file_path)
+            # 先切换到该会话
+            self.chat_service.load_session(int(session_id))
             
-            # 清空当前显示
-            self.clear_chat_display()
-            
-            # 加载历史消息
-            messages = self.chat_service.get_messages()
-            for message in messages:
-                if message["role"] not in ["system"]:
-                    self.add_message_bubble(message["content"], message["role"])
-                    
-            # 滚动到底部
-            self.scroll_to_bottom()
+            # 载入最近一页历史
+            self.load_chat_history()
             
             # 显示成功消息
             QMessageBox.information(self, "成功", "历史记录已加载")
@@ -525,11 +735,13 @@ class ChatWindow(QMainWindow):
 
     def clear_chat_display(self):
         """清空聊天显示区域"""
-        # 使用正确的布局变量名
-        while self.messages_layout.count() > 1:  # 保留最后的 stretch
-            item = self.messages_layout.takeAt(0)
-            if item and item.widget():
-                item.widget().deleteLater()
+        self._stream_timer.stop()
+        self._pending_chunks = []
+        self.message_model.clear()
+        self._streaming_item = None
+        self._oldest_loaded_id = None
+        self._newest_loaded_id = None
+        self._has_older_history = False
 
     def connect_history_settings(self, history_settings):
         """连接历史设置页面的信号"""
@@ -0,0 +1,422 @@
+from collections import OrderedDict
+from PyQt5.QtWidgets import (QListView, QStyledItemDelegate, QTextEdit, QMenu, QAction,
+                             QAbstractItemView)
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QRectF, QPoint, QEvent, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter, QPainterPath, QPen, QTextDocument, QTextOption, QTextCursor
+
+BUBBLE_MARGIN = 5  # 气泡与行边缘的距离
+BUBBLE_PADDING = 8  # 气泡内文字的边距
+BUBBLE_RADIUS = 10
+MIN_BUBBLE_HEIGHT = 40
+DOCUMENT_CACHE_SIZE = 64  # 缓存的排版文档数，只需覆盖可见区域附近的消息
+
+ROLE_COLORS = {
+    "user": QColor(200, 220, 240, 200),
+    "assistant": QColor(220, 220, 220, 200),
+}
+ERROR_COLOR = QColor(255, 200, 200, 200)
+PINNED_BORDER_COLOR = QColor(74, 144, 226, 220)  # 置顶消息的气泡边框
+
+
+class MessageItem:
+    """消息列表中的一条消息"""
+    __slots__ = ("content", "role", "index", "message_id", "pinned", "alternatives", "current_alt_index",
+                 "cached_width", "cached_height")
+
+    def __init__(self, content, role, index, message_id=None, pinned=False):
+        self.content = content
+        self.role = role
+        self.index = index  # 在 chat_service.get_messages() 中的索引，-1表示不在已载入窗口内
+        self.message_id = message_id  # 在会话存储中的id，实时添加的消息为None
+        self.pinned = pinned  # 置顶消息在上下文预算裁剪时保留
+        self.alternatives = []  # 存储平行候选回复
+        self.current_alt_index = 0  # 当前显示的候选回复索引
+        self.cached_width = None  # 缓存的排版宽度与高度，内容变化时清空
+        self.cached_height = None
+
+
+class MessageListModel(QAbstractListModel):
+    """消息列表模型，每行一个 MessageItem"""
+    ItemRole = Qt.UserRole + 1
+    content_edited = pyqtSignal(object, str)  # 用户编辑或切换候选后的内容 (MessageItem, 内容)
+    text_appended = pyqtSignal(object, str)  # 流式追加的片段 (MessageItem, 片段)，由视图增量排版
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._items = []
+
+    # region QAbstractListModel
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._items):
+            return None
+        item = self._items[index.row()]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return item.content
+        if role == self.ItemRole:
+            return item
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        item = self._items[index.row()]
+        if value == item.content:
+            return False
+        self.set_content(item, value)
+        self.content_edited.emit(item, value)
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsEditable
+    # endregion
+
+    # region 行操作
+    def items(self):
+        return list(self._items)
+
+    def item_at(self, row):
+        return self._items[row] if 0 <= row < len(self._items) else None
+
+    def row_of(self, item):
+        """查找消息所在行，从末尾开始查找(正在更新的消息通常在底部)"""
+        for row in range(len(self._items) - 1, -1, -1):
+            if self._items[row] is item:
+                return row
+        return -1
+
+    def insert_items(self, row, items):
+        if not items:
+            return
+        self.beginInsertRows(QModelIndex(), row, row + len(items) - 1)
+        self._items[row:row] = items
+        self.endInsertRows()
+
+    def append_item(self, item):
+        self.insert_items(len(self._items), [item])
+        return item
+
+    def remove_rows(self, row, count):
+        if count <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        del self._items[row:row + count]
+        self.endRemoveRows()
+
+    def remove_item(self, item):
+        row = self.row_of(item)
+        if row >= 0:
+            self.remove_rows(row, 1)
+
+    def clear(self):
+        self.beginResetModel()
+        self._items = []
+        self.endResetModel()
+    # endregion
+
+    # region 内容更新
+    def _notify_changed(self, item):
+        row = self.row_of(item)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def set_content(self, item, content):
+        item.content = content
+        item.cached_height = None
+        self._notify_changed(item)
+
+    def append_text(self, item, chunk):
+        """向消息追加流式片段，只通知追加的部分，不重新排版整条消息"""
+        if not chunk:
+            return
+        item.content += chunk
+        self.text_appended.emit(item, chunk)
+
+    def add_alternative(self, item, text):
+        item.alternatives.append(text)
+
+    def begin_candidates(self, item, count):
+        """
+        为并发生成的候选回复预留位置，并切换显示第一个新候选
+
+        Returns:
+            int: 第一个新候选在 alternatives 中的索引
+        """
+        base_index = len(item.alternatives)
+        item.alternatives.extend([""] * count)
+        item.current_alt_index = base_index
+        self.set_content(item, "")
+        return base_index
+
+    def append_candidate_chunk(self, item, alt_index, chunk):
+        """向指定候选追加流式片段，当前显示的候选实时刷新"""
+        if not 0 <= alt_index < len(item.alternatives):
+            return
+        if alt_index == item.current_alt_index:
+            self.append_text(item, chunk)
+            item.alternatives[alt_index] = item.content
+        else:
+            item.alternatives[alt_index] += chunk
+
+    def switch_alternative(self, item, alt_index):
+        """切换显示的候选，并作为一次编辑通知"""
+        if 0 <= alt_index < len(item.alternatives):
+            item.current_alt_index = alt_index
+            self.set_content(item, item.alternatives[alt_index])
+            self.content_edited.emit(item, item.content)
+
+    def set_pinned(self, item, pinned):
+        """更新置顶标记并重绘该消息"""
+        item.pinned = pinned
+        self._notify_changed(item)
+    # endregion
+
+
+class MessageDelegate(QStyledItemDelegate):
+    """
+    消息气泡绘制代理
+
+    直接绘制圆角气泡和文字，不为每条消息创建控件。
+    每条消息的排版高度按宽度缓存在 MessageItem 上，内容变化时才重新排版；
+    只在编辑时为当前消息创建编辑框。
+    """
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self._documents = OrderedDict()  # id(item) -> (内容, 宽度, QTextDocument)
+
+    def _text_width(self):
+        return max(1, self.view.viewport().width() - 2 * (BUBBLE_MARGIN + BUBBLE_PADDING))
+
+    def _document(self, item, width, font):
+        """获取消息排版好的文档，最近使用的文档会被缓存"""
+        key = id(item)
+        cached = self._documents.get(key)
+        if cached and cached[0] is item.content and cached[1] == width:
+            self._documents.move_to_end(key)
+            return cached[2]
+        document = QTextDocument()
+        document.setDefaultFont(font)
+        option = QTextOption(Qt.AlignRight if item.role == "user" else Qt.AlignLeft)
+        option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+        document.setDefaultTextOption(option)
+        document.setDocumentMargin(0)
+        document.setPlainText(item.content or "")
+        document.setTextWidth(width)
+        self._documents[key] = (item.content, width, document)
+        while len(self._documents) > DOCUMENT_CACHE_SIZE:
+            self._documents.popitem(last=False)
+        return document
+
+    @staticmethod
+    def _row_height(document):
+        text_height = document.size().height()
+        return int(max(MIN_BUBBLE_HEIGHT, text_height + 2 * BUBBLE_PADDING) + 2 * BUBBLE_MARGIN)
+
+    def sizeHint(self, option, index):
+        item = index.data(MessageListModel.ItemRole)
+        width = self._text_width()
+        if item.cached_height is None or item.cached_width != width:
+            item.cached_height = self._row_height(self._document(item, width, option.font))
+            item.cached_width = width
+        return QSize(self.view.viewport().width(), item.cached_height)
+
+    def append_text(self, item, chunk):
+        """
+        把流式片段追加到已排版的文档末尾，只重新排版受影响的最后一段
+
+        Returns:
+            bool: 消息高度是否变化(需要重新布局列表)
+        """
+        key = id(item)
+        cached = self._documents.get(key)
+        if not cached or cached[1] != item.cached_width or item.cached_height is None:
+            # 没有可复用的排版，下次绘制时整体排版
+            item.cached_height = None
+            return True
+        document = cached[2]
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(chunk)
+        self._documents[key] = (item.content, cached[1], document)
+        self._documents.move_to_end(key)
+        height = self._row_height(document)
+        if height == item.cached_height:
+            return False
+        item.cached_height = height
+        return True
+
+    def paint(self, painter, option, index):
+        item = index.data(MessageListModel.ItemRole)
+        rect = option.rect.adjusted(BUBBLE_MARGIN, BUBBLE_MARGIN, -BUBBLE_MARGIN, -BUBBLE_MARGIN)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        path = QPainterPath()
+        path.addRoundedRect(QRectF(rect), BUBBLE_RADIUS, BUBBLE_RADIUS)
+        painter.fillPath(path, ROLE_COLORS.get(item.role, ERROR_COLOR))
+        if item.pinned:
+            painter.strokePath(path, QPen(PINNED_BORDER_COLOR, 2))
+        document = self._document(item, self._text_width(), option.font)
+        painter.translate(rect.left() + BUBBLE_PADDING, rect.top() + BUBBLE_PADDING)
+        document.drawContents(painter)
+        painter.restore()
+
+    # region 编辑
+    def createEditor(self, parent, option, index):
+        editor = QTextEdit(parent)
+        editor.setStyleSheet(
+            "QTextEdit { border-radius: 10px; padding: 8px; background-color: rgba(255, 255, 255, 230); "
+            "border: 2px solid #4A90E2; }"
+        )
+        editor.installEventFilter(self)
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setPlainText(index.data(Qt.EditRole) or "")
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.toPlainText(), Qt.EditRole)
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect.adjusted(BUBBLE_MARGIN, BUBBLE_MARGIN, -BUBBLE_MARGIN, -BUBBLE_MARGIN))
+
+    def eventFilter(self, editor, event):
+        # Ctrl+Enter 保存编辑，Enter 换行，Esc 取消，失去焦点时保存
+        if (isinstance(editor, QTextEdit) and event.type() == QEvent.KeyPress
+                and event.key() in (Qt.Key_Return, Qt.Key_Enter) and event.modifiers() & Qt.ControlModifier):
+            self.commitData.emit(editor)
+            self.closeEditor.emit(editor, QStyledItemDelegate.NoHint)
+            return True
+        return super().eventFilter(editor, event)
+    # endregion
+
+    def forget(self, item):
+        """消息被移除时释放其排版缓存"""
+        self._documents.pop(id(item), None)
+
+
+class MessageListView(QListView):
+    """
+    虚拟化的消息列表
+
+    只绘制可见的消息，右键菜单提供重新生成/编辑/删除/置顶/切换候选。
+    """
+    delete_requested = pyqtSignal(object)  # MessageItem
+    retry_requested = pyqtSignal(object)  # MessageItem
+    pin_requested = pyqtSignal(object, bool)  # (MessageItem, 是否置顶)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.message_model = MessageListModel(self)
+        self.message_delegate = MessageDelegate(self)
+        self.setModel(self.message_model)
+        self.setItemDelegate(self.message_delegate)
+        self.message_model.rowsAboutToBeRemoved.connect(self._forget_rows)
+        self.message_model.dataChanged.connect(self._relayout_rows)
+        self.message_model.text_appended.connect(self._on_text_appended)
+
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)  # 通过右键菜单进入编辑
+        self.setResizeMode(QListView.Adjust)  # 宽度变化时重新排版
+        self.setUniformItemSizes(False)
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._show_context_menu)
+        self.setStyleSheet("QListView { background: transparent; border: 0px; }")
+        self.viewport().setAutoFillBackground(False)
+
+    def _forget_rows(self, parent, first, last):
+        for row in range(first, last + 1):
+            self.message_delegate.forget(self.message_model.item_at(row))
+
+    def _relayout_rows(self, top_left, bottom_right, roles=None):
+        """内容整体替换后高度可能变化，通知视图重新布局"""
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            self.message_delegate.sizeHintChanged.emit(self.message_model.index(row))
+
+    def _on_text_appended(self, item, chunk):
+        row = self.message_model.row_of(item)
+        if row < 0:
+            return
+        index = self.message_model.index(row)
+        if self.message_delegate.append_text(item, chunk):
+            self.message_delegate.sizeHintChanged.emit(index)
+        else:
+            # 高度不变时只重绘这一行
+            self.viewport().update(self.visualRect(index))
+
+    def _show_context_menu(self, position):
+        index = self.indexAt(position)
+        if not index.isValid():
+            return
+        item = index.data(MessageListModel.ItemRole)
+        menu = QMenu(self)
+
+        # 如果是AI回复，添加重试选项
+        if item.role == "assistant":
+            retry_action = QAction("重新生成", menu)
+            retry_action.triggered.connect(lambda: self.retry_requested.emit(item))
+            menu.addAction(retry_action)
+
+        # 所有消息都支持编辑和删除
+        edit_action = QAction("编辑", menu)
+        edit_action.triggered.connect(lambda: self.edit(index))
+        menu.addAction(edit_action)
+
+        delete_action = QAction("删除", menu)
+        delete_action.triggered.connect(lambda: self.delete_requested.emit(item))
+        menu.addAction(delete_action)
+
+        pin_action = QAction("取消置顶" if item.pinned else "置顶", menu)
+        pin_action.triggered.connect(lambda: self.pin_requested.emit(item, not item.pinned))
+        menu.addAction(pin_action)
+
+        # 如果有多个候选回复，添加切换选项
+        if item.alternatives:
+            switch_menu = menu.addMenu("切换候选")
+            for i, _ in enumerate(item.alternatives):
+                action = QAction(f"候选 {i+1}", menu)
+                # 使用lambda捕获循环变量时需要使用默认参数
+                action.triggered.connect(lambda checked, idx=i: self.message_model.switch_alternative(item, idx))
+                switch_menu.addAction(action)
+
+        menu.exec_(self.viewport().mapToGlobal(position))
+
+    # region 滚动位置
+    def capture_anchor(self, item=None):
+        """
+        记录锚点消息在视口中的位置，默认为最上方可见的消息
+
+        Returns:
+            锚点，供 restore_anchor 使用；没有消息时为None
+        """
+        if item is None:
+            index = self.indexAt(QPoint(BUBBLE_MARGIN, BUBBLE_MARGIN))
+            if not index.isValid():
+                return None
+            item = index.data(MessageListModel.ItemRole)
+        row = self.message_model.row_of(item)
+        if row < 0:
+            return None
+        return item, self.visualRect(self.message_model.index(row)).top()
+
+    def restore_anchor(self, anchor):
+        """在插入或移除视口外的消息后，让锚点消息回到原来的位置"""
+        if anchor is None:
+            return
+        item, top = anchor
+        row = self.message_model.row_of(item)
+        if row < 0:
+            return
+        self.executeDelayedItemsLayout()
+        scroll_bar = self.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.value() + self.visualRect(self.message_model.index(row)).top() - top)
+    # endregion
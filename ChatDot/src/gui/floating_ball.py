@@ -5,6 +5,7 @@ from PyQt5.QtCore import Qt, QPoint, QRectF
 
 from gui.setting_window import SettingWindow
 from gui.chat_window import ChatWindow
+from gui.service_loader import ServiceLoader
 from core.bootstrap import Bootstrap
 from core.global_managers.service_manager import ServiceManager  # 导入服务管理器
 
@@ -21,10 +22,7 @@ class FloatingBall(QWidget):
         self.ball_color = self.DEFAULT_COLOR
 
         self.bootstrap = Bootstrap()
-        self.bootstrap.initialize()
         self.service_manager = self.bootstrap.service_manager
-        self.service_manager.get_service("live2d_service").update_setting("initialize", False)
-        self.clear_chat_history()
 
         self.chat_window = ChatWindow(self)  # 保存 ChatWindow 实例
         self.setting_window = None
@@ -32,8 +30,26 @@ class FloatingBall(QWidget):
         self.drag_start_position = None
         self.dragging = False
 
+        # 服务在后台初始化，悬浮球先显示，各功能在对应服务就绪后启用
+        self.service_loader = ServiceLoader(self.bootstrap, self)
+        self.service_loader.service_ready.connect(self.on_service_ready)
+        self.service_loader.service_failed.connect(self.on_service_failed)
+        self.service_loader.start()
+
+    def on_service_ready(self, service_name):
+        """服务就绪后启用对应功能"""
+        if service_name == "live2d_service":
+            self.service_manager.get_service("live2d_service").update_setting("initialize", False)
+        elif service_name == "chat_service":
+            self.clear_chat_history()
+        self.chat_window.on_service_ready(service_name)
+
+    def on_service_failed(self, service_name, error_message):
+        print(f"服务 {service_name} 初始化失败: {error_message}")
+        self.chat_window.on_service_failed(service_name, error_message)
+
     def clear_chat_history(self):
-        """启动时清除聊天记录"""
+        """启动时开始新的空对话，之前的会话保留在历史记录中"""
         try:
             # 使用chat_service清除上下文和记录
             chat_service = self.service_manager.get_service("chat_service")
@@ -238,6 +254,7 @@ class FloatingBall(QWidget):
             return
             
         context_menu = QMenu(self)
+        is_ready = self.service_manager.is_service_ready
         
         if self.chat_window.llm_thread and self.chat_window.llm_thread.isRunning():
             stop_action = QAction("停止生成", self)
@@ -246,6 +263,7 @@ class FloatingBall(QWidget):
         
         clear_action = QAction("清除上下文", self)
         clear_action.triggered.connect(self.clear_context)
+        clear_action.setEnabled(is_ready("chat_service"))
         context_menu.addAction(clear_action)
         
         # 添加语音控制项
@@ -253,22 +271,33 @@ class FloatingBall(QWidget):
         voice_menu = context_menu.addMenu("语音功能")
         
         # TTS开关
-        tts_service = self.service_manager.get_service("tts_service")
-        tts_enabled = tts_service.settings.get_setting("initialize")
-        tts_action = QAction("TTS功能 (已启用)" if tts_enabled else "TTS功能 (已禁用)", self)
-        tts_action.triggered.connect(self.toggle_tts)
+        if is_ready("tts_service"):
+            tts_service = self.service_manager.get_service("tts_service")
+            tts_enabled = tts_service.settings.get_setting("initialize")
+            tts_action = QAction("TTS功能 (已启用)" if tts_enabled else "TTS功能 (已禁用)", self)
+            tts_action.triggered.connect(self.toggle_tts)
+        else:
+            tts_action = QAction("TTS功能 (加载中...)", self)
+            tts_action.setEnabled(False)
         voice_menu.addAction(tts_action)
         
         # STT开关
-        stt_service = self.service_manager.get_service("stt_service")
-        stt_enabled = stt_service.settings.get_setting("enabled")
-        stt_action = QAction("STT功能 (已启用)" if stt_enabled else "STT功能 (已禁用)", self)
-        stt_action.triggered.connect(self.toggle_stt)
+        if is_ready("stt_service"):
+            stt_service = self.service_manager.get_service("stt_service")
+            stt_enabled = stt_service.settings.get_setting("enabled")
+            stt_action = QAction("STT功能 (已启用)" if stt_enabled else "STT功能 (已禁用)", self)
+            stt_action.triggered.connect(self.toggle_stt)
+        else:
+            stt_action = QAction("STT功能 (加载中...)", self)
+            stt_action.setEnabled(False)
         voice_menu.addAction(stt_action)
         
         context_menu.addSeparator()
-        setting_action = QAction("设置", self)
+        # 设置页面依赖全部服务，所有服务处理完成后才可打开
+        settings_ready = self.bootstrap.is_initialized()
+        setting_action = QAction("设置" if settings_ready else "设置 (加载中...)", self)
         setting_action.triggered.connect(self.openSettingWindow)
+        setting_action.setEnabled(settings_ready)
         context_menu.addAction(setting_action)
         exit_action = QAction("退出", self)
         exit_action.triggered.connect(QApplication.instance().quit)
@@ -0,0 +1,30 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class ServiceLoader(QObject):
+    """
+    在后台初始化核心服务，把每个服务的就绪状态以信号通知到GUI线程
+
+    Bootstrap 的回调在工作线程中调用，这里通过 Qt 信号排队到接收者所在的GUI线程，
+    界面可以在各服务就绪后逐步启用对应功能。
+    """
+    service_ready = pyqtSignal(str)  # 服务名
+    service_failed = pyqtSignal(str, str)  # 服务名, 错误信息
+    all_finished = pyqtSignal()
+
+    def __init__(self, bootstrap, parent=None):
+        super().__init__(parent)
+        self.bootstrap = bootstrap
+
+    def start(self):
+        """开始后台初始化，服务已初始化时直接发出就绪信号"""
+        started = self.bootstrap.initialize_async(
+            on_ready=self.service_ready.emit,
+            on_failed=self.service_failed.emit,
+            on_finished=self.all_finished.emit,
+        )
+        if not started and self.bootstrap.is_initialized():
+            for service_name in self.bootstrap.service_manager.get_all_services():
+                if self.bootstrap.is_service_ready(service_name):
+                    self.service_ready.emit(service_name)
+            self.all_finished.emit()
@@ -117,6 +117,10 @@ class SettingWindow(QDialog):
         self.llm_connection_settings_page.api_base_input.setText(api_base)
         # 设置 API Keys
         self.llm_connection_settings_page.set_api_keys(api_keys)
+        # 用缓存的模型列表立即填充下拉框(过期时后台刷新)
+        cached_models = llm_service.get_cached_models()
+        if cached_models:
+            self.llm_connection_settings_page.populate_model_dropdown(cached_models)
         # 设置当前使用的模型
         self.llm_connection_settings_page.set_model(model_name)
 
@@ -247,17 +251,16 @@ class SettingWindow(QDialog):
         llm_service.adapter.set_model_params(model_params_settings)
         self.save_user_settings()
 
-    def handle_load_history(self, file_path):
-        """处理历史记录加载请求"""
+    def handle_load_history(self, session_id):
+        """处理会话加载请求"""
         chat_service = self.service_manager.get_service("chat_service")
 
         try:
-            # 加载历史记录
-            chat_service.import_history(file_path)
+            # 切换到该会话
+            chat_service.load_session(int(session_id))
 
             # 加载历史记录到聊天窗口
-            history = chat_service.get_messages()
-            self.floating_ball.chat_window.load_chat_history(history)
+            self.floating_ball.chat_window.load_chat_history()
             QMessageBox.information(self, "加载成功", "历史记录已成功加载")
             # 显示聊天窗口
             self.floating_ball.chat_window.show()
@@ -1,5 +1,4 @@
 import os
-import shutil
 from datetime import datetime
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                             QPushButton, QScrollArea, QFrame, 
@@ -9,12 +8,17 @@ from core.global_managers.service_manager import ServiceManager
 from core.bootstrap import Bootstrap
 
 class HistoryFileItem(QFrame):
-    """历史文件项组件，显示一个历史文件及其操作按钮"""
-    delete_requested = pyqtSignal(str)  # 请求删除文件的信号
-    load_requested = pyqtSignal(str)    # 请求加载文件的信号
-    copy_requested = pyqtSignal(str)    # 请求复制文件的信号
+    """历史会话项组件，显示一个会话及其操作按钮"""
+    delete_requested = pyqtSignal(str)  # 请求删除会话的信号
+    load_requested = pyqtSignal(str)    # 请求加载会话的信号
+    copy_requested = pyqtSignal(str)    # 请求复制会话的信号
     
     def __init__(self, file_path, file_name, parent=None):
+        """
+        Args:
+            file_path: 会话id(字符串)
+            file_name: 显示的会话名称
+        """
         super().__init__(parent)
         self.file_path = file_path
         self.file_name = file_name
@@ -61,8 +65,8 @@ class HistoryFileItem(QFrame):
         self.copy_requested.emit(self.file_path)
 
 class HistorySettingsPage(QWidget):
-    """历史记录设置页面，显示和管理聊天历史文件"""
-    load_history_requested = pyqtSignal(str)  # 请求加载历史记录的信号
+    """历史记录设置页面，显示和管理聊天会话"""
+    load_history_requested = pyqtSignal(str)  # 请求加载会话的信号(会话id)
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -81,6 +85,12 @@ class HistorySettingsPage(QWidget):
             self.chat_service = None
             
         self.history_dir = os.path.join(os.getcwd(), "ChatDot_Main", "history")
+        # 旧版历史文件只在首次打开时导入为会话
+        if self.chat_service:
+            try:
+                self.chat_service.import_legacy_directory(self.history_dir)
+            except Exception as e:
+                QMessageBox.warning(self, "错误", f"导入旧版历史文件失败：{str(e)}")
         self.init_ui()
         
     def init_ui(self):
@@ -96,7 +106,7 @@ class HistorySettingsPage(QWidget):
         
         # 刷新按钮
         refresh_button = QPushButton("刷新历史记录列表")
-        refresh_button.clicked.connect(self.load_history_file)
+        refresh_button.clicked.connect(self.load_history_list)
         button_layout.addWidget(refresh_button)
         
         # 导出按钮
@@ -129,83 +139,70 @@ class HistorySettingsPage(QWidget):
         self.load_history_list()
         
     def load_history_list(self):
-        """加载历史记录文件列表"""
+        """加载会话列表"""
         # 清空原有列表
         while self.scroll_layout.count():
             child = self.scroll_layout.takeAt(0)
             if child.widget():
                 child.widget().deleteLater()
         
-        # 确保目录存在
-        if not os.path.exists(self.history_dir):
-            os.makedirs(self.history_dir)
+        sessions = self.chat_service.get_history_list() if self.chat_service else []
         
-        # 加载目录下所有json文件
-        files = [f for f in os.listdir(self.history_dir) if f.endswith('.json')]
-        files.sort(reverse=True)  # 最新的文件在前面
-        
-        if not files:
-            empty_label = QLabel("没有找到历史记录文件")
+        if not sessions:
+            empty_label = QLabel("没有找到历史记录")
             empty_label.setAlignment(Qt.AlignCenter)
             self.scroll_layout.addWidget(empty_label)
             return
             
-        # 添加文件项到滚动区域
-        for file_name in files:
-            file_path = os.path.join(self.history_dir, file_name)
-            file_item = HistoryFileItem(file_path, file_name)
+        # 添加会话项到滚动区域(最近更新的在前面)
+        for session in sessions:
+            title = f"{session['title']} ({session['message_count']}条, {session['modified_time']})"
+            if session['is_current']:
+                title = "[当前] " + title
+            file_item = HistoryFileItem(str(session['id']), title)
             file_item.delete_requested.connect(self.delete_history_file)
             file_item.load_requested.connect(self.load_history_file)
             file_item.copy_requested.connect(self.copy_history_file)
             self.scroll_layout.addWidget(file_item)
     
-    def delete_history_file(self, file_path):
-        """删除历史记录文件"""
+    def delete_history_file(self, session_id):
+        """删除会话"""
         reply = QMessageBox.question(
             self, 
             '确认删除', 
-            f"确定要删除此历史记录文件吗？\n{os.path.basename(file_path)}",
+            "确定要删除此历史记录吗？",
             QMessageBox.Yes | QMessageBox.No, 
             QMessageBox.No
         )
         
         if reply == QMessageBox.Yes:
             try:
-                os.remove(file_path)
-                QMessageBox.information(self, "删除成功", "历史记录文件已删除")
+                self.chat_service.delete_session(int(session_id))
+                QMessageBox.information(self, "删除成功", "历史记录已删除")
                 self.load_history_list()  # 刷新列表
             except Exception as e:
-                QMessageBox.warning(self, "删除失败", f"删除文件时出错：{str(e)}")
+                QMessageBox.warning(self, "删除失败", f"删除历史记录时出错：{str(e)}")
     
-    def copy_history_file(self, file_path):
-        """复制历史记录文件"""
+    def copy_history_file(self, session_id):
+        """复制会话"""
         try:
-            # 获取原文件名和路径信息
-            dir_name = os.path.dirname(file_path)
-            file_name = os.path.basename(file_path)
-            
-            # 创建新的文件名 (copy)原文件名
-            new_file_name = "(copy)" + file_name
-            new_file_path = os.path.join(dir_name, new_file_name)
-            
-            # 复制文件
-            shutil.copy2(file_path, new_file_path)
-            QMessageBox.information(self, "复制成功", f"已创建副本: {new_file_name}")
+            self.chat_service.copy_session(int(session_id))
+            QMessageBox.information(self, "复制成功", "已创建副本")
             
             # 刷新列表
             self.load_history_list()
             
         except Exception as e:
-            QMessageBox.warning(self, "复制失败", f"复制文件时出错：{str(e)}")
+            QMessageBox.warning(self, "复制失败", f"复制历史记录时出错：{str(e)}")
     
-    def load_history_file(self, file_path):
-        """加载历史记录文件"""
+    def load_history_file(self, session_id):
+        """加载会话"""
         if not self._check_service():
             return
 
         try:
             # 发送加载历史记录信号
-            self.load_history_requested.emit(file_path)
+            self.load_history_requested.emit(session_id)
             # 不在这里显示成功消息，让 ChatWindow 处理结果
         except Exception as e:
             QMessageBox.warning(self, "错误", f"加载历史记录失败：{str(e)}")
@@ -218,7 +215,7 @@ class HistorySettingsPage(QWidget):
         reply = QMessageBox.question(
             self,
             '确认清空',
-            "确定要清空当前聊天历史吗？此操作无法撤销。",
+            "确定要清空当前聊天吗？将开始一个新的对话，当前对话仍保留在历史记录列表中。",
             QMessageBox.Yes | QMessageBox.No,
             QMessageBox.No
         )
@@ -227,6 +224,7 @@ class HistorySettingsPage(QWidget):
             try:
                 self.chat_service.clear_context()
                 QMessageBox.information(self, "成功", "聊天历史已清空")
+                self.load_history_list()  # 刷新列表
             except Exception as e:
                 QMessageBox.warning(self, "错误", f"清空历史失败：{str(e)}")
 
@@ -267,6 +265,7 @@ class HistorySettingsPage(QWidget):
             try:
                 self.chat_service.import_history(file_path)
                 QMessageBox.information(self, "成功", "聊天历史导入成功")
+                self.load_history_list()  # 刷新列表
             except Exception as e:
                 QMessageBox.warning(self, "错误", f"导入失败：{str(e)}")
 
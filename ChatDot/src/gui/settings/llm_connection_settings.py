@@ -35,12 +35,15 @@ class LLMConnectionSettingsPage(QWidget):
         keys_buttons_layout = QHBoxLayout()
         self.add_key_button = QPushButton("添加Key", self)
         self.remove_key_button = QPushButton("删除Key", self)
+        self.key_stats_button = QPushButton("Key状态", self)
 
         self.add_key_button.clicked.connect(self.add_api_key)
         self.remove_key_button.clicked.connect(self.remove_api_key)
+        self.key_stats_button.clicked.connect(self.show_key_stats)
 
         keys_buttons_layout.addWidget(self.add_key_button)
         keys_buttons_layout.addWidget(self.remove_key_button)
+        keys_buttons_layout.addWidget(self.key_stats_button)
         layout.addLayout(keys_buttons_layout)
 
         # 模型选择
@@ -162,6 +165,32 @@ class LLMConnectionSettingsPage(QWidget):
             self.api_keys_list.takeItem(current_row)
             self.api_keys.pop(current_row)
 
+    def show_key_stats(self):
+        """显示每个API Key的调度统计"""
+        try:
+            llm_service = self.service_manager.get_service("llm_service")
+        except KeyError:
+            QMessageBox.critical(self, "错误", "LLM 服务未注册")
+            return
+
+        key_stats = llm_service.get_key_stats()
+        if not key_stats:
+            QMessageBox.information(self, "Key状态", "当前没有配置API Key")
+            return
+
+        def fmt_seconds(value):
+            return f"{value * 1000:.0f}ms" if value is not None else "-"
+
+        lines = []
+        for stats in key_stats:
+            line = (f"{stats['key']}  并发: {stats['in_flight']}  总请求: {stats['total_requests']}\n"
+                    f"    TTFT: {fmt_seconds(stats['avg_ttft'])}  耗时: {fmt_seconds(stats['avg_latency'])}  "
+                    f"错误率: {stats['error_rate']:.0%}  429: {stats['rate_limit_rate']:.0%}")
+            if stats['cooldown_remaining'] > 0:
+                line += f"\n    冷却中: 剩余 {stats['cooldown_remaining']:.1f}s"
+            lines.append(line)
+        QMessageBox.information(self, "Key状态", "\n".join(lines))
+
     def get_llm_connection_settings(self):
         return {
             'api_base': self.api_base_input.text().strip(),
@@ -1,13 +1,14 @@
 import sys
 from PyQt5.QtWidgets import QApplication
-from gui.chat_window import ChatWindow
 from gui.floating_ball import FloatingBall
+from core.bootstrap import Bootstrap
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    chat_window = ChatWindow()
-    # chat_window.show()
+    # 悬浮球立即显示，服务在后台初始化
     floating_ball = FloatingBall()
     floating_ball.show()
+    # 退出时关闭服务，写入尚未落盘的聊天状态
+    app.aboutToQuit.connect(Bootstrap.get_instance().shutdown)
 
     sys.exit(app.exec_())
\ No newline at end of file